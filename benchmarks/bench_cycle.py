@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Cycle-time benchmark for the watchdog check path.
+
+Starts a stub fleet of 10/100/1000 targets (one slow target per 10 when
+--slow is given) and times one round of watchdog.check_target over every
+target on a CHECK_CONCURRENCY-sized pool, as the scheduler runs them.
+Homepages are written to a temp dir and DB persistence is skipped so only
+the probing engine is measured.
+
+--probes runs the rounds once per probe type (PROBE_TYPE) and adds what
+the probes cost per cycle: bytes on the wire and socket operations. The
+cheap types still do a full GET on the first cycle and every
+FULL_CHECK_EVERY probes, so run enough --cycles to see the mix.
+
+Usage: python benchmarks/bench_cycle.py [--sizes 10,100,1000] [--latency 0.05]
+                                        [--probes get,conditional,head,tcp]
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fleet import StubFleet
+
+import watchdog
+
+
+def prepare_watchdog(sites_dir):
+    logging.basicConfig(level=logging.WARNING)
+    watchdog.logger = logging.getLogger('watchdog')
+    watchdog.site_path_for = lambda t: f"{sites_dir}/{t.replace(':', '_')}/index.html"
+    watchdog.result_writer.add_check = lambda *args, **kwargs: None
+    watchdog.send_alert = lambda *args, **kwargs: None
+
+
+def count_probe_costs():
+    """Wrap watchdog.record_probe to total bytes and socket ops; returns the totals dict."""
+    totals = {'bytes': 0, 'socket_ops': 0}
+    record_probe = watchdog.record_probe
+
+    def counting(target, kind, seconds, timings):
+        totals['bytes'] += timings.get('bytes', 0)
+        totals['socket_ops'] += timings.get('socket_ops', 0)
+        record_probe(target, kind, seconds, timings)
+
+    watchdog.record_probe = counting
+    return totals
+
+
+def bench(size, latency, slow_latency, concurrency, cycles, probe=None):
+    costs, record_probe = None, watchdog.record_probe
+    if probe:
+        watchdog.PROBE_TYPE = probe
+        watchdog.probe_states.clear()
+        costs = count_probe_costs()
+    with StubFleet(size, latency=latency, slow_every=10 if slow_latency else 0,
+                   slow_latency=slow_latency) as fleet:
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        timings = []
+        passed = 0
+        for _ in range(cycles):
+            start = time.perf_counter()
+            results = [f.result() for f in [executor.submit(watchdog.check_target, t) for t in fleet.targets]]
+            timings.append(time.perf_counter() - start)
+            passed += sum(results)
+        executor.shutdown(wait=True)
+        watchdog.probe_pool = watchdog.HTTPProbePool()  # drop keep-alive connections to this fleet
+    best = min(timings)
+    cost = ""
+    if costs is not None:
+        watchdog.record_probe = record_probe
+        cost = (f" probe={probe:11s} bytes/cycle={costs['bytes'] / cycles:10.0f} "
+                f"socket_ops/cycle={costs['socket_ops'] / cycles:8.0f}")
+    print(f"targets={size:5d} concurrency={concurrency:4d} "
+          f"cycle_best={best:7.3f}s cycle_mean={sum(timings) / len(timings):7.3f}s "
+          f"serial_estimate={size * latency + (size // 10 if slow_latency else 0) * slow_latency:7.2f}s "
+          f"pass={passed}/{size * cycles}{cost}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10,100,1000')
+    parser.add_argument('--latency', type=float, default=0.05, help='per-request stub latency (s)')
+    parser.add_argument('--slow', type=float, default=0.0, help='latency of every 10th target (s)')
+    parser.add_argument('--concurrency', type=int, default=watchdog.CHECK_CONCURRENCY)
+    parser.add_argument('--cycles', type=int, default=3)
+    parser.add_argument('--probes', default='', help='comma separated probe types to compare')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as sites_dir:
+        prepare_watchdog(sites_dir)
+        for size in (int(s) for s in args.sizes.split(',')):
+            for probe in args.probes.split(',') if args.probes else [None]:
+                bench(size, args.latency, args.slow, args.concurrency, args.cycles, probe)
+
+
+if __name__ == '__main__':
+    main()
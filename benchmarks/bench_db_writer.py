@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for check-result persistence (rows/sec).
+
+Compares the old per-row path (a fresh psycopg2 connection per INSERT) with
+watchdog.ResultWriter's pooled multi-row flush. Needs a reachable Postgres
+with db/init.sql applied; connection settings come from the usual DB_* env
+vars. Benchmark rows use target 'bench:0' and are deleted afterwards.
+
+Usage: DB_HOST=localhost python benchmarks/bench_db_writer.py [--rows 2000] [--batch 100]
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+from datetime import datetime
+
+import fleet  # noqa: F401  (puts watchdog/ on sys.path)
+import watchdog
+
+BENCH_TARGET = 'bench:0'
+
+
+def per_row(count):
+    now = datetime.now().astimezone()
+    start = time.perf_counter()
+    for _ in range(count):
+        with watchdog.db_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO checks (target, status, http_status, time_drift_seconds,
+                                        response_time_ms, fetched_time, local_time, created_at)
+                    VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+                """, (BENCH_TARGET, 'PASS', 200, 0, 5, now, now, now))
+        conn.close()
+    return count / (time.perf_counter() - start)
+
+
+def batched(count, batch, spill_dir):
+    writer = watchdog.ResultWriter(spill_path=f"{spill_dir}/spill.jsonl")
+    now = datetime.now().astimezone()
+    written = 0
+    start = time.perf_counter()
+    for i in range(count):
+        writer.add_check(BENCH_TARGET, True, 200, 0, 0.005, now, now)
+        if (i + 1) % batch == 0:
+            written += writer.flush()
+    written += writer.flush()
+    # Each check is two rows (checks + metrics); report checks/sec to compare with per_row
+    return (written // 2) / (time.perf_counter() - start)
+
+
+def cleanup():
+    with watchdog.pooled_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM checks WHERE target = %s", (BENCH_TARGET,))
+            cur.execute("DELETE FROM metrics WHERE tags->>'target' = %s", (BENCH_TARGET,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=100, help='checks per flush (targets per cycle)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    watchdog.logger = logging.getLogger('watchdog')
+
+    try:
+        with tempfile.TemporaryDirectory() as spill_dir:
+            old = per_row(args.rows)
+            new = batched(args.rows, args.batch, spill_dir)
+        print(f"per-row connections: {old:10.1f} checks/sec")
+        print(f"pooled batch={args.batch:<5d}: {new:10.1f} checks/sec ({new / old:.1f}x)")
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Fleet simulation: run the watchdog's scheduler and check path against a
+synthetic fleet and report how it scales, as JSON for comparing versions.
+
+For each --targets size a StubFleet is started with the given latency
+distribution and fault rates (errors, hangs, slow bodies), alerts go to an
+in-process SMTPSink and, with --db, results are written to the Postgres
+named by the DB_* env vars (rows are deleted afterwards). The real
+CheckScheduler/dispatch_due loop then runs for --duration seconds with
+every target on --interval, exactly as main_loop drives it.
+
+Reported per size:
+  throughput        completed checks per second
+  check_ms          p50/p90/p99/max wall time of one check_target
+  period_ratio      p50/p99 of the time between two checks of a target / interval
+  lag_ms            p50/p99/max delay between a check falling due and dispatch
+  overrun_rate      scheduler overruns (watchdog_schedule_overruns) per check
+  pass_rate, alerts_sent, rows_written, cpu_ms_per_check
+  rss_kb_per_target growth of the process RSS over the run / targets
+
+--json writes the results (with the git revision and configuration) to a
+file; --compare prints each number next to the one in an earlier file.
+The per-target deadline (hung requests) and other watchdog settings come
+from the usual env vars, e.g. TARGET_DEADLINE_SEC=2.
+
+Usage: python benchmarks/bench_fleet.py [--targets 100,1000] [--interval 5] [--duration 30]
+           [--latency lognormal:0.02:0.8] [--error-rate 0.01] [--hang-rate 0.001]
+           [--slow-body-rate 0.01] [--db] [--json out.json] [--compare baseline.json]
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import RotatingFileHandler
+
+from fleet import REPO_ROOT, SMTPSink, StubFleet
+
+import watchdog
+
+# Lower is better for every reported number except these; counts that
+# follow from --duration and the fault rates are shown but never flagged
+HIGHER_IS_BETTER = {'throughput', 'pass_rate'}
+INFORMATIONAL = {'checks', 'alerts_sent', 'rows_written', 'period_ratio_p50'}
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def rss_kb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def prepare_watchdog(work_dir, smtp_port, use_db):
+    # The watchdog's own log goes to a file, as in production, keeping stdout for results
+    logging.basicConfig(level=logging.INFO, filename=os.path.join(work_dir, 'watchdog.log'))
+    watchdog.logger = logging.getLogger('watchdog')
+    watchdog.site_path_for = lambda t: f"{work_dir}/sites/{t.replace(':', '_')}/index.html"
+    watchdog.SMTP_HOST, watchdog.SMTP_PORT = '127.0.0.1', smtp_port
+    handler = RotatingFileHandler(os.path.join(work_dir, 'metrics.log'), maxBytes=5*1024*1024, backupCount=2)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    watchdog.metrics_pipeline.start(handler)
+    watchdog.result_writer.spill_path = os.path.join(work_dir, 'db-spill.jsonl')
+    if use_db:
+        watchdog.result_writer.start(watchdog.FLUSH_INTERVAL)
+    else:
+        watchdog.result_writer.add_check = lambda *args, **kwargs: None
+
+
+def instrument():
+    """Wrap check_target and dispatch_check to record check times, lags and check instants."""
+    record = {'check_s': [], 'lag_s': [], 'checked_at': {}}
+    check_target, dispatch_check = watchdog.check_target, watchdog.dispatch_check
+
+    def timed_check(target):
+        start = time.monotonic()
+        try:
+            return check_target(target)
+        finally:
+            record['check_s'].append(time.monotonic() - start)
+            record['checked_at'].setdefault(target, []).append(start)
+
+    def timed_dispatch(executor, scheduler, target, due_at, stats):
+        record['lag_s'].append(max(time.monotonic() - due_at, 0.0))
+        dispatch_check(executor, scheduler, target, due_at, stats)
+
+    def restore():
+        watchdog.check_target, watchdog.dispatch_check = check_target, dispatch_check
+
+    watchdog.check_target, watchdog.dispatch_check = timed_check, timed_dispatch
+    return record, restore
+
+
+def simulate(size, args, sink):
+    fleet_kwargs = dict(latency=args.latency, error_rate=args.error_rate, hang_rate=args.hang_rate,
+                        hang_seconds=watchdog.TARGET_DEADLINE * 2, slow_body_rate=args.slow_body_rate,
+                        slow_body_seconds=args.slow_body_seconds, seed=args.seed)
+    with StubFleet(size, **fleet_kwargs) as fleet:
+        watchdog.probe_pool = watchdog.HTTPProbePool()
+        watchdog.probe_states.clear()
+        record, restore = instrument()
+        overruns_before = sum(watchdog.exp_overruns.samples().values())
+        rows_before = sum(watchdog.exp_db_rows.samples().values())
+        alerts_before = sink.messages
+        executor = ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="check")
+        scheduler = watchdog.CheckScheduler(fleet.targets, intervals={}, default_interval=args.interval)
+        stats = {'results': [], 'max_lag': 0.0}
+
+        rss_start = rss_kb()
+        cpu_start = resource.getrusage(resource.RUSAGE_SELF)
+        start = time.monotonic()
+        end = start + args.duration
+        while time.monotonic() < end:
+            watchdog.dispatch_due(executor, scheduler, stats, time.monotonic())
+            scheduler.wait(end)
+        elapsed = time.monotonic() - start
+        executor.shutdown(wait=True)
+        cpu_end = resource.getrusage(resource.RUSAGE_SELF)
+        rss_end = rss_kb()
+        if args.db:
+            watchdog.result_writer.flush()
+        restore()
+        # Let the digest window close so queued alerts reach the sink
+        time.sleep(watchdog.alert_dispatcher.digest_window + 0.5)
+
+    checks = len(stats['results'])
+    periods = []
+    for times in record['checked_at'].values():
+        periods += [(b - a) / args.interval for a, b in zip(times, times[1:])]
+    cpu = (cpu_end.ru_utime - cpu_start.ru_utime) + (cpu_end.ru_stime - cpu_start.ru_stime)
+
+    def ms(values, q):
+        value = percentile(values, q)
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        'targets': size,
+        'checks': checks,
+        'throughput': round(checks / elapsed, 2),
+        'check_ms_p50': ms(record['check_s'], 0.5),
+        'check_ms_p90': ms(record['check_s'], 0.9),
+        'check_ms_p99': ms(record['check_s'], 0.99),
+        'check_ms_max': ms(record['check_s'], 1.0),
+        'period_ratio_p50': round(percentile(periods, 0.5), 3) if periods else None,
+        'period_ratio_p99': round(percentile(periods, 0.99), 3) if periods else None,
+        'lag_ms_p50': ms(record['lag_s'], 0.5),
+        'lag_ms_p99': ms(record['lag_s'], 0.99),
+        'lag_ms_max': ms(record['lag_s'], 1.0),
+        'overrun_rate': round((sum(watchdog.exp_overruns.samples().values()) - overruns_before) / max(checks, 1), 4),
+        'pass_rate': round(sum(stats['results']) / max(checks, 1), 4),
+        'alerts_sent': sink.messages - alerts_before,
+        'rows_written': sum(watchdog.exp_db_rows.samples().values()) - rows_before,
+        'cpu_ms_per_check': round(cpu * 1000 / max(checks, 1), 3),
+        'rss_kb_per_target': round((rss_end - rss_start) / size, 2),
+        'faults_served': {'errors': fleet.errors_served, 'hangs': fleet.hangs, 'slow_bodies': fleet.slow_bodies},
+    }
+
+
+def cleanup_db():
+    with watchdog.pooled_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM checks WHERE target LIKE '127.0.0.1:%'")
+            cur.execute("DELETE FROM metrics WHERE tags->>'target' LIKE '127.0.0.1:%'")
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {r['targets']: r for r in json.load(f)['results']}
+    for result in results:
+        old = baseline.get(result['targets'])
+        if old is None:
+            continue
+        print(f"targets={result['targets']} vs {baseline_path}:")
+        for key, value in result.items():
+            if key == 'targets' or not isinstance(value, (int, float)) or not isinstance(old.get(key), (int, float)):
+                continue
+            change = (value - old[key]) / old[key] * 100 if old[key] else 0.0
+            worse = change < 0 if key in HIGHER_IS_BETTER else change > 0
+            flag = ' <-- worse' if worse and abs(change) >= 10 and key not in INFORMATIONAL else ''
+            print(f"  {key:20s} {old[key]:>12} -> {value:>12} ({change:+7.1f}%){flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--targets', default='100,1000')
+    parser.add_argument('--interval', type=float, default=5.0, help='check interval per target (s)')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds simulated per size')
+    parser.add_argument('--latency', default='lognormal:0.02:0.8',
+                        help='response latency: 0.05, uniform:a:b, exp:mean or lognormal:median:sigma')
+    parser.add_argument('--error-rate', type=float, default=0.01)
+    parser.add_argument('--hang-rate', type=float, default=0.001)
+    parser.add_argument('--slow-body-rate', type=float, default=0.01)
+    parser.add_argument('--slow-body-seconds', type=float, default=1.0)
+    parser.add_argument('--concurrency', type=int, default=watchdog.CHECK_CONCURRENCY)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--db', action='store_true', help='persist results to the DB_* Postgres')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='earlier --json output to compare against')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir, SMTPSink() as sink:
+        prepare_watchdog(work_dir, sink.port, args.db)
+        watchdog.alert_dispatcher.digest_window = 1.0
+        watchdog.alert_dispatcher.start()
+        try:
+            for size in (int(s) for s in args.targets.split(',')):
+                result = simulate(size, args, sink)
+                results.append(result)
+                print(json.dumps(result), flush=True)
+        finally:
+            if args.db:
+                cleanup_db()
+
+    report = {
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'config': {k: v for k, v in vars(args).items() if k not in ('json', 'compare')},
+        'results': results,
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
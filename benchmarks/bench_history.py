@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for the /api/checks history endpoint.
+
+Builds the schema from db/init.sql in a scratch schema and loads N
+synthetic checks spread over the last 90 days (through the rollup
+trigger, as the watchdog writes them). Then, for 1-day, 7-day and
+90-day ranges, it times requests through Flask's test client, so the
+streamed JSON is produced and read in full:
+
+  raw page          first page of 1000 rows, one target and all targets
+  raw last page     the last page, reached with the keyset cursor ('after')
+                    and with the OFFSET query it replaces
+  raw walk          every page of one target, following 'next'
+  buckets / lttb    500 points, one target and all targets
+
+It reports the median ms and the response size. The scratch schema is
+dropped afterwards unless --keep is given.
+
+Connection settings come from DB_HOST/DB_PORT/DB_NAME/DB_USER/DB_PASSWORD.
+
+Usage: python benchmarks/bench_history.py [--rows 2000000] [--targets 20]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import psycopg2
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'logging'))
+SCHEMA = 'bench_history'
+DAYS = 90
+
+LOAD_SQL = """
+    INSERT INTO checks (target, status, http_status, time_drift_seconds, response_time_ms,
+                        fetched_time, local_time, created_at)
+    SELECT 'web' || (i %% %(targets)s),
+           CASE WHEN random() < 0.02 THEN 'FAIL' ELSE 'PASS' END,
+           200, round((random() - 0.5)::NUMERIC, 3), (random() * random() * 800)::INTEGER,
+           NOW(), NOW(),
+           NOW() - INTERVAL '%(days)s days' * (i::FLOAT8 / %(total)s)
+    FROM generate_series(%(start)s, %(stop)s) AS i
+"""
+OFFSET_SQL = """
+    SELECT created_at, id, target, status, http_status, response_time_ms, time_drift_seconds::FLOAT8
+    FROM checks WHERE target = %s AND created_at >= %s AND created_at < %s
+    ORDER BY created_at, id OFFSET %s LIMIT %s
+"""
+
+
+def connect():
+    return psycopg2.connect(
+        host=os.getenv('DB_HOST', 'localhost'), port=int(os.getenv('DB_PORT', 5432)),
+        dbname=os.getenv('DB_NAME', 'monitoring'), user=os.getenv('DB_USER', 'monitoruser'),
+        password=os.getenv('DB_PASSWORD', 'monitorpass'))
+
+
+def fetch(client, query):
+    response = client.get('/api/checks?' + query)
+    body = response.get_data()
+    document = json.loads(body)
+    if not document.get('success'):
+        raise RuntimeError(f"{query}: {document.get('error')}")
+    return document, len(body)
+
+
+def timed(run, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--targets', type=int, default=20)
+    parser.add_argument('--batch', type=int, default=100000, help='rows per INSERT statement')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--keep', action='store_true', help='keep the scratch schema')
+    args = parser.parse_args()
+
+    conn = connect()
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}; SET search_path = {SCHEMA}')
+    with open(os.path.join(REPO_ROOT, 'db', 'init.sql')) as f:
+        cur.execute(f.read())
+
+    os.environ.setdefault('DB_HOST', 'localhost')
+    import log_api
+    log_api.DB_CONFIG['options'] += f' -c search_path={SCHEMA}'
+    client = log_api.app.test_client()
+
+    try:
+        print(f"Loading {args.rows} checks for {args.targets} targets over {DAYS} days...")
+        for first in range(0, args.rows, args.batch):
+            cur.execute(LOAD_SQL, {'targets': args.targets, 'total': args.rows, 'days': DAYS,
+                                   'start': first, 'stop': min(first + args.batch, args.rows) - 1})
+        cur.execute('ANALYZE')
+
+        print(f"\n{'range':6s} {'query':34s} {'ms':>9s} {'rows':>7s} {'bytes':>10s}")
+        now = time.time()
+        for days in (1, 7, 90):
+            since, until = now - days * 86400, now
+            span = f"since={since}&until={until}"
+
+            def report(name, ms, rows, size):
+                print(f"{days:>4d}d  {name:34s} {ms:9.1f} {rows:7d} {size:10,d}")
+
+            for target, label in (('&target=web0', 'one target'), ('', 'all targets')):
+                ms, (doc, size) = timed(lambda: fetch(client, f"{span}&limit=1000{target}"), args.repeat)
+                report(f"raw first page, {label}", ms, doc['count'], size)
+
+            cur.execute("SELECT COUNT(*) FROM checks WHERE target = 'web0' AND created_at >= to_timestamp(%s) "
+                        "AND created_at < to_timestamp(%s)", (since, until))
+            total = cur.fetchone()[0]
+            pages, cursor, start = 0, None, time.perf_counter()
+            while True:
+                doc, _ = fetch(client, f"{span}&target=web0&limit=1000" + (f"&after={cursor}" if cursor else ""))
+                pages += 1
+                if not doc['next']:
+                    break
+                cursor = doc['next']
+            walk_ms = (time.perf_counter() - start) * 1000
+            report(f"raw walk, one target ({pages} pages)", walk_ms, total, 0)
+
+            if cursor:
+                ms, (doc, size) = timed(
+                    lambda: fetch(client, f"{span}&target=web0&limit=1000&after={cursor}"), args.repeat)
+                report("raw last page, keyset", ms, doc['count'], size)
+                offset = (pages - 1) * 1000
+                params = ('web0', log_api.datetime.fromtimestamp(since, log_api.timezone.utc),
+                          log_api.datetime.fromtimestamp(until, log_api.timezone.utc), offset, 1000)
+                ms, rows = timed(lambda: cur.execute(OFFSET_SQL, params) or cur.fetchall(), args.repeat)
+                report("raw last page, OFFSET (SQL only)", ms, len(rows), 0)
+
+            for mode in ('buckets', 'lttb'):
+                for target, label in (('&target=web0', 'one target'), ('', 'all targets')):
+                    ms, (doc, size) = timed(lambda: fetch(client, f"{span}&mode={mode}&points=500{target}"),
+                                            args.repeat)
+                    report(f"{mode} 500 points, {label} [{doc['source'].replace('checks_rollup_', '')}]",
+                           ms, doc['count'], size)
+    finally:
+        if not args.keep:
+            cur.execute(f'DROP SCHEMA {SCHEMA} CASCADE')
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
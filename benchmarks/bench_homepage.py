@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Homepage publishing benchmark: writes/sec and fsync cost.
+
+Compares the old in-place open(..., "w") rewrite with watchdog's atomic
+publish (temp file + os.replace), with and without fsync, plus the rate of
+unchanged renders that are skipped. Point --dir at the PVC-backed mount
+(e.g. /sites/web1) to measure the real volume; defaults to a temp dir.
+
+Usage: python benchmarks/bench_homepage.py [--dir /sites/web1] [--writes 500]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import fleet  # noqa: F401  (puts watchdog/ on sys.path)
+import watchdog
+
+
+def in_place(path, writes, now):
+    for i in range(writes):
+        content = watchdog.render_homepage({
+            'container_id': 'web1', 'tz': watchdog.TZ,
+            'fetched': (now + timedelta(seconds=i)).strftime('%Y-%m-%d %H:%M:%S %Z'),
+            'local': (now + timedelta(seconds=i)).strftime('%Y-%m-%d %H:%M:%S %Z'),
+        })
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+
+def atomic(path, writes, now, fsync):
+    for i in range(writes):
+        content = watchdog.render_homepage({
+            'container_id': 'web1', 'tz': watchdog.TZ,
+            'fetched': (now + timedelta(seconds=i)).strftime('%Y-%m-%d %H:%M:%S %Z'),
+            'local': (now + timedelta(seconds=i)).strftime('%Y-%m-%d %H:%M:%S %Z'),
+        }).encode("utf-8")
+        watchdog.publish_file(path, content, fsync=fsync)
+
+
+def unchanged(path, writes, now):
+    watchdog.site_path_for = lambda target: path
+    written = sum(watchdog.update_homepage('web1:80', now, now, 'web1') for _ in range(writes))
+    return written
+
+
+def timed(label, writes, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:28s} {writes / elapsed:10.1f} writes/sec  {elapsed / writes * 1e6:9.1f} us/write")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir', help='directory to write into (default: temp dir)')
+    parser.add_argument('--writes', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        path = os.path.join(directory, 'index.html')
+        now = datetime.now().astimezone()
+        timed("in-place open('w')", args.writes, in_place, path, args.writes, now)
+        timed("atomic replace", args.writes, atomic, path, args.writes, now, False)
+        timed("atomic replace + fsync", args.writes, atomic, path, args.writes, now, True)
+        written = timed("unchanged (skip check)", args.writes, unchanged, path, args.writes, now)
+        print(f"unchanged renders written: {written}/{args.writes}")
+
+
+if __name__ == '__main__':
+    main()
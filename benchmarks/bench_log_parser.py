@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Parse-throughput benchmark for the log viewer's line parser.
+
+Compares the original per-call `re.match(pattern, ...)` level extraction
+and formatting with the precompiled single-pass parser, cold and with
+records memoized by file offset, and /api/log_levels-style counting over
+a 500-line tail (old: one pass per level; new: one pass total).
+
+Usage: python benchmarks/bench_log_parser.py [--lines 200000]
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'logging'))
+
+import log_api  # noqa: E402
+
+LEVELS = ['INFO'] * 90 + ['WARNING'] * 8 + ['ERROR'] * 2
+
+
+def old_extract_log_level(line, log_type='watchdog'):
+    """extract_log_level as it was before the shared parser."""
+    if log_type == 'watchdog':
+        pattern = r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d+) - (\w+) - (\w+) - (.+)$'
+        match = re.match(pattern, line.strip())
+        if match:
+            return match.group(3).upper()
+    return None
+
+
+def old_format_log_line(line, log_type='watchdog'):
+    """format_log_line as it was before the shared parser."""
+    line = line.strip()
+    if not line:
+        return ''
+    
+    if log_type == 'watchdog':
+        # Format: 2025-09-02 01:58:16,550 - watchdog - INFO - [main_loop:241] - Message
+        pattern = r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d+) - (\w+) - (\w+) - (.+)$'
+        match = re.match(pattern, line)
+        if match:
+            timestamp, logger, level, message = match.groups()
+            level_class = level.lower()
+            return f'<span class="timestamp">{timestamp}</span> - <span class="log-{level_class}">{level}</span> - {message}'
+    
+    elif log_type == 'metrics':
+        # Format: {"timestamp": "...", "metric": "...", "value": ..., "tags": {...}}
+        # Older files: 2025-09-02 01:58:16,842 - {"timestamp": "...", ...}
+        timestamp = None
+        json_data = line
+        if not line.startswith('{'):
+            pattern = r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d+) - (.+)$'
+            match = re.match(pattern, line)
+            json_data = match.group(2) if match else None
+            timestamp = match.group(1) if match else None
+        if json_data:
+            try:
+                decoded = json.loads(json_data)
+                metric = decoded.get('metric', 'unknown')
+                value = decoded.get('value', 'N/A')
+                tags = decoded.get('tags', {})
+                if timestamp is None:
+                    timestamp = decoded.get('timestamp', '').replace('T', ' ')[:23]
+                
+                tag_str = ''
+                if tags:
+                    tag_pairs = [f"{k}={v}" for k, v in tags.items()]
+                    tag_str = f' [{", ".join(tag_pairs)}]'
+                
+                return f'<span class="timestamp">{timestamp}</span> - <span class="log-info">{metric}</span>: <strong>{value}</strong>{tag_str}'
+            except (json.JSONDecodeError, AttributeError):
+                pass
+    
+    # Fallback: return escaped line
+    return line.replace('<', '&lt;').replace('>', '&gt;')
+
+
+def make_lines(count):
+    watchdog, metrics = [], []
+    for i in range(count):
+        watchdog.append(f"2025-09-02 01:{i // 60 % 60:02d}:{i % 60:02d},{i % 1000:03d} - watchdog - {random.choice(LEVELS)} - "
+                        f"[check_target:{i % 900}] - HTTP check for web{i % 7}: status=200, contains_expected=True")
+        metrics.append(json.dumps({"timestamp": f"2025-09-02T01:00:{i % 60:02d}.123456", "metric": "response_time_ms",
+                                   "value": i % 500, "tags": {"target": f"web{i % 7}"}}))
+    return watchdog, metrics
+
+
+def rate(label, fn, count):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:44s} {count / elapsed / 1000:9.1f} k lines/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=200000)
+    args = parser.parse_args()
+    n = args.lines
+    log_api.PARSE_CACHE_SIZE = n + 1
+    watchdog, metrics = make_lines(n)
+    located = [(1, i * 200, line.encode()) for i, line in enumerate(watchdog)]
+
+    print(f"watchdog lines ({n})")
+    rate("old: extract level + format (2 regex calls)",
+         lambda: [(old_extract_log_level(l), old_format_log_line(l)) for l in watchdog], n)
+    rate("new: parse_line + format_record",
+         lambda: [log_api.format_record(log_api.parse_line(l)) for l in watchdog], n)
+    log_api.parsed_records.clear()
+    rate("new: memoized, cold",
+         lambda: [log_api.format_record(r) for r in log_api.parse_records(located, 'watchdog')], n)
+    rate("new: memoized, warm (repeat poll)",
+         lambda: [log_api.format_record(r) for r in log_api.parse_records(located, 'watchdog')], n)
+
+    print(f"metrics lines ({n})")
+    rate("old: format_log_line", lambda: [old_format_log_line(l, 'metrics') for l in metrics], n)
+    rate("new: parse_line + format_record",
+         lambda: [log_api.format_record(log_api.parse_line(l, 'metrics')) for l in metrics], n)
+    metrics_located = [(2, i * 120, line.encode()) for i, line in enumerate(metrics)]
+    log_api.parsed_records.clear()
+    [log_api.format_record(r) for r in log_api.parse_records(metrics_located, 'metrics')]
+    rate("new: memoized, warm (repeat poll)",
+         lambda: [log_api.format_record(r) for r in log_api.parse_records(metrics_located, 'metrics')], n)
+
+    tail = watchdog[-500:]
+    tail_located = located[-500:]
+    rounds = 200
+
+    def old_levels():
+        for _ in range(rounds):
+            levels = {old_extract_log_level(l) for l in tail} - {None}
+            {level: sum(1 for l in tail if old_extract_log_level(l) == level) for level in levels}
+
+    def new_levels():
+        for _ in range(rounds):
+            log_api.Counter(r.level for r in log_api.parse_records(tail_located, 'watchdog') if r.level)
+
+    print(f"log level counts over a 500-line tail ({rounds} polls)")
+    rate("old: one pass per level", old_levels, 500 * rounds)
+    rate("new: one pass over memoized records", new_levels, 500 * rounds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for /api/logs reads on large log files.
+
+Generates a watchdog.log of each requested size (MB) in a temp dir and
+times, per query: the old full-file deque tail, the reverse block tail,
+the old "tail lines*5 then filter" level query, the indexed level query
+(cold index build and warm), and an indexed one-minute time-range query.
+
+Usage: python benchmarks/bench_log_reader.py [--sizes 10,1024] [--lines 50]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'logging'))
+
+import log_api  # noqa: E402
+from bench_log_parser import old_extract_log_level  # noqa: E402
+
+LEVELS = ['INFO'] * 90 + ['WARNING'] * 8 + ['ERROR'] * 2
+
+
+def generate(path, size_mb):
+    start = datetime(2025, 9, 2, 0, 0, 0)
+    target = size_mb * 1024 * 1024
+    written = 0
+    i = 0
+    with open(path, 'w') as f:
+        while written < target:
+            ts = start + timedelta(milliseconds=250 * i)
+            line = (f"{ts:%Y-%m-%d %H:%M:%S},{ts.microsecond // 1000:03d} - watchdog - {random.choice(LEVELS)} - "
+                    f"[check_target:{i % 900}] - HTTP check for web{i % 7}: status=200, contains_expected=True\n")
+            f.write(line)
+            written += len(line)
+            i += 1
+    return start, start + timedelta(milliseconds=250 * i)
+
+
+def old_tail(path, lines):
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        return list(deque(f, maxlen=lines))
+
+
+def old_level(path, lines, level):
+    raw = old_tail(path, lines * 5)
+    return [line for line in raw if old_extract_log_level(line) == level][-lines:]
+
+
+def timed(label, fn, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"  {label:34s} {best * 1000:10.2f} ms  ({len(result)} lines)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10', help='comma-separated sizes in MB, e.g. 10,1024')
+    parser.add_argument('--lines', type=int, default=50)
+    args = parser.parse_args()
+
+    for size in (int(s) for s in args.sizes.split(',')):
+        with tempfile.TemporaryDirectory() as directory:
+            log_api.LOG_INDEX_DIR = os.path.join(directory, '.index')
+            path = os.path.join(directory, 'watchdog.log')
+            first, last = generate(path, size)
+            print(f"{size} MB ({os.path.getsize(path)} bytes)")
+            timed("old tail (deque over whole file)", old_tail, path, args.lines)
+            timed("reverse block tail", log_api.tail_file, path, args.lines)
+            timed("old ERROR filter (lines*5)", old_level, path, args.lines, 'ERROR')
+            timed("indexed ERROR (cold build)", log_api.indexed_tail, path, 'watchdog', 'ERROR', args.lines, repeat=1)
+            timed("indexed ERROR (warm)", log_api.indexed_tail, path, 'watchdog', 'ERROR', args.lines)
+            middle = (first + (last - first) / 2).timestamp()
+            timed("indexed 1-minute range (warm)", log_api.indexed_tail,
+                  path, 'watchdog', None, 1000, middle, middle + 60)
+
+
+if __name__ == '__main__':
+    main()
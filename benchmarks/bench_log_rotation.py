@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Log rotation benchmark: plain RotatingFileHandler backups against the
+watchdog's CompressedRotatingFileHandler (framed gzip + frame index).
+
+For watchdog.log and metrics.log it writes --mb of synthetic records shaped
+like the watchdog's own (a fleet of --targets checked every 60s of fake
+time, metrics in MetricsPipeline batches) through each handler at the
+production segment size, then reports:
+
+  ratio            uncompressed backup bytes / bytes on disk
+  history          hours of fake time one production budget of disk holds
+                   (the old 5 x 10MB / 10 x 5MB of plain backups)
+  emit_us          p50/p99/max time of one handler.handle() call
+  rollover_ms      mean/max time of one doRollover() in the logging thread
+  compress_ms      mean time of one background compression, and its MB/s
+
+and the latency of the log API's reads over the rotated files, cold (no
+sidecar index, no decompressed frames; the OS page cache stays warm) and
+warm: the newest 50 lines when the live file is empty, a 1-minute range in
+the middle of the history, and the newest 50 ERROR records.
+
+Usage: python benchmarks/bench_log_rotation.py [--mb 200] [--targets 500] [--frame-kb 256]
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'watchdog'))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'logging'))
+
+import log_api  # noqa: E402
+import watchdog  # noqa: E402
+
+# setup_logging()'s formats, and its production rotation sizes and old backup counts
+DETAILED_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(funcName)s:%(lineno)d] - %(message)s'
+SEGMENT_BYTES = {'watchdog': 10 * 1024 * 1024, 'metrics': 5 * 1024 * 1024}
+OLD_BACKUPS = {'watchdog': 5, 'metrics': 10}
+CHECK_INTERVAL = 60.0
+
+
+def watchdog_records(targets, rng):
+    """(fake time, level, funcName, message) for a fleet checked every CHECK_INTERVAL."""
+    now = 1_750_000_000.0
+    step = CHECK_INTERVAL / targets
+    i = 0
+    while True:
+        target = f"web{i % targets}.prod.internal:80"
+        status = 200 if rng.random() > 0.01 else rng.choice([500, 502, 503])
+        rt = rng.lognormvariate(-3.5, 0.8)
+        yield now, logging.INFO, 'check_target', f"Checking target: {target}"
+        yield now, logging.INFO, '_check_target', (
+            f"Probe of {target}: status={status}, contains_expected={status == 200}, response_time={rt:.3f}s")
+        yield now, logging.INFO, '_check_target', (
+            f"Clock skew for {target}: {rng.gauss(0, 3):+.1f}ms (±{rng.uniform(0.2, 9):.1f}ms, time_endpoint)")
+        yield now, logging.INFO, '_check_target', f"Overall check result for {target}: {'PASS' if status == 200 else 'FAIL'}"
+        if status != 200:
+            yield now, logging.WARNING, 'check_target', f"Validation failed for {target}: HTTP {status}"
+            if rng.random() < 0.2:
+                yield now, logging.ERROR, 'http_check', (
+                    f"HTTP check failed for {target}: Traceback (most recent call last):\n"
+                    f'  File "/app/watchdog.py", line 2030, in http_check\n'
+                    f"    response = probe_pool.request(target, path, timeout)\n"
+                    f"ConnectionResetError: [Errno 104] Connection reset by peer")
+        i += 1
+        if i % targets == 0:
+            yield now, logging.INFO, 'main_loop', (
+                f"Completed {targets} checks in the last 10s. Success rate: {rng.uniform(97, 100):.1f}%. "
+                f"Max schedule lag: {rng.uniform(0, 0.05):.2f}s")
+        now += step
+
+
+def metrics_batches(targets, rng):
+    """(fake time, MetricsPipeline-style batch of JSON lines), one batch per second."""
+    now = 1_750_000_000.0
+    per_second = max(1, round(targets / CHECK_INTERVAL))
+    i = 0
+    while True:
+        samples = []
+        for _ in range(per_second):
+            tags = {'target': f"web{i % targets}.prod.internal:80"}
+            ts = datetime.fromtimestamp(now + rng.random()).isoformat()
+            samples += [
+                {'timestamp': ts, 'metric': 'probe_cost', 'value': rng.lognormvariate(-3.5, 0.8),
+                 'tags': dict(tags, probe='get', bytes=rng.randint(1800, 2400), socket_ops=rng.randint(6, 9))},
+                {'timestamp': ts, 'metric': 'http_response_time', 'value': rng.lognormvariate(-3.5, 0.8),
+                 'tags': dict(tags, status_code=200, content_valid=True)},
+                {'timestamp': ts, 'metric': 'http_bytes_read', 'value': rng.randint(1800, 2400),
+                 'tags': dict(tags, content_valid=True)},
+                {'timestamp': ts, 'metric': 'clock_skew_seconds', 'value': rng.gauss(0, 0.003),
+                 'tags': dict(tags, source='time_endpoint')},
+            ]
+            i += 1
+        yield now, "\n".join(json.dumps(s) for s in samples)
+        now += 1.0
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def write_log(log_type, path, compressed, total_bytes, args):
+    """Write total_bytes of records through the handler; returns write stats and the fake time span."""
+    handler_class = watchdog.CompressedRotatingFileHandler if compressed else RotatingFileHandler
+    backups = total_bytes // SEGMENT_BYTES[log_type] + 2  # keep everything written
+    handler = handler_class(path, maxBytes=SEGMENT_BYTES[log_type], backupCount=backups)
+    handler.setFormatter(logging.Formatter(DETAILED_FORMAT if log_type == 'watchdog' else '%(message)s'))
+
+    rollovers, compressions = [], []
+    do_rollover, compress = handler.doRollover, watchdog.compress_log_segment
+
+    def timed_rollover():
+        start = time.perf_counter()
+        do_rollover()
+        rollovers.append(time.perf_counter() - start)
+
+    def timed_compress(segment):
+        start = time.perf_counter()
+        size = os.path.getsize(segment)
+        result = compress(segment, args.frame_kb * 1024, args.level)
+        compressions.append((time.perf_counter() - start, size))
+        return result
+
+    handler.doRollover = timed_rollover
+    watchdog.compress_log_segment = timed_compress
+    emits = []
+    rng = random.Random(args.seed)
+    written = 0
+    first = last = None
+    try:
+        if log_type == 'watchdog':
+            source = ((ts, logging.makeLogRecord({
+                'name': 'watchdog', 'levelno': level, 'levelname': logging.getLevelName(level),
+                'funcName': func, 'lineno': 2080, 'msg': msg, 'created': ts, 'msecs': ts % 1 * 1000}))
+                for ts, level, func, msg in watchdog_records(args.targets, rng))
+        else:
+            source = ((ts, logging.LogRecord('metrics', logging.INFO, __file__, 0, batch, None, None))
+                      for ts, batch in metrics_batches(args.targets, rng))
+        for ts, record in source:
+            first = ts if first is None else first
+            last = ts
+            start = time.perf_counter()
+            handler.handle(record)
+            emits.append(time.perf_counter() - start)
+            written += len(record.getMessage()) + 40
+            if written >= total_bytes:
+                break
+        handler.doRollover()  # the live file starts empty: every read below hits backups
+        if compressed and handler.compressor is not None:
+            handler.compressor.join()
+    finally:
+        watchdog.compress_log_segment = compress
+        handler.close()
+    return {'emits': emits, 'rollovers': rollovers, 'compressions': compressions}, first, last
+
+
+def backup_sizes(path):
+    """(uncompressed bytes, bytes on disk) of every backup of path, from the frame indexes for .gz."""
+    raw = disk = 0
+    for segment in log_api.log_segments(path)[1:]:
+        disk += os.path.getsize(segment)
+        if segment.endswith('.gz'):
+            disk += os.path.getsize(segment + '.idx')
+            with log_api.CompressedSegment(segment) as f:
+                raw += f.size
+        else:
+            raw += os.path.getsize(segment)
+    return raw, disk
+
+
+def timed_read(label, run, reset, repeat=5):
+    reset()
+    start = time.perf_counter()
+    result = run()
+    cold = (time.perf_counter() - start) * 1000
+    warm = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        warm.append((time.perf_counter() - start) * 1000)
+    print(f"    {label:30s} cold {cold:9.2f} ms   warm {statistics.median(warm):9.2f} ms  ({len(result)} lines)")
+
+
+def run(log_type, compressed, args):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f"{log_type}.log")
+        log_api.LOG_INDEX_DIR = os.path.join(directory, '.index')
+        stats, first, last = write_log(log_type, path, compressed, args.mb * 1024 * 1024, args)
+        raw, disk = backup_sizes(path)
+        hours = (last - first) / 3600
+        budget = SEGMENT_BYTES[log_type] * OLD_BACKUPS[log_type]
+        emits, rollovers = stats['emits'], stats['rollovers']
+        print(f"  {'compressed' if compressed else 'plain':10s} backups={len(log_api.log_segments(path)) - 1} "
+              f"ratio={raw / disk:5.2f}x history={hours * budget / disk:7.1f}h "
+              f"(of {hours:.1f}h written)")
+        print(f"    emit_us p50={percentile(emits, 0.5) * 1e6:.1f} p99={percentile(emits, 0.99) * 1e6:.1f} "
+              f"max={max(emits) * 1e6:.0f}   rollover_ms mean={statistics.mean(rollovers) * 1000:.2f} "
+              f"max={max(rollovers) * 1000:.2f} ({len(rollovers)} rollovers)")
+        if stats['compressions']:
+            seconds = sum(s for s, _ in stats['compressions'])
+            size = sum(b for _, b in stats['compressions'])
+            print(f"    compress_ms mean={seconds / len(stats['compressions']) * 1000:.1f} "
+                  f"({size / seconds / 1024 / 1024:.1f} MB/s, off the logging thread)")
+
+        def reset():
+            shutil.rmtree(log_api.LOG_INDEX_DIR, ignore_errors=True)
+            log_api.decompressed_frames.clear()
+
+        middle = first + (last - first) / 2
+        timed_read("tail 50", lambda: log_api.tail_with_cursor(path, 50)[0], reset)
+        timed_read("1-minute range, mid-history", lambda: log_api.indexed_tail(
+            path, log_type, None, 100000, middle, middle + 60), reset)
+        if log_type == 'watchdog':
+            timed_read("newest 50 ERROR", lambda: log_api.indexed_tail(path, log_type, 'ERROR', 50), reset)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mb', type=int, default=200, help='MB of log written per log and handler')
+    parser.add_argument('--targets', type=int, default=500)
+    parser.add_argument('--frame-kb', type=int, default=watchdog.LOG_FRAME_KB)
+    parser.add_argument('--level', type=int, default=watchdog.LOG_COMPRESS_LEVEL, help='gzip level')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    for log_type in ('watchdog', 'metrics'):
+        print(f"{log_type}.log: {args.mb} MB, {SEGMENT_BYTES[log_type] // 1024 // 1024} MB segments, "
+              f"frames of {args.frame_kb} KB at gzip level {args.level}")
+        for compressed in (False, True):
+            run(log_type, compressed, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Per-metric overhead of log_metric, before and after the metrics pipeline.
+
+"before" is the old hot path: json.dumps plus a synchronous
+RotatingFileHandler write with a "%(asctime)s - " prefix per sample.
+"after" is MetricsPipeline.record() on the calling thread, and separately
+the background drain cost per sample (serialise + batched write).
+
+Usage: python benchmarks/bench_metrics.py [--samples 200000]
+"""
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+import fleet  # noqa: F401  (puts watchdog/ on sys.path)
+import watchdog
+
+TAGS = {'target': 'web1:80', 'status_code': 200, 'content_valid': True}
+
+
+def old_log_metric(metrics_logger, metric_name, value, tags=None):
+    metric_data = {
+        'timestamp': datetime.now().isoformat(),
+        'metric': metric_name,
+        'value': value,
+        'tags': tags or {}
+    }
+    metrics_logger.info(json.dumps(metric_data))
+
+
+def report(label, samples, elapsed):
+    print(f"{label:32s} {elapsed / samples * 1e6:8.2f} us/metric  {samples / elapsed:12.0f} metrics/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        handler = RotatingFileHandler(os.path.join(directory, 'old.log'), maxBytes=5*1024*1024, backupCount=10)
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+        metrics_logger = logging.getLogger('bench.old_metrics')
+        metrics_logger.addHandler(handler)
+        metrics_logger.setLevel(logging.INFO)
+        metrics_logger.propagate = False
+
+        start = time.perf_counter()
+        for i in range(args.samples):
+            old_log_metric(metrics_logger, 'http_response_time', 0.0123, TAGS)
+        report("before: json + sync file write", args.samples, time.perf_counter() - start)
+
+        new_handler = RotatingFileHandler(os.path.join(directory, 'new.log'), maxBytes=5*1024*1024, backupCount=10)
+        new_handler.setFormatter(logging.Formatter('%(message)s'))
+        pipeline = watchdog.MetricsPipeline(capacity=args.samples)
+        pipeline.handler = new_handler  # drained manually below, no writer thread
+
+        start = time.perf_counter()
+        for i in range(args.samples):
+            pipeline.record('http_response_time', 0.0123, TAGS)
+        report("after: hot path (record)", args.samples, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        written = pipeline.drain()
+        report("after: background drain", written, time.perf_counter() - start)
+
+        pipeline.capacity = 5
+        for i in range(10):
+            pipeline.record('overflow', i)
+        print(f"backpressure: capacity=5, recorded 10, dropped={pipeline.dropped}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Query-latency benchmark: dashboard aggregates from raw checks vs rollups.
+
+Builds the schema from db/init.sql in a scratch schema, loads N synthetic
+checks spread over the last 7 days (in multi-row INSERT statements, as
+the watchdog's ResultWriter batches them, so the rollup trigger runs),
+then times each dashboard query both ways. The scratch schema is dropped
+afterwards unless --keep is given.
+
+Connection settings come from DB_HOST/DB_PORT/DB_NAME/DB_USER/DB_PASSWORD.
+
+Usage: python benchmarks/bench_rollups.py [--rows 2000000] [--targets 20]
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+import psycopg2
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA = 'bench_rollups'
+
+# The pre-rollup definitions, kept here for comparison
+RAW_QUERIES = {
+    'performance_summary': """
+        SELECT target, COUNT(*), SUM(CASE WHEN status = 'PASS' THEN 1 ELSE 0 END),
+               ROUND((SUM(CASE WHEN status = 'PASS' THEN 1 ELSE 0 END)::NUMERIC / COUNT(*)) * 100, 2),
+               AVG(response_time_ms), MAX(time_drift_seconds), MIN(created_at), MAX(created_at)
+        FROM checks WHERE created_at > NOW() - INTERVAL '24 hours' GROUP BY target""",
+    'system_health': """
+        SELECT 'overall', ROUND(AVG(CASE WHEN status = 'PASS' THEN 100 ELSE 0 END), 2), COUNT(*),
+               AVG(response_time_ms), MAX(time_drift_seconds)
+        FROM checks WHERE created_at > NOW() - INTERVAL '1 hour'""",
+    'hourly_summary': """
+        SELECT DATE_TRUNC('hour', created_at) as hour, target, COUNT(*), AVG(response_time_ms),
+               MAX(time_drift_seconds), SUM(CASE WHEN status = 'FAIL' THEN 1 ELSE 0 END)
+        FROM checks WHERE created_at > NOW() - INTERVAL '7 days'
+        GROUP BY DATE_TRUNC('hour', created_at), target ORDER BY hour DESC""",
+    '/api/metrics': None,  # filled from log_api below
+    # Exact percentiles by sorting raw rows, per target and overall
+    'latency percentiles': """
+        SELECT target, COUNT(response_time_ms),
+               percentile_disc(ARRAY[0.5, 0.9, 0.99]) WITHIN GROUP (ORDER BY response_time_ms),
+               MAX(response_time_ms)
+        FROM checks WHERE created_at > NOW() - INTERVAL '1 hour'
+        GROUP BY GROUPING SETS ((target), ())""",
+}
+ROLLUP_QUERIES = {
+    'performance_summary': 'SELECT * FROM performance_summary',
+    'system_health': 'SELECT * FROM system_health',
+    'hourly_summary': 'SELECT * FROM hourly_summary',
+    '/api/metrics': None,
+    'latency percentiles': None,
+}
+
+LOAD_SQL = """
+    INSERT INTO checks (target, status, http_status, time_drift_seconds, response_time_ms,
+                        fetched_time, local_time, created_at)
+    SELECT 'web' || (i %% %(targets)s),
+           CASE WHEN random() < 0.02 THEN 'FAIL' ELSE 'PASS' END,
+           200, round((random() - 0.5)::NUMERIC, 3), (random() * random() * 800)::INTEGER,
+           NOW(), NOW(),
+           NOW() - INTERVAL '7 days' * (i::FLOAT8 / %(total)s)
+    FROM generate_series(%(start)s, %(stop)s) AS i
+"""
+
+
+def api_queries():
+    import importlib.util
+    spec = importlib.util.spec_from_file_location('log_api_sql', os.path.join(REPO_ROOT, 'logging', 'log_api.py'))
+    source = open(spec.origin).read()
+    namespace = {}
+    for name in ('METRICS_ROLLUP_SQL', 'METRICS_RAW_SQL', 'METRICS_LATENCY_SQL'):
+        start = source.index(f'{name} = """')
+        end = source.index('"""', start + len(name) + 7) + 3
+        exec(source[start:end], namespace)
+    return namespace['METRICS_RAW_SQL'], namespace['METRICS_ROLLUP_SQL'], namespace['METRICS_LATENCY_SQL']
+
+
+def timed(cur, sql, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cur.execute(sql)
+        cur.fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--targets', type=int, default=20)
+    parser.add_argument('--batch', type=int, default=100000, help='rows per INSERT statement')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--keep', action='store_true', help='keep the scratch schema')
+    args = parser.parse_args()
+
+    RAW_QUERIES['/api/metrics'], ROLLUP_QUERIES['/api/metrics'], ROLLUP_QUERIES['latency percentiles'] = api_queries()
+
+    conn = psycopg2.connect(
+        host=os.getenv('DB_HOST', 'localhost'), port=int(os.getenv('DB_PORT', 5432)),
+        dbname=os.getenv('DB_NAME', 'monitoring'), user=os.getenv('DB_USER', 'monitoruser'),
+        password=os.getenv('DB_PASSWORD', 'monitorpass'))
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}; SET search_path = {SCHEMA}')
+    with open(os.path.join(REPO_ROOT, 'db', 'init.sql')) as f:
+        cur.execute(f.read())
+
+    try:
+        print(f"Loading {args.rows} checks for {args.targets} targets over 7 days "
+              f"({args.batch} rows per INSERT)...")
+        start = time.perf_counter()
+        for first in range(0, args.rows, args.batch):
+            cur.execute(LOAD_SQL, {'targets': args.targets, 'total': args.rows,
+                                   'start': first, 'stop': min(first + args.batch, args.rows) - 1})
+        loaded = time.perf_counter() - start
+        cur.execute('ANALYZE')
+        print(f"  with rollup trigger: {args.rows / loaded:,.0f} rows/s")
+
+        sample = min(args.batch, args.rows)
+        cur.execute('ALTER TABLE checks DISABLE TRIGGER checks_rollup')
+        start = time.perf_counter()
+        cur.execute('BEGIN')
+        cur.execute(LOAD_SQL, {'targets': args.targets, 'total': args.rows, 'start': 0, 'stop': sample - 1})
+        cur.execute('ROLLBACK')
+        print(f"  without trigger:     {sample / (time.perf_counter() - start):,.0f} rows/s ({sample} rows)")
+        cur.execute('ALTER TABLE checks ENABLE TRIGGER checks_rollup')
+
+        for table in ('checks', 'checks_rollup_minute', 'checks_rollup_hour', 'checks_rollup_day'):
+            cur.execute(f'SELECT COUNT(*) FROM {table}')
+            print(f"  {table:22s} {cur.fetchone()[0]:>10,} rows")
+
+        print(f"\n{'query':22s} {'raw checks ms':>14s} {'rollups ms':>11s} {'speedup':>8s}")
+        for name in RAW_QUERIES:
+            raw = timed(cur, RAW_QUERIES[name], args.repeat)
+            rolled = timed(cur, ROLLUP_QUERIES[name], args.repeat)
+            print(f"{name:22s} {raw:14.2f} {rolled:11.2f} {raw / rolled:7.1f}x")
+    finally:
+        if not args.keep:
+            cur.execute(f'DROP SCHEMA {SCHEMA} CASCADE')
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
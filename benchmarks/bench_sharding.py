@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Sharding check: several watchdog replicas against one Postgres.
+
+Starts --replicas processes, each running the real ShardCoordinator and
+CheckScheduler/dispatch_due loop over the same --targets fake targets
+(check_target is replaced by a stub that reports who checked what and
+when). After a steady phase one replica is SIGKILLed, later a new one
+joins. For every phase it reports how many checks ran against the
+ideal of one per target per interval, duplicates (a target checked
+again within half an interval) and gaps (no check for 1.5 intervals),
+plus how long the dead replica's targets went unchecked. Expect gaps
+after the kill (its targets wait out the TTL) and a few duplicates at the
+join: until the others' next heartbeat both old and new owner check the
+moved targets, so the count scales with heartbeat / interval.
+
+Needs the watchdog_replicas table from db/init.sql. Connection settings
+come from DB_HOST/DB_PORT/DB_NAME/DB_USER/DB_PASSWORD; the replicas use
+their own shard group, removed afterwards.
+
+Usage: python benchmarks/bench_sharding.py [--replicas 3] [--targets 60] [--interval 2]
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from collections import defaultdict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'watchdog'))
+
+
+def replica(replica_id, group, targets, interval, heartbeat, ttl, checks):
+    import logging
+    from concurrent.futures import ThreadPoolExecutor
+
+    import watchdog
+
+    logging.basicConfig(level=logging.WARNING)
+    watchdog.logger = logging.getLogger(replica_id)
+
+    def check_target(target):
+        checks.put((replica_id, target, time.time()))
+        return True
+
+    watchdog.check_target = check_target
+    watchdog.TARGETS = targets
+    watchdog.shard_coordinator = watchdog.ShardCoordinator(
+        enabled=True, group=group, replica_id=replica_id, heartbeat=heartbeat, ttl=ttl)
+    watchdog.shard_coordinator.start()
+
+    executor = ThreadPoolExecutor(max_workers=8)
+    scheduler = watchdog.CheckScheduler(targets, intervals={}, default_interval=interval)
+    stats = {'results': [], 'max_lag': 0.0}
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    while True:
+        watchdog.dispatch_due(executor, scheduler, stats, time.monotonic())
+        stats['results'].clear()
+        scheduler.wait(time.monotonic() + interval)
+
+
+def phase_report(name, checks, targets, interval, start, end):
+    by_target = defaultdict(list)
+    for replica_id, target, at in checks:
+        if start <= at < end:
+            by_target[target].append(at)
+    expected = len(targets) * (end - start) / interval
+    total = sum(len(times) for times in by_target.values())
+    duplicates = gaps = 0
+    for target in targets:
+        times = sorted(by_target.get(target, []))
+        edges = [start] + times + [end]
+        gaps += sum(1 for a, b in zip(edges, edges[1:]) if b - a > 1.5 * interval)
+        duplicates += sum(1 for a, b in zip(times, times[1:]) if b - a < 0.5 * interval)
+    print(f"{name:22s} checks={total:6d} ideal={expected:8.0f} ({total / expected:6.1%}) "
+          f"duplicates={duplicates:4d} gaps={gaps:4d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--replicas', type=int, default=3)
+    parser.add_argument('--targets', type=int, default=60)
+    parser.add_argument('--interval', type=float, default=2.0, help='check interval per target (s)')
+    parser.add_argument('--heartbeat', type=float, default=0.2)
+    parser.add_argument('--ttl', type=float, default=1.0)
+    parser.add_argument('--phase', type=float, default=20.0, help='seconds per phase')
+    args = parser.parse_args()
+
+    group = f"bench-{os.getpid()}"
+    targets = [f"target-{i}:80" for i in range(args.targets)]
+    ctx = multiprocessing.get_context('spawn')
+    checks_queue = ctx.Queue()
+    procs = {}
+
+    def spawn(replica_id):
+        proc = ctx.Process(target=replica, daemon=True, args=(
+            replica_id, group, targets, args.interval, args.heartbeat, args.ttl, checks_queue))
+        proc.start()
+        procs[replica_id] = proc
+
+    checks = []
+
+    def collect(until):
+        while time.time() < until:
+            try:
+                checks.append(checks_queue.get(timeout=0.1))
+            except Exception:
+                pass
+
+    try:
+        for i in range(args.replicas):
+            spawn(f"replica-{i}")
+        collect(time.time() + 3)  # let every replica join and settle
+        t0 = time.time()
+        collect(t0 + args.phase)
+
+        victim = 'replica-0'
+        orphans = {t for r, t, at in checks if r == victim and at >= t0}
+        os.kill(procs[victim].pid, signal.SIGKILL)
+        t1 = time.time()
+        collect(t1 + args.phase)
+
+        spawn(f"replica-{args.replicas}")
+        t2 = time.time()
+        collect(t2 + args.phase)
+        t3 = time.time()
+    finally:
+        for proc in procs.values():
+            if proc.is_alive():
+                proc.terminate()
+        for proc in procs.values():
+            proc.join(timeout=5)
+
+    owners = defaultdict(set)
+    for r, t, at in checks:
+        if t0 <= at < t1:
+            owners[t].add(r)
+    print(f"replicas={args.replicas} targets={args.targets} interval={args.interval}s "
+          f"heartbeat={args.heartbeat}s ttl={args.ttl}s")
+    print(f"steady-state targets checked by more than one replica: "
+          f"{sum(1 for r in owners.values() if len(r) > 1)}")
+    per_replica = defaultdict(int)
+    for replicas in owners.values():
+        for r in replicas:
+            per_replica[r] += 1
+    print(f"targets per replica: {dict(sorted(per_replica.items()))}")
+    phase_report('steady', checks, targets, args.interval, t0, t1)
+    phase_report('after SIGKILL', checks, targets, args.interval, t1, t2)
+    phase_report('after join', checks, targets, args.interval, t2, t3)
+
+    taken_over = [min((at for r, t, at in checks if t == target and r != victim and at >= t1), default=None)
+                  for target in orphans]
+    if orphans and all(taken_over):
+        print(f"{len(orphans)} targets of the killed replica resumed within {max(taken_over) - t1:.2f}s "
+              f"(expected <= ttl + heartbeat + interval = {args.ttl + args.heartbeat + args.interval:.2f}s)")
+    else:
+        print(f"{sum(1 for t in taken_over if t is None)} of {len(orphans)} orphaned targets never resumed")
+
+    import psycopg2
+    conn = psycopg2.connect(
+        host=os.getenv('DB_HOST', 'localhost'), port=int(os.getenv('DB_PORT', 5432)),
+        dbname=os.getenv('DB_NAME', 'monitoring'), user=os.getenv('DB_USER', 'monitoruser'),
+        password=os.getenv('DB_PASSWORD', 'monitorpass'))
+    with conn, conn.cursor() as cur:
+        cur.execute('DELETE FROM watchdog_replicas WHERE shard_group = %s', (group,))
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+"""
+Stub web fleet for watchdog benchmarks.
+
+Runs N tiny HTTP servers on 127.0.0.1 inside one asyncio loop on a background
+thread, so a benchmark can point WEB_TARGETS at hundreds of "containers"
+without Docker. Responses can be delayed by a latency distribution and,
+at given rates, be errors, hang, or dribble their body. SMTPSink is a
+stand-in mail server that accepts and counts alert emails.
+"""
+
+import asyncio
+import hashlib
+import math
+import os
+import random
+import sys
+import threading
+import time
+from email.utils import formatdate
+
+# Make watchdog/watchdog.py importable from the benchmark scripts
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'watchdog'))
+
+EXPECT_TEXT = "Multi-Container Monitoring OK"
+DEFAULT_BODY = f"<!doctype html><html><body><h1>{EXPECT_TEXT}</h1></body></html>"
+ERROR_BODY = b"<!doctype html><html><body><h1>Internal Server Error</h1></body></html>"
+
+
+def latency_sampler(spec, rng=random):
+    """Callable returning one latency (s) from a spec string.
+
+    "0.05" or "fixed:0.05", "uniform:0.01:0.2", "exp:0.05" (mean) or
+    "lognormal:0.05:0.8" (median, sigma: a long tail).
+    """
+    kind, _, params = spec.partition(':') if ':' in spec else ('fixed', '', spec)
+    args = [float(p) for p in params.split(':')]
+    if kind == 'fixed':
+        return lambda: args[0]
+    if kind == 'uniform':
+        return lambda: rng.uniform(args[0], args[1])
+    if kind == 'exp':
+        return lambda: rng.expovariate(1 / args[0])
+    if kind == 'lognormal':
+        mu = math.log(args[0])
+        return lambda: rng.lognormvariate(mu, args[1])
+    raise ValueError(f"Unknown latency distribution '{spec}'")
+
+
+class LoopThread:
+    """An asyncio loop on a daemon thread; subclasses start and stop their servers on it."""
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self._stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+class StubFleet(LoopThread):
+    """N HTTP/1.1 servers that answer every request with the same page.
+
+    The page carries an ETag; a matching If-None-Match gets a 304.
+
+    latency: seconds to wait before answering (per request), or a
+        latency_sampler() spec string for a distribution
+    slow_every: every Nth target answers after slow_latency instead
+    error_rate: fraction of requests answered 500 without the expected text
+    hang_rate: fraction of requests never answered (held for hang_seconds)
+    slow_body_rate: fraction of bodies sent in 8 pieces over slow_body_seconds
+    seed: makes the random choices repeatable
+    """
+
+    def __init__(self, count, latency=0.0, body=DEFAULT_BODY, slow_every=0, slow_latency=0.0,
+                 error_rate=0.0, hang_rate=0.0, hang_seconds=60.0, slow_body_rate=0.0,
+                 slow_body_seconds=1.0, seed=None):
+        super().__init__()
+        self.count = count
+        self.rng = random.Random(seed)
+        self.latency = latency_sampler(latency, self.rng) if isinstance(latency, str) else (lambda: latency)
+        self.body = body.encode('utf-8')
+        self.etag = f'"{hashlib.md5(self.body).hexdigest()[:16]}"'.encode()
+        self.slow_every = slow_every
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.slow_body_rate = slow_body_rate
+        self.slow_body_seconds = slow_body_seconds
+        self.targets = []
+        self.requests_served = 0
+        self.errors_served = 0
+        self.hangs = 0
+        self.slow_bodies = 0
+        self._servers = []
+        self._handlers = set()
+
+    async def _start(self):
+        for i in range(self.count):
+            slow = self.slow_every and i % self.slow_every == 0
+            delay = (lambda: self.slow_latency) if slow else self.latency
+            server = await asyncio.start_server(
+                lambda r, w, d=delay: self._handle(r, w, d), '127.0.0.1', 0, backlog=1024
+            )
+            port = server.sockets[0].getsockname()[1]
+            self._servers.append(server)
+            self.targets.append(f"127.0.0.1:{port}")
+
+    async def _stop(self):
+        for server in self._servers:
+            server.close()
+        # Keep-alive clients may still hold connections open
+        for task in list(self._handlers):
+            task.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        for server in self._servers:
+            await server.wait_closed()
+
+    async def _handle(self, reader, writer, delay):
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                keep_alive = True
+                not_modified = False
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    if header.lower().startswith(b'connection:') and b'close' in header.lower():
+                        keep_alive = False
+                    if header.lower().startswith(b'if-none-match:') and self.etag in header:
+                        not_modified = True
+                wait = delay()
+                if wait:
+                    await asyncio.sleep(wait)
+                fault = self.rng.random()
+                if fault < self.hang_rate:
+                    self.hangs += 1
+                    await asyncio.sleep(self.hang_seconds)
+                    break
+                head_only = request_line.startswith(b'HEAD ')
+                # Like nginx's "return 200 $msec" on /time
+                if request_line.split()[1:2] == [b'/time']:
+                    body, etag = f"{time.time():.3f}\n".encode(), b""
+                else:
+                    body, etag = self.body, b"ETag: " + self.etag + b"\r\n"
+                if fault < self.hang_rate + self.error_rate:
+                    self.errors_served += 1
+                    status, body, etag = b"500 Internal Server Error", ERROR_BODY, b""
+                elif not_modified and etag:
+                    status, body, head_only = b"304 Not Modified", b"", True
+                else:
+                    status = b"200 OK"
+                dribble = not head_only and self.rng.random() < self.slow_body_rate
+                writer.write(
+                    b"HTTP/1.1 " + status + b"\r\n"
+                    b"Date: " + formatdate(usegmt=True).encode() + b"\r\n"
+                    b"Content-Type: text/html\r\n"
+                    + etag
+                    + (b"Content-Length: " + str(len(body)).encode() + b"\r\n" if body else b"")
+                    + (b"Connection: keep-alive\r\n" if keep_alive else b"Connection: close\r\n")
+                    + b"\r\n"
+                    + (b"" if head_only or dribble else body)
+                )
+                if dribble:
+                    self.slow_bodies += 1
+                    piece = -(-len(body) // 8)
+                    for offset in range(0, len(body), piece):
+                        await writer.drain()
+                        await asyncio.sleep(self.slow_body_seconds / 8)
+                        writer.write(body[offset:offset + piece])
+                await writer.drain()
+                self.requests_served += 1
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+
+
+class SMTPSink(LoopThread):
+    """Minimal SMTP server on 127.0.0.1 that accepts every message and counts it."""
+
+    def __init__(self):
+        super().__init__()
+        self.port = None
+        self.messages = 0
+        self.recipients = 0
+        self._server = None
+        self._handlers = set()
+
+    async def _start(self):
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def _stop(self):
+        self._server.close()
+        # The watchdog keeps its SMTP connection open between alerts
+        for task in list(self._handlers):
+            task.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        writer.write(b"220 sink ESMTP\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line[:4].upper()
+                if command == b"DATA":
+                    writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    await reader.readuntil(b"\r\n.\r\n")
+                    self.messages += 1
+                    writer.write(b"250 OK queued\r\n")
+                elif command == b"QUIT":
+                    writer.write(b"221 Bye\r\n")
+                    break
+                elif command == b"EHLO":
+                    writer.write(b"250-sink\r\n250 8BITMIME\r\n")
+                else:
+                    if command == b"RCPT":
+                        self.recipients += 1
+                    writer.write(b"250 OK\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.CancelledError):
+            pass
+        finally:
+            self._handlers.discard(task)
+            writer.close()
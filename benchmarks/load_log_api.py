@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Load-test harness for the log viewer API.
+
+For each endpoint and each concurrency level, N client threads issue
+requests back to back over keep-alive connections for a fixed duration.
+Reports req/s, p50/p99 latency and errors per step.
+
+Usage:
+  python benchmarks/load_log_api.py                       # via nginx on :8090
+  python benchmarks/load_log_api.py --base-url http://127.0.0.1:5000 \
+      --concurrency 1,8,32,128 --duration 15 --json results.json
+"""
+
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlparse
+
+DEFAULT_PATHS = [
+    '/api/logs?type=watchdog&lines=50',
+    '/api/logs?type=watchdog&lines=50&level=ERROR',
+    '/api/metrics',
+]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def client(host, port, path, deadline, latencies, errors, lock):
+    conn = http.client.HTTPConnection(host, port, timeout=35)
+    local, failed = [], 0
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                failed += 1
+                continue
+            local.append(time.perf_counter() - start)
+        except (OSError, http.client.HTTPException):
+            failed += 1
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=35)
+            time.sleep(0.05)  # don't spin while the server is down
+    conn.close()
+    with lock:
+        latencies.extend(local)
+        errors[0] += failed
+
+
+def run_step(host, port, path, concurrency, duration):
+    latencies, errors, lock = [], [0], threading.Lock()
+    deadline = time.monotonic() + duration
+    threads = [threading.Thread(target=client, args=(host, port, path, deadline, latencies, errors, lock))
+               for _ in range(concurrency)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+    latencies.sort()
+    return {
+        'path': path,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:8090')
+    parser.add_argument('--concurrency', default='1,4,16,64')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--path', action='append', dest='paths', help='endpoint to test (repeatable)')
+    parser.add_argument('--json', help='also write results to this file')
+    args = parser.parse_args()
+
+    url = urlparse(args.base_url)
+    host, port = url.hostname, url.port or 80
+    results = []
+    print(f"{'endpoint':48s} {'conc':>5s} {'req/s':>9s} {'p50 ms':>9s} {'p99 ms':>9s} {'errors':>7s}")
+    for path in args.paths or DEFAULT_PATHS:
+        for concurrency in (int(c) for c in args.concurrency.split(',')):
+            step = run_step(host, port, path, concurrency, args.duration)
+            results.append(step)
+            print(f"{path:48s} {concurrency:5d} {step['rps']:9.1f} {step['p50_ms']:9.2f} "
+                  f"{step['p99_ms']:9.2f} {step['errors']:7d}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'base_url': args.base_url, 'duration_sec': args.duration, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,72 +1,391 @@
 -- Multi-Container Monitoring Database Schema
 -- Consolidated schema with enhanced logging and monitoring capabilities
 
--- Main checks table with enhanced monitoring columns
+-- Main checks table with enhanced monitoring columns.
+-- checks and metrics are range-partitioned by day (UTC) on their time
+-- column; monitoring_maintenance() below creates upcoming partitions and
+-- drops or archives expired ones. Rows outside any daily partition land in
+-- the DEFAULT partition and are moved out when their day's partition is made.
 CREATE TABLE IF NOT EXISTS checks (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     target VARCHAR(50) NOT NULL,
     status VARCHAR(10) NOT NULL,
     http_status INTEGER,
-    time_drift_seconds INTEGER,
+    time_drift_seconds NUMERIC(12,3),
     response_time_ms INTEGER,
     fetched_time TIMESTAMPTZ,
     local_time TIMESTAMPTZ,
-    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
-);
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
 
 -- Metrics table for structured metric storage
 CREATE TABLE IF NOT EXISTS metrics (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     timestamp TIMESTAMPTZ NOT NULL DEFAULT NOW(),
     metric_name VARCHAR(100) NOT NULL,
     metric_value NUMERIC NOT NULL,
     tags JSONB,
-    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+-- Default partitions. A database created before partitioning keeps its plain
+-- tables; they work as before and partition maintenance leaves them alone.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'checks'::regclass) THEN
+        CREATE TABLE IF NOT EXISTS checks_default PARTITION OF checks DEFAULT;
+    END IF;
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'metrics'::regclass) THEN
+        CREATE TABLE IF NOT EXISTS metrics_default PARTITION OF metrics DEFAULT;
+    END IF;
+END
+$$;
+
+-- Live watchdog replicas. Replicas in the same shard_group heartbeat here
+-- and split their targets by consistent hashing over the rows younger than
+-- the shard TTL (see ShardCoordinator in watchdog.py).
+CREATE TABLE IF NOT EXISTS watchdog_replicas (
+    shard_group VARCHAR(50) NOT NULL,
+    replica_id VARCHAR(100) NOT NULL,
+    hostname VARCHAR(100),
+    started_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    heartbeat_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (shard_group, replica_id)
+);
+
+-- Rollups: per-target aggregates at minute, hour and day resolution, kept
+-- current by a statement-level trigger on checks so dashboards never scan
+-- raw rows. Buckets follow the server's timezone setting, like the views
+-- they replace. Response times are summarized as count/sum/min/max plus a
+-- log-scale histogram (see rollup_hist_bounds) for percentiles.
+CREATE TABLE IF NOT EXISTS checks_rollup_minute (
+    bucket TIMESTAMPTZ NOT NULL,
+    target VARCHAR(50) NOT NULL,
+    checks INTEGER NOT NULL,
+    passes INTEGER NOT NULL,
+    rt_count INTEGER NOT NULL,
+    rt_sum BIGINT NOT NULL,
+    rt_min INTEGER,
+    rt_max INTEGER,
+    rt_hist INTEGER[] NOT NULL,
+    max_drift NUMERIC(12,3),
+    first_check TIMESTAMPTZ NOT NULL,
+    last_check TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (bucket, target)
 );
+CREATE TABLE IF NOT EXISTS checks_rollup_hour (LIKE checks_rollup_minute INCLUDING ALL);
+CREATE TABLE IF NOT EXISTS checks_rollup_day (LIKE checks_rollup_minute INCLUDING ALL);
+
+-- Histogram slot i counts response times in [bounds[i-1], bounds[i]) ms;
+-- slot 1 is below the first bound, the last slot is at or above the last.
+-- Bounds are ceil(1.15^k): exact up to 11 ms, then ~7% wide up to ~62 s,
+-- 74 slots in all. The watchdog's LatencyHistogram uses the same layout,
+-- so sketches from either side merge by adding counts.
+CREATE OR REPLACE FUNCTION rollup_hist_bounds() RETURNS INTEGER[]
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT array_agg(DISTINCT CEIL(POWER(1.15::FLOAT8, k))::INTEGER ORDER BY CEIL(POWER(1.15::FLOAT8, k))::INTEGER)
+    FROM generate_series(0, 79) AS k
+$$;
+
+CREATE OR REPLACE FUNCTION rollup_hist_add(a INTEGER[], b INTEGER[]) RETURNS INTEGER[]
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE WHEN a IS NULL THEN b
+                WHEN b IS NULL THEN a
+                ELSE ARRAY(SELECT COALESCE(x, 0) + COALESCE(y, 0)
+                           FROM unnest(a, b) WITH ORDINALITY AS t(x, y, i) ORDER BY i)
+           END
+$$;
+
+CREATE OR REPLACE AGGREGATE rollup_hist_sum(INTEGER[]) (
+    SFUNC = rollup_hist_add,
+    STYPE = INTEGER[]
+);
+
+-- Approximate quantile (0..1) from a histogram, interpolated linearly
+-- within the slot holding it and capped at the observed maximum
+CREATE OR REPLACE FUNCTION rollup_hist_quantile(hist INTEGER[], q NUMERIC, max_ms INTEGER)
+RETURNS INTEGER LANGUAGE sql IMMUTABLE AS $$
+    SELECT LEAST(
+        ROUND(lower_ms + (COALESCE(upper_ms, max_ms) - lower_ms) * (q * total - (running - c)) / c)::INTEGER,
+        max_ms)
+    FROM (
+        SELECT c, SUM(c) OVER (ORDER BY i) AS running, SUM(c) OVER () AS total,
+               COALESCE(b[i::INTEGER - 1], 0) AS lower_ms, b[i::INTEGER] AS upper_ms
+        FROM unnest(hist) WITH ORDINALITY AS t(c, i), rollup_hist_bounds() AS b
+    ) slots
+    WHERE c > 0 AND running >= q * total
+    ORDER BY running
+    LIMIT 1
+$$;
+
+-- Per-group histogram as plain aggregates: ARRAY[COUNT(*) FILTER (slot 0), ...]
+-- over a `rt_slot` column computed once per row (see rollup_merge_sql)
+CREATE OR REPLACE FUNCTION rollup_hist_agg_sql() RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT 'ARRAY[' || string_agg(format('COUNT(*) FILTER (WHERE rt_slot = %s)', slot),
+                                  ', ' ORDER BY slot) || ']::INTEGER[]'
+    FROM generate_series(0, array_length(rollup_hist_bounds(), 1)) AS slot
+$$;
+
+-- Upsert aggregates of `source` (any relation shaped like checks) into one rollup table
+CREATE OR REPLACE FUNCTION rollup_merge_sql(grain TEXT, source TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT format($sql$
+        INSERT INTO %I AS r (bucket, target, checks, passes, rt_count, rt_sum, rt_min, rt_max,
+                             rt_hist, max_drift, first_check, last_check)
+        SELECT DATE_TRUNC(%L, created_at), target,
+               COUNT(*), COUNT(*) FILTER (WHERE status = 'PASS'),
+               COUNT(response_time_ms), COALESCE(SUM(response_time_ms), 0),
+               MIN(response_time_ms), MAX(response_time_ms),
+               %s,
+               MAX(time_drift_seconds), MIN(created_at), MAX(created_at)
+        FROM (SELECT *, width_bucket(response_time_ms, %L::INTEGER[]) AS rt_slot FROM %s) src
+        GROUP BY 1, 2
+        ON CONFLICT (bucket, target) DO UPDATE SET
+            checks = r.checks + EXCLUDED.checks,
+            passes = r.passes + EXCLUDED.passes,
+            rt_count = r.rt_count + EXCLUDED.rt_count,
+            rt_sum = r.rt_sum + EXCLUDED.rt_sum,
+            rt_min = LEAST(r.rt_min, EXCLUDED.rt_min),
+            rt_max = GREATEST(r.rt_max, EXCLUDED.rt_max),
+            rt_hist = rollup_hist_add(r.rt_hist, EXCLUDED.rt_hist),
+            max_drift = GREATEST(r.max_drift, EXCLUDED.max_drift),
+            first_check = LEAST(r.first_check, EXCLUDED.first_check),
+            last_check = GREATEST(r.last_check, EXCLUDED.last_check)
+    $sql$, 'checks_rollup_' || grain, grain, rollup_hist_agg_sql(), rollup_hist_bounds(), source)
+$$;
+
+-- One upsert per (bucket, target) per INSERT statement, so batched writes
+-- from the watchdog cost a handful of rollup updates rather than one per row
+CREATE OR REPLACE FUNCTION rollup_checks() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    grain TEXT;
+BEGIN
+    FOREACH grain IN ARRAY ARRAY['minute', 'hour', 'day'] LOOP
+        EXECUTE rollup_merge_sql(grain, 'new_checks');
+    END LOOP;
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE TRIGGER checks_rollup
+    AFTER INSERT ON checks
+    REFERENCING NEW TABLE AS new_checks
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_checks();
+
+-- Recompute rollups from raw checks from `since` on (whole buckets), e.g.
+-- after adding rollups to a database that already holds checks:
+--   SELECT rollup_rebuild();
+CREATE OR REPLACE FUNCTION rollup_rebuild(since TIMESTAMPTZ DEFAULT '-infinity') RETURNS VOID
+LANGUAGE plpgsql AS $$
+DECLARE
+    grain TEXT;
+    start TIMESTAMPTZ;
+BEGIN
+    FOREACH grain IN ARRAY ARRAY['minute', 'hour', 'day'] LOOP
+        start := DATE_TRUNC(grain, since);
+        EXECUTE format('DELETE FROM %I WHERE bucket >= %L', 'checks_rollup_' || grain, start);
+        EXECUTE rollup_merge_sql(grain, format('(SELECT * FROM checks WHERE created_at >= %L) c', start));
+    END LOOP;
+END
+$$;
+
+-- Partition maintenance ----------------------------------------------------
+
+-- Partition key column of `parent`, or NULL if it is a plain table
+CREATE OR REPLACE FUNCTION partition_key(parent TEXT) RETURNS TEXT
+LANGUAGE sql STABLE AS $$
+    SELECT a.attname::TEXT
+    FROM pg_partitioned_table pt
+    JOIN pg_attribute a ON a.attrelid = pt.partrelid AND a.attnum = pt.partattrs[0]
+    WHERE pt.partrelid = parent::regclass
+$$;
+
+-- Create the partition of `parent` for one UTC day (named <parent>_pYYYYMMDD),
+-- first moving that day's rows out of the default partition. Returns FALSE
+-- if it already exists or `parent` is not partitioned.
+CREATE OR REPLACE FUNCTION partition_ensure(parent TEXT, day DATE) RETURNS BOOLEAN
+LANGUAGE plpgsql AS $$
+DECLARE
+    part TEXT := parent || '_p' || to_char(day, 'YYYYMMDD');
+    key TEXT := partition_key(parent);
+    lower_bound TIMESTAMPTZ := day::TIMESTAMP AT TIME ZONE 'UTC';
+    upper_bound TIMESTAMPTZ := (day + 1)::TIMESTAMP AT TIME ZONE 'UTC';
+BEGIN
+    IF key IS NULL OR to_regclass(part) IS NOT NULL THEN
+        RETURN FALSE;
+    END IF;
+    
+    EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS)', part, parent);
+    EXECUTE format('WITH moved AS (DELETE FROM %I WHERE %I >= %L AND %I < %L RETURNING *) '
+                   'INSERT INTO %I SELECT * FROM moved',
+                   parent || '_default', key, lower_bound, key, upper_bound, part);
+    EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   parent, part, lower_bound, upper_bound);
+    RETURN TRUE;
+END
+$$;
+
+-- Keep `parent`'s daily partitions from yesterday to `premake_days` ahead,
+-- and remove partitions older than `retention_days` (0 keeps everything):
+-- dropped, or detached into the `archive` schema when `archive` is set.
+-- Expired strays in the default partition are deleted unless archiving.
+CREATE OR REPLACE FUNCTION partition_maintain(parent TEXT, retention_days INTEGER,
+                                              premake_days INTEGER DEFAULT 3,
+                                              archive BOOLEAN DEFAULT FALSE)
+RETURNS TEXT[] LANGUAGE plpgsql AS $$
+DECLARE
+    today DATE := (NOW() AT TIME ZONE 'UTC')::DATE;
+    cutoff DATE := today - retention_days;
+    day DATE;
+    part TEXT;
+    removed INTEGER;
+    actions TEXT[] := '{}';
+BEGIN
+    IF partition_key(parent) IS NULL THEN
+        RETURN actions;
+    END IF;
+    FOR day IN SELECT generate_series(today - 1, today + premake_days, INTERVAL '1 day')::DATE LOOP
+        IF partition_ensure(parent, day) THEN
+            actions := actions || format('created %s_p%s', parent, to_char(day, 'YYYYMMDD'));
+        END IF;
+    END LOOP;
+    
+    IF retention_days <= 0 THEN
+        RETURN actions;
+    END IF;
+    FOR part IN
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = parent::regclass AND c.relname ~ ('^' || parent || '_p\d{8}$')
+        ORDER BY c.relname
+    LOOP
+        IF to_date(right(part, 8), 'YYYYMMDD') < cutoff THEN
+            IF archive THEN
+                CREATE SCHEMA IF NOT EXISTS archive;
+                EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', parent, part);
+                EXECUTE format('ALTER TABLE %I SET SCHEMA archive', part);
+                actions := actions || format('archived %s', part);
+            ELSE
+                EXECUTE format('DROP TABLE %I', part);
+                actions := actions || format('dropped %s', part);
+            END IF;
+        END IF;
+    END LOOP;
+    IF NOT archive THEN
+        EXECUTE format('DELETE FROM %I WHERE %I < %L', parent || '_default', partition_key(parent),
+                       cutoff::TIMESTAMP AT TIME ZONE 'UTC');
+        GET DIAGNOSTICS removed = ROW_COUNT;
+        IF removed > 0 THEN
+            actions := actions || format('deleted %s expired rows from %s_default', removed, parent);
+        END IF;
+    END IF;
+    RETURN actions;
+END
+$$;
+
+-- One maintenance pass over raw tables and rollups; run periodically by the
+-- watchdog (MAINTENANCE_INTERVAL_SEC) or by hand:
+--   SELECT monitoring_maintenance();
+CREATE OR REPLACE FUNCTION monitoring_maintenance(checks_days INTEGER DEFAULT 30,
+                                                  metrics_days INTEGER DEFAULT 14,
+                                                  rollup_minute_days INTEGER DEFAULT 3,
+                                                  rollup_hour_days INTEGER DEFAULT 90,
+                                                  rollup_day_days INTEGER DEFAULT 0,
+                                                  premake_days INTEGER DEFAULT 3,
+                                                  archive BOOLEAN DEFAULT FALSE)
+RETURNS TEXT[] LANGUAGE plpgsql AS $$
+DECLARE
+    actions TEXT[];
+    removed INTEGER;
+    grain TEXT;
+    keep_days INTEGER;
+BEGIN
+    -- Concurrent runs (several watchdog replicas) would race on CREATE TABLE
+    PERFORM pg_advisory_xact_lock(hashtext('monitoring_maintenance'));
+    actions := partition_maintain('checks', checks_days, premake_days, archive)
+            || partition_maintain('metrics', metrics_days, premake_days, archive);
+    
+    FOR grain, keep_days IN VALUES ('minute', rollup_minute_days), ('hour', rollup_hour_days),
+                                   ('day', rollup_day_days) LOOP
+        CONTINUE WHEN keep_days <= 0;
+        EXECUTE format('DELETE FROM %I WHERE bucket < NOW() - %L::INTERVAL',
+                       'checks_rollup_' || grain, keep_days || ' days');
+        GET DIAGNOSTICS removed = ROW_COUNT;
+        IF removed > 0 THEN
+            actions := actions || format('pruned %s rows from checks_rollup_%s', removed, grain);
+        END IF;
+    END LOOP;
+    RETURN actions;
+END
+$$;
 
 -- Performance summary view for monitoring dashboard
 CREATE OR REPLACE VIEW performance_summary AS
 SELECT 
     target,
-    COUNT(*) as total_checks,
-    SUM(CASE WHEN status = 'PASS' THEN 1 ELSE 0 END) as successful_checks,
+    total_checks,
+    successful_checks,
     ROUND(
-        (SUM(CASE WHEN status = 'PASS' THEN 1 ELSE 0 END)::NUMERIC / COUNT(*)) * 100, 
+        (successful_checks::NUMERIC / total_checks) * 100, 
         2
     ) as availability_percent,
-    AVG(response_time_ms) as avg_response_time_ms,
-    MAX(time_drift_seconds) as max_time_drift,
-    MIN(created_at) as first_check,
-    MAX(created_at) as last_check
-FROM checks 
-WHERE created_at > NOW() - INTERVAL '24 hours'
-GROUP BY target;
+    avg_response_time_ms,
+    max_time_drift,
+    first_check,
+    last_check,
+    rollup_hist_quantile(hist, 0.95, max_ms) as p95_response_time_ms,
+    rollup_hist_quantile(hist, 0.5, max_ms) as p50_response_time_ms,
+    rollup_hist_quantile(hist, 0.9, max_ms) as p90_response_time_ms,
+    rollup_hist_quantile(hist, 0.99, max_ms) as p99_response_time_ms,
+    max_ms as max_response_time_ms
+FROM (
+    SELECT
+        target,
+        SUM(checks) as total_checks,
+        SUM(passes) as successful_checks,
+        SUM(rt_sum)::NUMERIC / NULLIF(SUM(rt_count), 0) as avg_response_time_ms,
+        MAX(max_drift) as max_time_drift,
+        MIN(first_check) as first_check,
+        MAX(last_check) as last_check,
+        rollup_hist_sum(rt_hist) as hist,
+        MAX(rt_max) as max_ms
+    FROM (
+        -- Whole hours from the hour rollup, the partial oldest hour from minutes
+        SELECT * FROM checks_rollup_hour
+        WHERE bucket >= DATE_TRUNC('hour', NOW() - INTERVAL '24 hours') + INTERVAL '1 hour'
+        UNION ALL
+        SELECT * FROM checks_rollup_minute
+        WHERE bucket > NOW() - INTERVAL '24 hours'
+          AND bucket < DATE_TRUNC('hour', NOW() - INTERVAL '24 hours') + INTERVAL '1 hour'
+    ) last_24h
+    GROUP BY target
+) merged;
 
 -- System health dashboard view
 CREATE OR REPLACE VIEW system_health AS
 SELECT 
     'overall' as metric_type,
-    ROUND(AVG(
-        CASE WHEN status = 'PASS' THEN 100 ELSE 0 END
-    ), 2) as availability_percent,
-    COUNT(*) as total_checks_last_hour,
-    AVG(response_time_ms) as avg_response_time_ms,
-    MAX(time_drift_seconds) as max_drift_seconds
-FROM checks 
-WHERE created_at > NOW() - INTERVAL '1 hour';
+    ROUND(SUM(passes)::NUMERIC * 100 / NULLIF(SUM(checks), 0), 2) as availability_percent,
+    COALESCE(SUM(checks), 0) as total_checks_last_hour,
+    SUM(rt_sum)::NUMERIC / NULLIF(SUM(rt_count), 0) as avg_response_time_ms,
+    MAX(max_drift) as max_drift_seconds
+FROM checks_rollup_minute 
+WHERE bucket > NOW() - INTERVAL '1 hour';
 
 -- Hourly monitoring summary view
 CREATE OR REPLACE VIEW hourly_summary AS
 SELECT 
-    DATE_TRUNC('hour', created_at) as hour,
+    bucket as hour,
     target,
-    COUNT(*) as checks_per_hour,
-    AVG(response_time_ms) as avg_response_time_ms,
-    MAX(time_drift_seconds) as max_drift,
-    SUM(CASE WHEN status = 'FAIL' THEN 1 ELSE 0 END) as failures
-FROM checks 
-WHERE created_at > NOW() - INTERVAL '7 days'
-GROUP BY DATE_TRUNC('hour', created_at), target
+    checks::BIGINT as checks_per_hour,
+    rt_sum::NUMERIC / NULLIF(rt_count, 0) as avg_response_time_ms,
+    max_drift::NUMERIC as max_drift,
+    (checks - passes)::BIGINT as failures
+FROM checks_rollup_hour 
+WHERE bucket > NOW() - INTERVAL '7 days'
 ORDER BY hour DESC;
 
 -- Performance indexes
@@ -74,6 +393,9 @@ CREATE INDEX IF NOT EXISTS idx_checks_target_time ON checks (target, created_at
 CREATE INDEX IF NOT EXISTS idx_checks_status_time ON checks (status, created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_metrics_name_time ON metrics (metric_name, timestamp DESC);
 
+-- Create today's and the next few days' partitions
+SELECT monitoring_maintenance();
+
 -- Initialize system
 INSERT INTO metrics (metric_name, metric_value, tags)
 SELECT 'system_initialized', 1, '{"component": "database", "version": "consolidated"}'::jsonb
@@ -0,0 +1,35 @@
+"""
+Gunicorn settings for the log API in production (started by start.sh).
+
+Threaded workers: long-poll requests and Server-Sent Events streams each
+hold a thread while they wait, so a few processes with many threads serve
+far more viewers than one-request-per-process sync workers.
+
+Graceful reload (new code or settings, no dropped requests):
+    kill -HUP $(cat /run/log-api.pid)
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv('LOG_API_BIND', '127.0.0.1:5000')
+workers = int(os.getenv('LOG_API_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = 'gthread'
+threads = int(os.getenv('LOG_API_THREADS', 16))
+
+# Worker heartbeat: with gthread the arbiter restarts a worker whose main
+# loop has not checked in for this long. It does not limit a request's
+# duration; requests are bounded by long-poll <= 25s, DB statement_timeout
+# 10s and nginx's proxy_read_timeout.
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then so slow leaks can't accumulate
+max_requests = 10000
+max_requests_jitter = 1000
+
+pidfile = '/run/log-api.pid'
+accesslog = None
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
@@ -4,14 +4,26 @@ Multi-Container Monitoring Log API Server
 Dynamic log reading and metrics API using Python Flask
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 import os
 import json
 import psycopg2
-from datetime import datetime
+import psycopg2.errors
+import psycopg2.pool
+from datetime import datetime, timedelta, timezone
 import re
-from collections import deque
+import gzip
+import fcntl
+import shutil
+import struct
+import bisect
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from itertools import groupby
+from contextlib import contextmanager
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
@@ -23,118 +35,1113 @@ DB_CONFIG = {
     'database': os.getenv('DB_NAME', 'monitoring'),
     'user': os.getenv('DB_USER', 'monitoruser'),
     'password': os.getenv('DB_PASSWORD', 'monitorpass'),
-    'port': int(os.getenv('DB_PORT', 5432))
+    'port': int(os.getenv('DB_PORT', 5432)),
+    # Keep queries well inside nginx's 30s proxy_read_timeout
+    'options': f"-c statement_timeout={int(os.getenv('LOG_API_STATEMENT_TIMEOUT_MS', 10000))}",
+    'connect_timeout': 5
+}
+# Per-process connection pool (each gunicorn worker gets its own and keeps
+# all DB_POOL_SIZE connections open: budget workers * DB_POOL_SIZE against
+# Postgres max_connections)
+DB_POOL_SIZE = int(os.getenv('LOG_API_DB_POOL_SIZE', 4))
+DB_POOL_TIMEOUT = float(os.getenv('LOG_API_DB_POOL_TIMEOUT', 5))
+# Dashboard aggregates are served from a per-process cache for this long
+METRICS_CACHE_TTL = float(os.getenv('LOG_API_METRICS_TTL', 5))
+# /api/checks: rows per page and points per target are capped; the rollup
+# retention (same settings as the watchdog's maintenance) decides which
+# table can still answer a downsampled query for a given start time
+HISTORY_PAGE_SIZE = int(os.getenv('LOG_API_HISTORY_PAGE_SIZE', 1000))
+HISTORY_MAX_PAGE_SIZE = 10000
+HISTORY_MAX_POINTS = 5000
+HISTORY_FETCH_SIZE = 2000  # rows per round trip of the server-side cursor
+LTTB_OVERSAMPLE = 8  # LTTB picks each point among at least this many candidates
+HISTORY_SOURCES = [  # (table, granularity in seconds, days kept; 0 = forever)
+    ('checks', 0, int(os.getenv('RETENTION_CHECKS_DAYS', 30))),
+    ('checks_rollup_minute', 60, int(os.getenv('RETENTION_ROLLUP_MINUTE_DAYS', 3))),
+    ('checks_rollup_hour', 3600, int(os.getenv('RETENTION_ROLLUP_HOUR_DAYS', 90))),
+    ('checks_rollup_day', 86400, int(os.getenv('RETENTION_ROLLUP_DAY_DAYS', 0))),
+]
+LOG_FILES = {
+    'watchdog': os.path.join(LOG_DIR, 'watchdog.log'),
+    'metrics': os.path.join(LOG_DIR, 'metrics.log')
 }
 
-def tail_file(filename, lines=50):
-    """Read last N lines from a file efficiently"""
-    if not os.path.exists(filename):
-        return [f"Error: File not found - {filename}"]
+# Log reading: files are read backwards from EOF in fixed-size blocks, and
+# level/time queries go through a sidecar index kept next to the logs.
+# Rotated backups are plain (<log>.N) or compressed by the watchdog into
+# gzip frames with a frame index (<log>.N.gz + .idx, see CompressedSegment)
+TAIL_BLOCK_SIZE = 64 * 1024
+MAX_BACKUPS = int(os.getenv('LOG_MAX_BACKUPS', 100))  # at least WATCHDOG_LOG_BACKUPS/METRICS_LOG_BACKUPS
+LOG_INDEX_DIR = os.getenv('LOG_INDEX_DIR', os.path.join(LOG_DIR, '.index'))
+INDEX_ENTRY = struct.Struct('<Qd')  # byte offset, unix timestamp
+FRAME_ENTRY = struct.Struct('<QQdd5I')  # uncompressed offset, compressed offset, first/last record time,
+FRAME_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')  # then records of each level
+FRAME_CACHE_SIZE = 16  # decompressed frames kept per process (~256KB each)
+
+WATCHDOG_LINE_RE = re.compile(rb'^(\d{4})-(\d{2})-(\d{2}) (\d{2}):(\d{2}):(\d{2}),(\d+) - (\w+) - (\w+) - ')
+METRICS_PREFIX_RE = re.compile(rb'^(\d{4})-(\d{2})-(\d{2}) (\d{2}):(\d{2}):(\d{2}),(\d+) - ')
+METRICS_TIMESTAMP_RE = re.compile(rb'"timestamp": "([^"]+)"')
+
+# Incremental streaming: clients hold an opaque cursor (inode + byte offset)
+# and receive only lines appended after it. One follower thread per log polls
+# the file and fans new lines out to every connected viewer.
+STREAM_POLL_SEC = float(os.getenv('LOG_STREAM_POLL_SEC', 0.5))
+STREAM_KEEPALIVE_SEC = 15  # well under nginx proxy_read_timeout (30s)
+STREAM_MAX_CATCHUP = 1024 * 1024  # cursors further behind than this get a reset
+STREAM_RECENT_BATCHES = 128  # batches kept in memory for viewers a little behind
+MAX_LONG_POLL_SEC = 25
+STREAM_MAX_SEC = int(os.getenv('LOG_STREAM_MAX_SEC', 300))  # then the browser reconnects via Last-Event-ID
+
+def log_segments(filename):
+    """The live log file followed by its rotated backups, newest first.
+    
+    A backup is read from <log>.N while it exists and from <log>.N.gz once
+    the watchdog has compressed it.
+    """
+    segments = [filename] if os.path.exists(filename) else []
+    for i in range(1, MAX_BACKUPS + 1):
+        backup = f"{filename}.{i}"
+        if not os.path.exists(backup):
+            backup += '.gz'
+            if not os.path.exists(backup):
+                break
+        segments.append(backup)
+    return segments
+
+decompressed_frames = OrderedDict()  # (inode, frame number) -> bytes, least recently used first
+decompressed_frames_lock = threading.Lock()
+
+class CompressedSegment:
+    """Read-only, seekable view of a compressed backup as its original bytes.
+    
+    The watchdog writes <log>.N.gz as a series of gzip members, each holding
+    whole lines, and <log>.N.gz.idx as one FRAME_ENTRY per frame plus a
+    closing entry with the total sizes. seek()/read()/readline() address
+    uncompressed offsets and decompress only the frames they touch, so
+    read_lines_backwards() serves a tail from the last frame or two, and
+    tail() skips frames outside a time range, or without a record of the
+    wanted level, by their index entry alone. A level query still has to
+    decompress every frame that holds a match (about 1ms per 256KB frame),
+    but parses only the lines carrying the level, not every line.
+    Without a matching index (a foreign .gz, or one shifted mid-read) the
+    whole file is a single frame.
+    """
+    
+    def __init__(self, path):
+        self.f = open(path, 'rb')
+        stat = os.fstat(self.f.fileno())
+        self.inode = stat.st_ino
+        self.frames = self._load_index(path + '.idx', stat.st_size)
+        if self.frames is None:
+            whole = gzip.decompress(self.f.read())
+            self._cache(0, whole)
+            unknown = (1,) * len(FRAME_LEVELS)  # level counts: never skip the frame
+            self.frames = [(0, 0, float('-inf'), float('inf')) + unknown,
+                           (len(whole), stat.st_size, float('inf'), float('inf')) + unknown]
+        self.offsets = [entry[0] for entry in self.frames]
+        self.size = self.offsets[-1]
+        self.position = 0
+    
+    @staticmethod
+    def _load_index(path, compressed_size):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        frames = [FRAME_ENTRY.unpack_from(data, i * FRAME_ENTRY.size)
+                  for i in range(len(data) // FRAME_ENTRY.size)]
+        if len(frames) < 2 or frames[-1][1] != compressed_size:
+            return None
+        return frames
+    
+    def _cache(self, number, data):
+        with decompressed_frames_lock:
+            decompressed_frames[(self.inode, number)] = data
+            while len(decompressed_frames) > FRAME_CACHE_SIZE:
+                decompressed_frames.popitem(last=False)
+    
+    def frame(self, number):
+        """Uncompressed bytes of frame `number`."""
+        key = (self.inode, number)
+        with decompressed_frames_lock:
+            data = decompressed_frames.get(key)
+            if data is not None:
+                decompressed_frames.move_to_end(key)
+                return data
+        start, end = self.frames[number][1], self.frames[number + 1][1]
+        self.f.seek(start)
+        data = gzip.decompress(self.f.read(end - start))
+        self._cache(number, data)
+        return data
     
+    def seek(self, offset):
+        self.position = offset
+    
+    def tell(self):
+        return self.position
+    
+    def _read(self, size, until_newline):
+        parts = []
+        while size > 0 and self.position < self.size:
+            number = bisect.bisect_right(self.offsets, self.position) - 1
+            start = self.position - self.offsets[number]
+            data = self.frame(number)
+            end = min(len(data), start + size)
+            if until_newline:
+                newline = data.find(b'\n', start, end)
+                if newline >= 0:
+                    end = newline + 1
+                    size = end - start
+            parts.append(data[start:end])
+            self.position += end - start
+            size -= end - start
+        return b''.join(parts)
+    
+    def read(self, size=-1):
+        return self._read(self.size - self.position if size < 0 else size, False)
+    
+    def readline(self):
+        return self._read(self.size - self.position, True)
+    
+    def tail(self, log_type, level=None, lines=50, since=None, until=None):
+        """indexed_tail() within this segment: newest N lines matching level
+        and/or [since, until), oldest first, decompressing only the frames
+        whose time bounds overlap the range and that hold the level."""
+        count_column = 4 + FRAME_LEVELS.index(level) if level in FRAME_LEVELS else None
+        chunk = []  # newest first
+        for number in range(len(self.frames) - 2, -1, -1):
+            entry = self.frames[number]
+            first_ts, last_ts = entry[2], entry[3]
+            if until is not None and first_ts >= until:
+                continue
+            if since is not None and last_ts < since:
+                break
+            if level:
+                if count_column is not None and not entry[count_column]:
+                    continue  # no record of this level in the frame
+                found = self._level_lines(number, log_type, level, since, until)
+            else:
+                found = self._range_lines(number, log_type, since, until)
+            chunk.extend(reversed(found))
+            if len(chunk) >= lines:
+                break
+        chunk = chunk[:lines]
+        chunk.reverse()
+        return chunk
+    
+    def _level_lines(self, number, log_type, level, since, until):
+        """Records of `level` in [since, until) in one frame, as (inode, offset, line)."""
+        data = self.frame(number)
+        marker = f" - {level} - ".encode()
+        found = []
+        position = data.find(marker)
+        while position >= 0:
+            start = data.rfind(b'\n', 0, position) + 1
+            end = data.find(b'\n', position)
+            end = len(data) if end < 0 else end
+            line = data[start:end]
+            key = index_key(line, log_type)
+            if (key is not None and key[1] == level and (since is None or key[0] >= since)
+                    and (until is None or key[0] < until)):
+                found.append((self.inode, self.offsets[number] + start, line))
+            position = data.find(marker, end)
+        return found
+    
+    def _range_lines(self, number, log_type, since, until):
+        """Every line in one frame whose record falls in [since, until)."""
+        # Continuation lines at the top of a frame belong to a record from about its first time
+        line_ts = self.frames[number][2]
+        offset = self.offsets[number]
+        found = []
+        for line in self.frame(number).split(b'\n')[:-1]:
+            key = index_key(line, log_type)
+            if key is not None:
+                line_ts = key[0]
+            if line and (since is None or line_ts >= since) and (until is None or line_ts < until):
+                found.append((self.inode, offset, line))
+            offset += len(line) + 1
+        return found
+    
+    def starts_before(self, ts):
+        """True if this segment holds records older than ts."""
+        return self.frames[0][2] < ts
+    
+    def close(self):
+        self.f.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+def open_segment(segment):
+    """A log segment opened for reading: the file itself, or a CompressedSegment."""
+    return CompressedSegment(segment) if segment.endswith('.gz') else open(segment, 'rb')
+
+def segment_stat(f):
+    """(inode, size in uncompressed bytes) of an open segment."""
+    if isinstance(f, CompressedSegment):
+        return f.inode, f.size
+    stat = os.fstat(f.fileno())
+    return stat.st_ino, stat.st_size
+
+def read_lines_backwards(f, end, start=0):
+    """Yield (offset, raw line) from byte end back to byte start, newest first."""
+    remainder = b''
+    position = end
+    while position > start:
+        size = min(TAIL_BLOCK_SIZE, position - start)
+        position -= size
+        f.seek(position)
+        block = f.read(size) + remainder
+        lines = block.split(b'\n')
+        # The first piece may be the tail of a line that starts in an earlier block
+        remainder = lines.pop(0)
+        offset = position + len(remainder) + 1
+        found = []
+        for line in lines:
+            found.append((offset, line))
+            offset += len(line) + 1
+        for item in reversed(found):
+            if item[1]:
+                yield item
+    if remainder:
+        yield start, remainder
+
+def tail_with_cursor(filename, lines=50):
+    """Last N complete lines of a log (continuing into rotated backups) as
+    (inode, offset, raw line), oldest first, and the cursor just past them,
+    from which read_since() resumes."""
+    segments = log_segments(filename)
+    if not segments:
+        raise FileNotFoundError(f"File not found - {filename}")
+    
+    collected = []
+    cursor = None
+    for segment in segments:
+        with open_segment(segment) as f:
+            inode, end = segment_stat(f)
+            if cursor is None:
+                # A line still being written is left for the next read
+                f.seek(max(end - 1, 0))
+                if end and f.read(1) != b'\n':
+                    end = next(read_lines_backwards(f, end))[0]
+                cursor = make_cursor(inode, end)
+            for offset, line in read_lines_backwards(f, end):
+                collected.append((inode, offset, line))
+                if len(collected) >= lines:
+                    break
+        if len(collected) >= lines:
+            break
+    collected.reverse()
+    return collected, cursor
+
+def tail_file(filename, lines=50):
+    """Read last N lines from a log, continuing into rotated backups if needed"""
     try:
-        # Use deque for efficient tail operation
-        with open(filename, 'r', encoding='utf-8', errors='ignore') as f:
-            return list(deque(f, maxlen=lines))
+        located, _ = tail_with_cursor(filename, lines)
+        return [line.decode('utf-8', errors='ignore') + '\n' for _, _, line in located]
+    except FileNotFoundError as e:
+        return [f"Error: {str(e)}"]
     except Exception as e:
         return [f"Error reading file: {str(e)}"]
 
-def extract_log_level(line, log_type='watchdog'):
-    """Extract log level from a log line"""
+def _line_time(match):
+    year, month, day, hour, minute, second, millis = (int(g) for g in match.groups()[:7])
+    return datetime(year, month, day, hour, minute, second, millis * 1000).timestamp()
+
+def index_key(line, log_type):
+    """(timestamp, level) for a raw log line, or None if it starts no record."""
     if log_type == 'watchdog':
-        # Format: 2025-09-02 01:58:16,550 - watchdog - INFO - [main_loop:241] - Message
-        pattern = r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d+) - (\w+) - (\w+) - (.+)$'
-        match = re.match(pattern, line.strip())
+        match = WATCHDOG_LINE_RE.match(line)
         if match:
-            return match.group(3).upper()  # Return the log level (INFO, ERROR, WARNING, etc.)
+            return _line_time(match), match.group(9).decode().upper()
+        return None
+    
+    match = METRICS_PREFIX_RE.match(line)
+    if match:
+        return _line_time(match), None
+    match = METRICS_TIMESTAMP_RE.search(line)
+    if match:
+        try:
+            return datetime.fromisoformat(match.group(1).decode()).timestamp(), None
+        except ValueError:
+            pass
     return None
 
-def filter_logs_by_level(lines, log_type='watchdog', level_filter=None):
-    """Filter log lines by log level"""
-    if not level_filter or level_filter.upper() == 'ALL':
-        return lines
+class LogIndex:
+    """Sidecar index for one open log file: byte offset -> timestamp, per level.
+    
+    Stored under LOG_INDEX_DIR/<log name>/<inode>/ so it follows the file
+    through RotatingFileHandler renames (watchdog.log -> watchdog.log.1 keeps
+    the inode). ALL.idx lists every line that starts a record; <LEVEL>.idx
+    lists only that level's lines. Entries are fixed-size INDEX_ENTRY records,
+    so a level tail reads the last N entries directly and time bounds are a
+    binary search. refresh() indexes only bytes appended since last time.
+    """
     
-    level_filter = level_filter.upper()
-    filtered_lines = []
+    HEAD_BYTES = 256  # file prefix fingerprint, guards against inode reuse
     
-    for line in lines:
-        line_level = extract_log_level(line, log_type)
-        if line_level == level_filter:
-            filtered_lines.append(line)
+    def __init__(self, f, log_name, log_type):
+        self.f = f
+        self.log_type = log_type
+        self.inode = os.fstat(f.fileno()).st_ino
+        self.directory = os.path.join(LOG_INDEX_DIR, log_name, str(self.inode))
     
-    return filtered_lines
+    def _entry_file(self, level):
+        return os.path.join(self.directory, f"{level or 'ALL'}.idx")
+    
+    def refresh(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, 'lock'), 'a+') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            size = os.fstat(self.f.fileno()).st_size
+            self.f.seek(0)
+            head = self.f.read(self.HEAD_BYTES)
+            meta = self._load_meta()
+            indexed = meta.get('end', 0)
+            if not head.startswith(bytes.fromhex(meta.get('head', ''))) or size < indexed:
+                # Different file behind a reused inode, or truncated: start over
+                for name in os.listdir(self.directory):
+                    if name.endswith('.idx'):
+                        os.remove(os.path.join(self.directory, name))
+                indexed = 0
+            if size > indexed:
+                indexed = self._index_range(indexed, size)
+            self._save_meta({'end': indexed, 'head': head.hex()})
+    
+    def _load_meta(self):
+        try:
+            with open(os.path.join(self.directory, 'meta.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _save_meta(self, meta):
+        tmp = os.path.join(self.directory, 'meta.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(self.directory, 'meta.json'))
+    
+    def _index_range(self, start, end):
+        """Index complete lines in [start, end); returns the offset indexed up to."""
+        f = self.f
+        f.seek(start)
+        entries = {}
+        offset = start
+        while offset < end:
+            chunk = f.read(min(4 * 1024 * 1024, end - offset))
+            last_newline = chunk.rfind(b'\n')
+            if last_newline < 0:
+                break  # partial line still being written
+            chunk = chunk[:last_newline + 1]
+            for line in chunk.split(b'\n')[:-1]:
+                key = index_key(line, self.log_type)
+                if key is not None:
+                    packed = INDEX_ENTRY.pack(offset, key[0])
+                    entries.setdefault(None, []).append(packed)
+                    if key[1]:
+                        entries.setdefault(key[1], []).append(packed)
+                offset += len(line) + 1
+            f.seek(offset)
+        for level, packed in entries.items():
+            with open(self._entry_file(level), 'ab') as out:
+                out.write(b''.join(packed))
+        return offset
+    
+    def _entries(self, level):
+        try:
+            with open(self._entry_file(level), 'rb') as f:
+                return f.read()
+        except OSError:
+            return b''
+    
+    @staticmethod
+    def _bisect(data, ts):
+        """First entry index whose timestamp is >= ts."""
+        lo, hi = 0, len(data) // INDEX_ENTRY.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if INDEX_ENTRY.unpack_from(data, mid * INDEX_ENTRY.size)[1] < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+    
+    def find(self, level=None, lines=50, since=None, until=None):
+        """Offsets of the newest `lines` indexed lines matching level/time, oldest first."""
+        data = self._entries(level)
+        count = len(data) // INDEX_ENTRY.size
+        first = self._bisect(data, since) if since is not None else 0
+        last = self._bisect(data, until) if until is not None else count
+        first = max(first, last - lines)
+        return [INDEX_ENTRY.unpack_from(data, i * INDEX_ENTRY.size)[0] for i in range(first, last)]
+    
+    def time_bounds(self, since=None, until=None):
+        """Byte range [start, end) holding the records from since up to until."""
+        data = self._entries(None)
+        count = len(data) // INDEX_ENTRY.size
+        size = os.fstat(self.f.fileno()).st_size
+        def offset_at(i):
+            return INDEX_ENTRY.unpack_from(data, i * INDEX_ENTRY.size)[0] if i < count else size
+        start = offset_at(self._bisect(data, since)) if since is not None else 0
+        end = offset_at(self._bisect(data, until)) if until is not None else size
+        return start, end
+    
+    def starts_before(self, ts):
+        """True if this file holds records older than ts."""
+        data = self._entries(None)
+        return len(data) >= INDEX_ENTRY.size and INDEX_ENTRY.unpack_from(data, 0)[1] < ts
 
-def format_log_line(line, log_type='watchdog'):
-    """Format log lines with syntax highlighting"""
-    line = line.strip()
-    if not line:
-        return ''
+def prune_indexes(log_name, live_inodes):
+    """Drop index directories of files that have rotated out of existence."""
+    directory = os.path.join(LOG_INDEX_DIR, log_name)
+    try:
+        for name in os.listdir(directory):
+            if name.isdigit() and int(name) not in live_inodes:
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    except OSError:
+        pass
+
+def indexed_tail(filename, log_type, level=None, lines=50, since=None, until=None):
+    """Newest N lines matching level and/or [since, until) across all segments,
+    as (inode, offset, raw line), oldest first.
+    
+    With a level, only lines that start a record of that level are returned
+    (continuation lines such as tracebacks carry no level). Without one, every
+    line in the time range is returned.
+    """
+    segments = log_segments(filename)
+    if not segments:
+        raise FileNotFoundError(f"File not found - {filename}")
+    
+    log_name = os.path.basename(filename)
+    collected = []  # oldest first
+    live_inodes = set()
+    for segment in segments:
+        try:
+            f = open_segment(segment)
+        except FileNotFoundError:
+            continue  # rotated away while we were reading
+        with f:
+            wanted = lines - len(collected)
+            chunk = []
+            if isinstance(f, CompressedSegment):
+                index = f  # compressed backups carry their own frame index
+                chunk = f.tail(log_type, level, wanted, since, until)
+            else:
+                index = LogIndex(f, log_name, log_type)
+                live_inodes.add(index.inode)
+                index.refresh()
+                if level:
+                    for offset in index.find(level, wanted, since, until):
+                        f.seek(offset)
+                        chunk.append((index.inode, offset, f.readline().rstrip(b'\n')))
+                else:
+                    start, end = index.time_bounds(since, until)
+                    for offset, line in read_lines_backwards(f, end, start):
+                        chunk.append((index.inode, offset, line))
+                        if len(chunk) >= wanted:
+                            break
+                    chunk.reverse()
+            collected = chunk + collected
+            if len(collected) >= lines or (since is not None and index.starts_before(since)):
+                break
+    
+    live_inodes.update(os.stat(s).st_ino for s in segments if os.path.exists(s))
+    prune_indexes(log_name, live_inodes)
+    return collected
+
+def scan_backwards_filtered(filename, log_type, level, lines=50):
+    """Level filter without an index: read backwards until N matches are found."""
+    collected = []
+    for segment in log_segments(filename):
+        with open_segment(segment) as f:
+            inode, size = segment_stat(f)
+            for offset, line in read_lines_backwards(f, size):
+                key = index_key(line, log_type)
+                if key is not None and key[1] == level:
+                    collected.append((inode, offset, line))
+                    if len(collected) >= lines:
+                        break
+        if len(collected) >= lines:
+            break
+    collected.reverse()
+    return collected
+
+def parse_time_arg(value):
+    """Query-string time (ISO 8601 or unix seconds) -> unix seconds, or None."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def make_cursor(inode, offset):
+    return f"{inode:x}-{offset:x}"
+
+def parse_cursor(cursor):
+    """Cursor string -> (inode, offset), or None if it is malformed."""
+    try:
+        inode, offset = cursor.split('-')
+        return int(inode, 16), int(offset, 16)
+    except (AttributeError, ValueError):
+        return None
+
+def read_since(filename, cursor, max_bytes=STREAM_MAX_CATCHUP):
+    """Complete lines appended after cursor, as [(inode, offset, raw line)],
+    plus the cursor to resume from.
+    
+    If the cursor's file has been rotated, its remainder is read from the
+    backup and then every newer segment. Returns (None, None) when the cursor
+    is unknown, rotated out, or more than max_bytes behind; the caller should
+    start over from a fresh tail.
+    """
+    parsed = parse_cursor(cursor)
+    if parsed is None:
+        return None, None
+    inode, offset = parsed
+    
+    segments = []  # newest first
+    for segment in log_segments(filename):
+        if segment.endswith('.gz'):
+            break  # cursors only point into the live file and plain backups
+        try:
+            segments.append((segment, os.stat(segment)))
+        except FileNotFoundError:
+            pass
+    position = next((i for i, (_, st) in enumerate(segments) if st.st_ino == inode), None)
+    if position is None or segments[position][1].st_size < offset:
+        return None, None  # rotated out of existence, or truncated
+    backlog = segments[position][1].st_size - offset + sum(st.st_size for _, st in segments[:position])
+    if backlog > max_bytes:
+        return None, None
+    
+    found = []
+    for path, st in reversed(segments[:position + 1]):
+        start = offset if st.st_ino == inode else 0
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_ino != st.st_ino:
+                return None, None  # rotated while we were reading
+            f.seek(start)
+            data = f.read(max_bytes + 1)
+        complete = data[:data.rfind(b'\n') + 1]
+        for line in complete.split(b'\n')[:-1]:
+            found.append((st.st_ino, start, line))
+            start += len(line) + 1
+        inode, offset = st.st_ino, start
+        if len(complete) < len(data):
+            break  # a partial line ends the readable data
+    return found, make_cursor(inode, offset)
+
+class LogFollower:
+    """Shared tail -f of one log file.
+    
+    A single thread stat-polls the file every STREAM_POLL_SEC, reads the
+    complete lines appended since the last poll, formats them once, and keeps
+    the most recent batches in memory. Viewers wait on a condition and pick up
+    the batch that continues their cursor, so N viewers cost one read of the
+    new bytes rather than N tails. Viewers whose cursor is no longer in memory
+    catch up from disk with read_since().
+    """
+    
+    def __init__(self, filename, log_type):
+        self.filename = filename
+        self.log_type = log_type
+        self.cond = threading.Condition()
+        self.position = None  # (inode, offset) read up to
+        self.batches = deque(maxlen=STREAM_RECENT_BATCHES)
+        self.ready = threading.Event()
+        self.thread = None
+        self.error = None  # last error logged, until the file can be read again
+    
+    def start(self):
+        with self.cond:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name=f'follow-{self.log_type}', daemon=True)
+                self.thread.start()
+        self.ready.wait(STREAM_POLL_SEC * 4)
+    
+    def cursor(self):
+        self.start()
+        with self.cond:
+            return make_cursor(*self.position) if self.position else None
+    
+    def _run(self):
+        f = None
+        while True:
+            try:
+                if f is None:
+                    f = open(self.filename, 'rb')
+                    stat = os.fstat(f.fileno())
+                    with self.cond:
+                        self.position = (stat.st_ino, stat.st_size)
+                    self.ready.set()
+                    if self.error is not None:
+                        app.logger.info(f"Log follower for {self.filename}: reading again")
+                        self.error = None
+                self._read_new(f)
+                try:
+                    current = os.stat(self.filename).st_ino
+                except FileNotFoundError:
+                    current = None
+                if current is not None and current != self.position[0]:
+                    # Rotated: drain what the old file got before the rename,
+                    # then continue at the start of the new one
+                    self._read_new(f)
+                    f.close()
+                    f = open(self.filename, 'rb')
+                    self._read_new(f, start=0)
+            except OSError as e:
+                # Polled every STREAM_POLL_SEC: log a missing file once, not on every poll
+                if str(e) != self.error:
+                    app.logger.warning(f"Log follower for {self.filename}: {e}")
+                    self.error = str(e)
+                if f is not None:
+                    f.close()
+                f = None
+            time.sleep(STREAM_POLL_SEC)
+    
+    def _read_new(self, f, start=None):
+        inode = os.fstat(f.fileno()).st_ino
+        previous = self.position
+        offset = previous[1] if start is None else start
+        if os.fstat(f.fileno()).st_size < offset:
+            offset = 0  # truncated in place
+        f.seek(offset)
+        data = f.read()
+        complete = data[:data.rfind(b'\n') + 1]
+        entries = []
+        end = offset
+        for line in complete.split(b'\n')[:-1]:
+            if line.strip():
+                record = parse_record(inode, end, line, self.log_type)
+                entries.append((end, record.level, format_record(record)))
+            end += len(line) + 1
+        with self.cond:
+            self.position = (inode, end)
+            if entries or (inode, end) != previous:
+                self.batches.append((previous, inode, offset, end, entries))
+                self.cond.notify_all()
+    
+    def _batch_after(self, position):
+        """Entries continuing from position and where they end, or None."""
+        for prev, inode, start, end, entries in reversed(self.batches):
+            if prev == position:
+                return entries, (inode, end)
+            if inode == position[0] and start <= position[1] < end:
+                return [e for e in entries if e[0] >= position[1]], (inode, end)
+        return None
+    
+    def lines_after(self, cursor, level=None, timeout=0):
+        """Formatted lines after cursor (optionally one level) and the next cursor.
+        
+        Waits up to timeout seconds for new lines. Returns (None, cursor at
+        EOF) if the cursor cannot be continued and the viewer must reload.
+        """
+        self.start()
+        position = parse_cursor(cursor)
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while position is not None and position == self.position:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return [], cursor
+                self.cond.wait(remaining)
+            found = self._batch_after(position) if position is not None else None
+        
+        if found is not None:
+            entries, position = found
+            return [html for _, line_lvl, html in entries if not level or line_lvl == level], make_cursor(*position)
+        
+        # Not in memory (behind the recent batches, or ahead of the follower)
+        raw, next_cursor = read_since(self.filename, cursor)
+        if raw is None:
+            return None, self.cursor()
+        if not raw:
+            with self.cond:
+                self.cond.wait(min(STREAM_POLL_SEC, max(deadline - time.monotonic(), 0)))
+        records = parse_records(raw, self.log_type)
+        return [format_record(r) for r in records if not level or r.level == level], next_cursor
+
+log_followers = {}
+log_followers_lock = threading.Lock()
+
+def get_follower(log_type):
+    with log_followers_lock:
+        if log_type not in log_followers:
+            log_followers[log_type] = LogFollower(LOG_FILES[log_type], log_type)
+        return log_followers[log_type]
+
+# Parsed lines: each raw line is parsed once into a LogRecord and memoized
+# by (inode, offset), so repeated polls over the same tail reuse the records
+# (and their formatted HTML)
+WATCHDOG_RECORD_RE = re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d+) - (\w+) - (\w+) - (?:\[([^\]]*)\] - )?(.+)$')
+METRICS_RECORD_RE = re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d+) - (.+)$')
+PARSE_CACHE_SIZE = 20000
+
+class LogRecord:
+    """One parsed log line. `html` is filled in by format_record() on first use."""
+    
+    __slots__ = ('timestamp', 'logger', 'level', 'location', 'message', 'metric', 'raw', 'html')
+    
+    def __init__(self, timestamp=None, logger=None, level=None, location=None, message=None, metric=None):
+        self.timestamp = timestamp
+        self.logger = logger
+        self.level = level
+        self.location = location
+        self.message = message
+        self.metric = metric
+        self.raw = None
+        self.html = None
+
+parsed_records = OrderedDict()
+parsed_records_lock = threading.Lock()
+
+def parse_line(line, log_type='watchdog'):
+    """Parse one log line (str or bytes) into a LogRecord.
+    
+    Watchdog lines yield timestamp/logger/level/location ("func:lineno")/
+    message; metrics lines yield the decoded JSON in `metric`. Lines that
+    match neither keep only `message`.
+    """
+    text = (line.decode('utf-8', errors='ignore') if isinstance(line, bytes) else line).strip()
     
     if log_type == 'watchdog':
         # Format: 2025-09-02 01:58:16,550 - watchdog - INFO - [main_loop:241] - Message
-        pattern = r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d+) - (\w+) - (\w+) - (.+)$'
-        match = re.match(pattern, line)
+        match = WATCHDOG_RECORD_RE.match(text)
         if match:
-            timestamp, logger, level, message = match.groups()
-            level_class = level.lower()
-            return f'<span class="timestamp">{timestamp}</span> - <span class="log-{level_class}">{level}</span> - {message}'
+            timestamp, logger, level, location, message = match.groups()
+            return LogRecord(timestamp, logger, level.upper(), location, message)
     
     elif log_type == 'metrics':
-        # Format: 2025-09-02 01:58:16,842 - {"timestamp": "...", "metric": "...", ...}
-        pattern = r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d+) - (.+)$'
-        match = re.match(pattern, line)
-        if match:
-            timestamp, json_data = match.groups()
+        # Format: {"timestamp": "...", "metric": "...", "value": ..., "tags": {...}}
+        # Older files: 2025-09-02 01:58:16,842 - {"timestamp": "...", ...}
+        timestamp = None
+        json_data = text
+        if not text.startswith('{'):
+            match = METRICS_RECORD_RE.match(text)
+            json_data = match.group(2) if match else None
+            timestamp = match.group(1) if match else None
+        if json_data:
             try:
                 decoded = json.loads(json_data)
-                metric = decoded.get('metric', 'unknown')
-                value = decoded.get('value', 'N/A')
-                tags = decoded.get('tags', {})
-                
-                tag_str = ''
-                if tags:
-                    tag_pairs = [f"{k}={v}" for k, v in tags.items()]
-                    tag_str = f' [{", ".join(tag_pairs)}]'
-                
-                return f'<span class="timestamp">{timestamp}</span> - <span class="log-info">{metric}</span>: <strong>{value}</strong>{tag_str}'
+                if isinstance(decoded, dict):
+                    if timestamp is None:
+                        timestamp = str(decoded.get('timestamp', '')).replace('T', ' ')[:23]
+                    return LogRecord(timestamp, metric=decoded)
             except json.JSONDecodeError:
                 pass
     
-    # Fallback: return escaped line
-    return line.replace('<', '&lt;').replace('>', '&gt;')
+    return LogRecord(message=text)
 
-def get_database_metrics():
-    """Calculate real-time metrics from database"""
+def parse_records(located, log_type):
+    """Records for [(inode, offset, raw line)], skipping blank lines.
+    
+    Lines already parsed at the same (inode, offset) with the same bytes are
+    served from the memo; only new lines are parsed.
+    """
+    records = []
+    missing = []
+    with parsed_records_lock:
+        for inode, offset, line in located:
+            record = parsed_records.get((inode, offset))
+            if record is not None and record.raw == line:
+                parsed_records.move_to_end((inode, offset))
+            elif line.strip():
+                missing.append((len(records), inode, offset, line))
+            else:
+                continue
+            records.append(record)
+    if not missing:
+        return records
+    
+    for position, inode, offset, line in missing:
+        record = parse_line(line, log_type)
+        record.raw = line
+        records[position] = record
+    with parsed_records_lock:
+        for position, inode, offset, _ in missing:
+            parsed_records[(inode, offset)] = records[position]
+        while len(parsed_records) > PARSE_CACHE_SIZE:
+            parsed_records.popitem(last=False)
+    return records
+
+def parse_record(inode, offset, line, log_type):
+    """parse_line() memoized by file position."""
+    return parse_records([(inode, offset, line)], log_type)[0]
+
+def format_record(record):
+    """Format a parsed line with syntax highlighting"""
+    if record.html is not None:
+        return record.html
+    
+    if record.level is not None:
+        message = f'[{record.location}] - {record.message}' if record.location is not None else record.message
+        html = (f'<span class="timestamp">{record.timestamp}</span> - '
+                f'<span class="log-{record.level.lower()}">{record.level}</span> - {message}')
+    elif record.metric is not None:
+        metric = record.metric.get('metric', 'unknown')
+        value = record.metric.get('value', 'N/A')
+        tags = record.metric.get('tags', {})
+        tag_str = ''
+        if tags and isinstance(tags, dict):
+            tag_pairs = [f"{k}={v}" for k, v in tags.items()]
+            tag_str = f' [{", ".join(tag_pairs)}]'
+        html = f'<span class="timestamp">{record.timestamp}</span> - <span class="log-info">{metric}</span>: <strong>{value}</strong>{tag_str}'
+    else:
+        # Fallback: return escaped line
+        html = record.message.replace('<', '&lt;').replace('>', '&gt;')
+    
+    record.html = html
+    return html
+
+def extract_log_level(line, log_type='watchdog'):
+    """Extract log level from a log line"""
+    return parse_line(line, log_type).level
+
+def format_log_line(line, log_type='watchdog'):
+    """Format log lines with syntax highlighting"""
+    if not line.strip():
+        return ''
+    return format_record(parse_line(line, log_type))
+
+db_pool = None
+db_pool_pid = None
+db_pool_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+db_pool_lock = threading.Lock()
+
+@contextmanager
+def pooled_conn():
+    """Borrow a connection from this process's pool for one transaction.
+    
+    At most DB_POOL_SIZE connections per worker; callers beyond that wait up
+    to DB_POOL_TIMEOUT seconds for one to come back. Connections that raised
+    are discarded instead of being handed back, so a DB restart heals itself.
+    """
+    global db_pool, db_pool_pid
+    with db_pool_lock:
+        if db_pool is None or db_pool_pid != os.getpid():
+            # A pool inherited across fork shares sockets with the parent. putconn()
+            # closes connections beyond minconn, so minconn = maxconn keeps every
+            # connection open for reuse (opened together on the first request).
+            db_pool = psycopg2.pool.ThreadedConnectionPool(DB_POOL_SIZE, DB_POOL_SIZE, **DB_CONFIG)
+            db_pool_pid = os.getpid()
+        pool = db_pool
+    if not db_pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+        raise psycopg2.pool.PoolError(f"no database connection free within {DB_POOL_TIMEOUT}s")
+    broken = False
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
+        conn = pool.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            broken = True
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            pool.putconn(conn, close=broken or conn.closed != 0)
+    finally:
+        db_pool_slots.release()
+
+class CacheFlight:
+    """One running CachedResult computation: set when it finishes, with the
+    exception it raised, if any, for the callers waiting on it."""
+    
+    __slots__ = ('done', 'error')
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+class CachedResult:
+    """TTL cache for one expensive, argument-free computation.
+    
+    Within the TTL every caller gets the stored value. When it expires, the
+    first caller recomputes while concurrent callers wait for that result
+    instead of running the same query themselves (single flight). Each value
+    gets an ETag derived from its content, so unchanged results can be
+    answered with 304 Not Modified.
+    """
+    
+    def __init__(self, name, compute, ttl):
+        self.name = name
+        self.compute = compute
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.value = None
+        self.etag = None
+        self.computed_at = None
+        self.expires = 0.0
+        self.inflight = None  # CacheFlight of the running computation
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.compute_ms_total = 0.0
+        self.compute_ms_max = 0.0
+        self.compute_ms_last = 0.0
+    
+    def get(self):
+        """(value, etag, computed_at) — fresh, or as fresh as the running refresh.
         
-        # Get metrics from last hour
-        cur.execute("""
-            SELECT 
-                ROUND(AVG(CASE WHEN status = 'PASS' THEN 100 ELSE 0 END), 1) as availability,
-                ROUND(AVG(response_time_ms), 0) as avg_response_time,
-                ROUND(AVG(CASE WHEN status = 'FAIL' THEN 100 ELSE 0 END), 1) as error_rate,
-                COUNT(*) as total_checks
-            FROM checks 
-            WHERE created_at > NOW() - INTERVAL '1 hour'
-        """)
+        If the refresh fails, its waiters get the last value when there is
+        one and otherwise the same exception, rather than each retrying it.
+        """
+        while True:
+            with self.lock:
+                if self.value is not None and time.monotonic() < self.expires:
+                    self.hits += 1
+                    return self.value, self.etag, self.computed_at
+                if self.inflight is not None:
+                    self.coalesced += 1
+                    flight = self.inflight
+                    break
+                self.misses += 1
+                flight = self.inflight = CacheFlight()
+            return self._refresh(flight)
         
-        result = cur.fetchone()
-        conn.close()
+        if not flight.done.wait(DB_POOL_TIMEOUT + 15):
+            raise TimeoutError(f"{self.name} refresh still running")
+        with self.lock:
+            if self.value is not None:
+                return self.value, self.etag, self.computed_at
+        raise flight.error
+    
+    def _refresh(self, flight):
+        start = time.perf_counter()
+        try:
+            value = self.compute()
+        except Exception as e:
+            with self.lock:
+                self.errors += 1
+                flight.error = e
+                flight.done.set()
+                self.inflight = None
+            raise
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        etag = hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()[:16]
+        with self.lock:
+            if etag != self.etag:
+                self.computed_at = datetime.now().isoformat()
+            self.value, self.etag = value, etag
+            self.expires = time.monotonic() + self.ttl
+            self.compute_ms_last = elapsed_ms
+            self.compute_ms_total += elapsed_ms
+            self.compute_ms_max = max(self.compute_ms_max, elapsed_ms)
+            flight.done.set()
+            self.inflight = None
+            return value, etag, self.computed_at
+    
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'ttl_sec': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'errors': self.errors,
+                'hit_rate': round((self.hits + self.coalesced) / lookups * 100, 1) if lookups else None,
+                'compute_ms_last': round(self.compute_ms_last, 2),
+                'compute_ms_avg': round(self.compute_ms_total / self.misses, 2) if self.misses else None,
+                'compute_ms_max': round(self.compute_ms_max, 2),
+                'age_sec': round(self.ttl - (self.expires - time.monotonic()), 1) if self.etag else None
+            }
+
+METRICS_ROLLUP_SQL = """
+    SELECT 
+        ROUND(SUM(passes) * 100.0 / NULLIF(SUM(checks), 0), 1) as availability,
+        ROUND(SUM(rt_sum)::NUMERIC / NULLIF(SUM(rt_count), 0), 0) as avg_response_time,
+        ROUND((SUM(checks) - SUM(passes)) * 100.0 / NULLIF(SUM(checks), 0), 1) as error_rate,
+        COALESCE(SUM(checks), 0) as total_checks
+    FROM checks_rollup_minute 
+    WHERE bucket > NOW() - INTERVAL '1 hour'
+"""
+METRICS_RAW_SQL = """
+    SELECT 
+        ROUND(AVG(CASE WHEN status = 'PASS' THEN 100 ELSE 0 END), 1) as availability,
+        ROUND(AVG(response_time_ms), 0) as avg_response_time,
+        ROUND(AVG(CASE WHEN status = 'FAIL' THEN 100 ELSE 0 END), 1) as error_rate,
+        COUNT(*) as total_checks
+    FROM checks 
+    WHERE created_at > NOW() - INTERVAL '1 hour'
+"""
+# Percentiles from the minute rollups' histograms, merged per target and
+# then across targets (the row with a NULL target)
+METRICS_LATENCY_SQL = """
+    WITH per_target AS (
+        SELECT target, SUM(rt_count) as samples, rollup_hist_sum(rt_hist) as hist, MAX(rt_max) as max_ms
+        FROM checks_rollup_minute
+        WHERE bucket > NOW() - INTERVAL '1 hour'
+        GROUP BY target
+    ), merged AS (
+        SELECT * FROM per_target
+        UNION ALL
+        SELECT NULL, SUM(samples), rollup_hist_sum(hist), MAX(max_ms) FROM per_target
+    )
+    SELECT target, samples,
+           rollup_hist_quantile(hist, 0.5, max_ms),
+           rollup_hist_quantile(hist, 0.9, max_ms),
+           rollup_hist_quantile(hist, 0.99, max_ms),
+           max_ms
+    FROM merged
+    WHERE samples > 0
+"""
+
+def latency_summary(rows):
+    """Shape METRICS_LATENCY_SQL rows as {'overall': {...}, 'targets': {target: {...}}}"""
+    summary = {'overall': None, 'targets': {}}
+    for target, samples, p50, p90, p99, max_ms in rows:
+        entry = {'samples': int(samples), 'p50': p50, 'p90': p90, 'p99': p99, 'max': max_ms}
+        if target is None:
+            summary['overall'] = entry
+        else:
+            summary['targets'][target] = entry
+    return summary
+
+def get_database_metrics():
+    """Calculate real-time metrics from database"""
+    try:
+        with pooled_conn() as conn:
+            cur = conn.cursor()
+            
+            # Get metrics from last hour (60 minute rollup rows per target)
+            try:
+                cur.execute(METRICS_ROLLUP_SQL)
+                result = cur.fetchone()
+                cur.execute(METRICS_LATENCY_SQL)
+                latency = latency_summary(cur.fetchall())
+            except psycopg2.errors.UndefinedTable:
+                # Database created before rollups existed: aggregate raw checks
+                # (no histograms there, so no percentiles)
+                conn.rollback()
+                cur.execute(METRICS_RAW_SQL)
+                result = cur.fetchone()
+                latency = latency_summary([])
         
         if result:
             return {
                 'availability': float(result[0]) if result[0] is not None else 0,
                 'avg_response_time': float(result[1]) if result[1] is not None else 0,
                 'error_rate': float(result[2]) if result[2] is not None else 0,
-                'total_checks': result[3] or 0
+                'total_checks': result[3] or 0,
+                'latency': latency
             }
         else:
             return {
                 'availability': 0,
                 'avg_response_time': 0,
                 'error_rate': 0,
-                'total_checks': 0
+                'total_checks': 0,
+                'latency': latency
             }
     except Exception as e:
         print(f"Database error: {e}")
@@ -142,45 +1149,263 @@ def get_database_metrics():
             'availability': 'DB Error',
             'avg_response_time': 'DB Error', 
             'error_rate': 'DB Error',
-            'total_checks': 0
+            'total_checks': 0,
+            'latency': latency_summary([])
         }
 
 
 
+metrics_cache = CachedResult('metrics', get_database_metrics, METRICS_CACHE_TTL)
+result_caches = [metrics_cache]
+
+# Check history. Raw pages are a LATERAL scan of idx_checks_target_time
+# (target, created_at DESC) per target, merged in (created_at, id) order,
+# so a page costs O(targets x page size) however deep into the range it is.
+# Downsampled queries filter on target and time the same way, or on a
+# rollup table's (bucket, target) key.
+HISTORY_TARGETS_SQL = """
+    SELECT DISTINCT target FROM checks_rollup_day
+    WHERE bucket >= date_trunc('day', %(since)s) AND bucket < %(until)s
+    ORDER BY target
+"""
+CHECKS_PAGE_SQL = """
+    SELECT c.created_at, c.id, c.target, c.status, c.http_status, c.response_time_ms,
+           c.time_drift_seconds::FLOAT8
+    FROM unnest(%(targets)s::VARCHAR[]) AS t(target)
+    CROSS JOIN LATERAL (
+        SELECT * FROM checks
+        WHERE target = t.target AND created_at >= %(start)s AND created_at < %(until)s
+          AND (created_at, id) > (%(after_at)s, %(after_id)s)
+        ORDER BY created_at, id
+        LIMIT %(limit)s
+    ) c
+    ORDER BY c.created_at, c.id
+    LIMIT %(limit)s
+"""
+CHECKS_BUCKETS_SQL = """
+    SELECT target, floor(extract(epoch FROM created_at - %(since)s) / %(width)s)::INTEGER AS slot,
+           COUNT(*), COUNT(*) FILTER (WHERE status = 'PASS'),
+           MIN(response_time_ms), AVG(response_time_ms)::FLOAT8, MAX(response_time_ms)
+    FROM checks
+    WHERE target = ANY(%(targets)s) AND created_at >= %(since)s AND created_at < %(until)s
+    GROUP BY target, slot
+    ORDER BY target, slot
+"""
+ROLLUP_BUCKETS_SQL = """
+    SELECT target, floor(extract(epoch FROM bucket - %(since)s) / %(width)s)::INTEGER AS slot,
+           SUM(checks), SUM(passes),
+           MIN(rt_min), SUM(rt_sum)::FLOAT8 / NULLIF(SUM(rt_count), 0), MAX(rt_max)
+    FROM {table}
+    WHERE target = ANY(%(targets)s) AND bucket >= %(since)s AND bucket < %(until)s
+    GROUP BY target, slot
+    ORDER BY target, slot
+"""
+CHECKS_SERIES_SQL = """
+    SELECT target, extract(epoch FROM created_at)::FLOAT8, response_time_ms
+    FROM checks
+    WHERE target = ANY(%(targets)s) AND created_at >= %(since)s AND created_at < %(until)s
+      AND response_time_ms IS NOT NULL
+    ORDER BY target, created_at
+"""
+ROLLUP_SERIES_SQL = """
+    SELECT target, extract(epoch FROM bucket)::FLOAT8 + {granularity} / 2.0,
+           rt_sum::FLOAT8 / rt_count
+    FROM {table}
+    WHERE target = ANY(%(targets)s) AND bucket >= %(since)s AND bucket < %(until)s AND rt_count > 0
+    ORDER BY target, bucket
+"""
+
+def history_source(resolution, since):
+    """Coarsest (table, granularity) no coarser than resolution seconds that still holds since
+    
+    A day of grace on the retention lets "the last 90 days" read a 90-day
+    table; at worst the oldest bucket is partly empty.
+    """
+    chosen = None
+    for table, granularity, keep_days in HISTORY_SOURCES:
+        if chosen is not None and granularity > resolution:
+            break
+        if not keep_days or since >= datetime.now(timezone.utc) - timedelta(days=keep_days + 1):
+            chosen = (table, granularity)
+    return chosen or HISTORY_SOURCES[-1][:2]
+
+def lttb(points, threshold):
+    """Largest-Triangle-Three-Buckets: threshold of the (x, y) points, keeping the shape of the line.
+    
+    The first and last points stay; from each of the buckets in between the
+    point forming the largest triangle with the previous pick and the
+    average of the next bucket is kept.
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return points
+    sampled = [points[0]]
+    every = (n - 2) / (threshold - 2)
+    previous = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        following = points[end:min(int((i + 2) * every) + 1, n)] or points[-1:]
+        avg_x = sum(p[0] for p in following) / len(following)
+        avg_y = sum(p[1] for p in following) / len(following)
+        ax, ay = points[previous]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        previous = best
+    sampled.append(points[-1])
+    return sampled
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def make_history_cursor(created_at, row_id):
+    """URL-safe (created_at, id) keyset position: microseconds since the epoch and id, in hex"""
+    return f"{(created_at - EPOCH) // timedelta(microseconds=1):x}-{row_id:x}"
+
+def parse_history_cursor(cursor):
+    """Cursor string -> (created_at, id); raises ValueError if it is malformed."""
+    micros, row_id = cursor.split('-')
+    return EPOCH + timedelta(microseconds=int(micros, 16)), int(row_id, 16)
+
+def positive_int(value):
+    """Query-string count -> int; raises ValueError unless it is at least 1."""
+    number = int(value)
+    if number < 1:
+        raise ValueError(value)
+    return number
+
+def query_arg(name, parse, default=None, label=None):
+    """request.args[name] through parse(), or default if it is absent.
+    
+    Raises ValueError('Invalid <label or name>') if parse() rejects it, so
+    callers can return the message as is rather than the parser's own text.
+    """
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return parse(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f'Invalid {label or name}') from None
+
+def utc_time_arg(value):
+    """Query-string time (ISO 8601 or unix seconds) -> aware UTC datetime."""
+    return datetime.fromtimestamp(parse_time_arg(value), timezone.utc)
+
+def stream_json(head, rows, tail):
+    """Yield head's JSON with a "rows" array appended from the rows iterator,
+    then the keys returned by tail() (called once the rows are exhausted).
+    
+    An error while producing rows ends the array early and is reported in
+    the tail as success=false, since the status line has already gone out.
+    """
+    yield json.dumps(head)[:-1] + ', "rows": ['
+    error = None
+    chunk = []
+    first = True
+    try:
+        for row in rows:
+            chunk.append(json.dumps(row))
+            if len(chunk) >= 500:
+                yield ('' if first else ',') + ','.join(chunk)
+                first, chunk = False, []
+    except Exception as e:
+        print(f"History query failed: {e}")
+        error = str(e)
+    if chunk:
+        yield ('' if first else ',') + ','.join(chunk)
+    trailer = tail() if error is None else {'success': False, 'error': error}
+    yield '], ' + json.dumps(trailer)[1:]
+
+def history_targets(cur, since, until):
+    try:
+        cur.execute(HISTORY_TARGETS_SQL, {'since': since, 'until': until})
+    except psycopg2.errors.UndefinedTable:
+        cur.connection.rollback()
+        cur.execute("SELECT DISTINCT target FROM checks WHERE created_at >= %s AND created_at < %s",
+                    (since, until))
+    return [row[0] for row in cur.fetchall()]
+
+def server_cursor(conn, sql, params):
+    cur = conn.cursor(name='history')
+    cur.itersize = HISTORY_FETCH_SIZE
+    cur.execute(sql, params)
+    return cur
+
 @app.route('/api/logs')
 def get_logs():
-    """API endpoint to get formatted log files with optional log level filtering"""
+    """API endpoint to get formatted log files with optional log level filtering
+    
+    Every response carries a cursor. Passing it back as ?cursor= returns only
+    the lines appended since (optionally waiting up to ?wait= seconds for
+    some, i.e. long-polling); 'reset' is set when the cursor could not be
+    continued and a fresh tail was returned instead.
+    """
     log_type = request.args.get('type', 'watchdog')
     lines = int(request.args.get('lines', 50))
     level_filter = request.args.get('level', 'ALL')  # New parameter for log level filtering
+    # Optional time range: ISO timestamps (local time) or unix seconds
     
-    log_files = {
-        'watchdog': os.path.join(LOG_DIR, 'watchdog.log'),
-        'metrics': os.path.join(LOG_DIR, 'metrics.log')
-    }
-    
-    if log_type not in log_files:
+    if log_type not in LOG_FILES:
         return jsonify({
             'success': False,
             'error': 'Invalid log type',
-            'available_types': list(log_files.keys())
+            'available_types': list(LOG_FILES.keys())
         })
     
-    # Read raw log lines
-    raw_lines = tail_file(log_files[log_type], lines * 2)  # Read more lines to account for filtering
+    try:
+        since = parse_time_arg(request.args.get('since'))
+        until = parse_time_arg(request.args.get('until'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Invalid time range: {e}'})
     
-    # Filter by log level if specified
-    if level_filter and level_filter.upper() != 'ALL':
-        filtered_lines = filter_logs_by_level(raw_lines, log_type, level_filter)
-        # If we don't have enough filtered lines, read more from the file
-        if len(filtered_lines) < lines and len(raw_lines) == lines * 2:
-            raw_lines = tail_file(log_files[log_type], lines * 5)  # Read even more lines
-            filtered_lines = filter_logs_by_level(raw_lines, log_type, level_filter)
-    else:
-        filtered_lines = raw_lines
+    level = level_filter.upper() if level_filter and level_filter.upper() != 'ALL' else None
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            wait = float(request.args.get('wait', 0))
+        except ValueError:
+            wait = 0
+        wait = min(wait, MAX_LONG_POLL_SEC) if wait > 0 else 0  # also drops a NaN
+        new_lines, next_cursor = get_follower(log_type).lines_after(cursor, level, wait)
+        if new_lines is not None:
+            return jsonify({
+                'success': True,
+                'type': log_type,
+                'level_filter': level_filter,
+                'lines': new_lines[-lines:],
+                'count': len(new_lines[-lines:]),
+                'cursor': next_cursor,
+                'reset': False,
+                'timestamp': datetime.now().isoformat()
+            })
     
-    # Format the lines
-    formatted_lines = [format_log_line(line, log_type) for line in filtered_lines if line.strip()]
+    tail_cursor = None
+    try:
+        if level or since is not None or until is not None:
+            # Level/time queries jump straight to matching lines via the sidecar index
+            if since is None and until is None:
+                tail_cursor = get_follower(log_type).cursor()
+            try:
+                located = indexed_tail(LOG_FILES[log_type], log_type, level, lines, since, until)
+            except FileNotFoundError:
+                raise
+            except OSError as e:
+                print(f"Log index unavailable ({e}), scanning instead")
+                located = (scan_backwards_filtered(LOG_FILES[log_type], log_type, level, lines)
+                           if level else tail_with_cursor(LOG_FILES[log_type], lines)[0])
+        else:
+            located, tail_cursor = tail_with_cursor(LOG_FILES[log_type], lines)
+        # Format the lines
+        formatted_lines = [format_record(record) for record in parse_records(located, log_type)]
+    except FileNotFoundError as e:
+        formatted_lines = [f"Error: {str(e)}"]
+    except Exception as e:
+        formatted_lines = [f"Error reading file: {str(e)}"]
     
     return jsonify({
         'success': True,
@@ -189,17 +1414,166 @@ def get_logs():
         'lines': formatted_lines[-lines:],  # Get last N lines
         'total_lines': len(formatted_lines),
         'count': len(formatted_lines[-lines:]),
+        'cursor': tail_cursor,
+        'reset': bool(cursor),
         'timestamp': datetime.now().isoformat()
     })
 
+@app.route('/api/logs/stream')
+def stream_logs():
+    """Server-Sent Events feed of new log lines.
+    
+    Starts after ?cursor= (or the Last-Event-ID header on reconnect, which
+    EventSource sends automatically) or at the end of the file. Each 'lines'
+    event carries a JSON list of formatted lines and the cursor as its id.
+    A 'reset' event means the viewer fell too far behind and should reload.
+    """
+    log_type = request.args.get('type', 'watchdog')
+    if log_type not in LOG_FILES:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid log type',
+            'available_types': list(LOG_FILES.keys())
+        })
+    level_filter = request.args.get('level', 'ALL')
+    level = level_filter.upper() if level_filter and level_filter.upper() != 'ALL' else None
+    follower = get_follower(log_type)
+    follower.start()
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('cursor') or follower.cursor()
+    
+    def events():
+        position = cursor
+        # Bounded lifetime frees the worker thread and lets graceful reloads
+        # finish; EventSource reconnects and resumes from the last id
+        ends = time.monotonic() + STREAM_MAX_SEC
+        yield "retry: 1000\n\n"
+        while time.monotonic() < ends:
+            new_lines, next_cursor = follower.lines_after(position, level, STREAM_KEEPALIVE_SEC)
+            if new_lines is None:
+                yield f"id: {next_cursor or ''}\nevent: reset\ndata: {{}}\n\n"
+            elif new_lines:
+                yield f"id: {next_cursor}\nevent: lines\ndata: {json.dumps(new_lines)}\n\n"
+            elif next_cursor != position:
+                yield f"id: {next_cursor}\n\n"  # lines were filtered out; still advance
+            else:
+                yield ": keepalive\n\n"
+            position = next_cursor
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/metrics')
 def get_metrics():
-    """API endpoint to get real-time system metrics"""
-    metrics = get_database_metrics()
+    """API endpoint to get real-time system metrics
     
-    return jsonify({
+    Served from a METRICS_CACHE_TTL cache; clients sending If-None-Match
+    with the current ETag get 304 while the numbers are unchanged.
+    """
+    metrics, etag, computed_at = metrics_cache.get()
+    
+    response = jsonify({
         'success': True,
         'metrics': metrics,
+        'timestamp': computed_at
+    })
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'  # always revalidate, cheaply
+    return response.make_conditional(request)
+
+@app.route('/api/checks')
+def get_checks():
+    """API endpoint for check history over a time range, streamed as JSON
+    
+    ?target= (comma separated, default all), ?since=/?until= (ISO or unix
+    seconds, default the last 24 hours) and one of:
+      mode=raw      rows in (created_at, id) order, ?limit= per page; pass
+                    the returned 'next' back as ?after= for the next page
+      mode=buckets  ?points= equal time buckets per target with check and
+                    pass counts and min/avg/max response time, read from the
+                    coarsest table (raw or a rollup) finer than a bucket
+      mode=lttb     ?points= response times per target picked by LTTB
+    """
+    mode = request.args.get('mode', 'buckets' if request.args.get('points') else 'raw')
+    if mode not in ('raw', 'buckets', 'lttb'):
+        return jsonify({'success': False, 'error': 'Invalid mode', 'available_modes': ['raw', 'buckets', 'lttb']})
+    try:
+        until = query_arg('until', utc_time_arg) or datetime.now(timezone.utc)
+        since = query_arg('since', utc_time_arg) or until - timedelta(days=1)
+        if since >= until:
+            raise ValueError('Invalid range: since must be before until')
+        limit = min(query_arg('limit', positive_int, HISTORY_PAGE_SIZE), HISTORY_MAX_PAGE_SIZE)
+        points = min(query_arg('points', positive_int, 500), HISTORY_MAX_POINTS)
+        after = query_arg('after', parse_history_cursor, label='cursor')
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    targets = [t for t in request.args.get('target', '').split(',') if t] or None
+    head = {'mode': mode, 'since': since.isoformat(), 'until': until.isoformat()}
+    
+    def generate():
+        with pooled_conn() as conn:
+            cur = conn.cursor()
+            selected = targets or history_targets(cur, since, until)
+            params = {'targets': selected, 'since': since, 'until': until}
+            summary = {'count': 0}
+            
+            if mode == 'raw':
+                after_at, after_id = after or (since, 0)
+                params.update(start=max(since, after_at), after_at=after_at, after_id=after_id, limit=limit)
+                columns = ['created_at', 'id', 'target', 'status', 'http_status', 'response_time_ms',
+                           'time_drift_seconds']
+                last = []
+                
+                def rows():
+                    for row in server_cursor(conn, CHECKS_PAGE_SQL, params):
+                        summary['count'] += 1
+                        last[:] = row[:2]
+                        yield [row[0].isoformat()] + list(row[1:])
+                
+                def tail():
+                    full = summary['count'] == limit
+                    return dict(summary, success=True, next=make_history_cursor(*last) if full else None)
+            else:
+                width = (until - since).total_seconds() / points
+                table, granularity = history_source(width / LTTB_OVERSAMPLE if mode == 'lttb' else width, since)
+                head.update(source=table, bucket_seconds=round(width, 3))
+                
+                if mode == 'buckets':
+                    columns = ['time', 'target', 'checks', 'passes', 'rt_min', 'rt_avg', 'rt_max']
+                    sql = CHECKS_BUCKETS_SQL if granularity == 0 else ROLLUP_BUCKETS_SQL.format(table=table)
+                    params['width'] = width
+                    
+                    def rows():
+                        for target, slot, checks, passes, rt_min, rt_avg, rt_max in server_cursor(conn, sql, params):
+                            summary['count'] += 1
+                            yield [(since + timedelta(seconds=slot * width)).isoformat(), target, checks, passes,
+                                   rt_min, None if rt_avg is None else round(rt_avg, 1), rt_max]
+                else:
+                    columns = ['time', 'target', 'response_time_ms']
+                    sql = (CHECKS_SERIES_SQL if granularity == 0
+                           else ROLLUP_SERIES_SQL.format(table=table, granularity=granularity))
+                    
+                    def rows():
+                        series = server_cursor(conn, sql, params)
+                        for target, samples in groupby(series, key=lambda row: row[0]):
+                            for x, y in lttb([row[1:] for row in samples], points):
+                                summary['count'] += 1
+                                yield [datetime.fromtimestamp(x, timezone.utc).isoformat(), target, round(y, 1)]
+                
+                def tail():
+                    return dict(summary, success=True)
+            
+            head['columns'] = columns
+            yield from stream_json(head, rows(), tail)
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+@app.route('/api/cache_stats')
+def get_cache_stats():
+    """API endpoint to get hit/miss/latency counters of this worker's caches"""
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'caches': {cache.name: cache.stats() for cache in result_caches},
         'timestamp': datetime.now().isoformat()
     })
 
@@ -208,36 +1582,29 @@ def get_log_levels():
     """API endpoint to get available log levels from log files"""
     log_type = request.args.get('type', 'watchdog')
     
-    log_files = {
-        'watchdog': os.path.join(LOG_DIR, 'watchdog.log'),
-        'metrics': os.path.join(LOG_DIR, 'metrics.log')
-    }
-    
-    if log_type not in log_files:
+    if log_type not in LOG_FILES:
         return jsonify({
             'success': False,
             'error': 'Invalid log type',
-            'available_types': list(log_files.keys())
+            'available_types': list(LOG_FILES.keys())
         })
     
-    # Read recent log lines to extract available levels
-    raw_lines = tail_file(log_files[log_type], 500)  # Read more lines to get better sample
-    levels = set()
-    
-    for line in raw_lines:
-        level = extract_log_level(line, log_type)
-        if level:
-            levels.add(level)
+    # Count levels over recent log lines in one pass
+    try:
+        located, _ = tail_with_cursor(LOG_FILES[log_type], 500)  # Read more lines to get better sample
+    except OSError:
+        located = []
+    level_counts = Counter(record.level for record in parse_records(located, log_type) if record.level)
     
     # Sort levels by severity (most important first)
     level_priority = {'ERROR': 1, 'WARNING': 2, 'WARN': 2, 'INFO': 3, 'DEBUG': 4}
-    sorted_levels = sorted(levels, key=lambda x: level_priority.get(x, 5))
+    sorted_levels = sorted(level_counts, key=lambda x: level_priority.get(x, 5))
     
     return jsonify({
         'success': True,
         'type': log_type,
         'available_levels': ['ALL'] + sorted_levels,
-        'level_counts': {level: sum(1 for line in raw_lines if extract_log_level(line, log_type) == level) for level in sorted_levels},
+        'level_counts': {level: level_counts[level] for level in sorted_levels},
         'timestamp': datetime.now().isoformat()
     })
 
@@ -255,12 +1622,19 @@ def health_check():
     })
 
 if __name__ == '__main__':
+    # Development server; production runs under gunicorn (see start.sh)
     print("Starting Multi-Container Monitoring Log API Server...")
     print(f"Log directory: {LOG_DIR}")
     print("Available endpoints:")
     print("  /api/logs?type=watchdog&lines=50&level=INFO")
+    print("  /api/logs?type=watchdog&since=2025-09-02T01:00:00&until=2025-09-02T02:00:00")
+    print("  /api/logs?type=watchdog&cursor=<cursor>&wait=20  (lines since cursor, long-poll)")
+    print("  /api/logs/stream?type=watchdog&level=ERROR  (Server-Sent Events)")
     print("  /api/log_levels?type=watchdog")
-    print("  /api/metrics")
+    print("  /api/metrics  (cached, ETag/If-None-Match)")
+    print("  /api/checks?target=web1:80&since=2025-09-01T00:00:00&limit=1000  (raw, ?after=<next>)")
+    print("  /api/checks?target=web1:80&since=2025-09-01T00:00:00&points=500&mode=buckets|lttb")
+    print("  /api/cache_stats")
     print("  /health")
     print("\nLog level filtering options:")
     print("  - ALL: Show all log levels")
@@ -6,12 +6,18 @@ mkdir -p /var/log/nginx
 mkdir -p /var/lib/nginx/tmp/client_body
 chown -R nginx:nginx /var/lib/nginx /var/log/nginx
 
-# Start Flask API server in background
+# Start the API server in background
 cd /app
-echo "Starting Python Flask API on port 5000..."
-python log_api.py &
+if [ "${LOG_API_SERVER:-gunicorn}" = "dev" ]; then
+    echo "Starting Python Flask API (development server) on port 5000..."
+    python log_api.py &
+else
+    echo "Starting Python Flask API under gunicorn on port 5000..."
+    echo "  Graceful reload: kill -HUP \$(cat /run/log-api.pid)"
+    gunicorn -c /app/gunicorn.conf.py log_api:app &
+fi
 
-# Wait a moment for Flask to start
+# Wait a moment for the API to start
 sleep 2
 
 # Start nginx in foreground
@@ -1,10 +1,20 @@
-import os, time, smtplib, socket, json, logging
+import os, re, io, sys, ssl, time, glob, signal, smtplib, socket, json, logging, string, hashlib, heapq, random, atexit, bisect, math, struct, zlib
+import http.client
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from datetime import datetime, timezone, timedelta
+from zoneinfo import ZoneInfo
 from urllib.parse import urlparse
 import requests
 import psycopg2
+import psycopg2.pool
+import psycopg2.extras
 import threading
+import queue
+from collections import deque, Counter
+from contextlib import contextmanager
 from logging.handlers import RotatingFileHandler
 
 # Enhanced logging setup for Part 2
@@ -33,12 +43,15 @@ def setup_logging():
     # Create log directory
     os.makedirs('/var/log/monitoring', exist_ok=True)
     
+    # Rotated backups are compressed in the background unless LOG_COMPRESS=false
+    handler_class = CompressedRotatingFileHandler if LOG_COMPRESS else RotatingFileHandler
+    
     # Main application log
     try:
-        app_handler = RotatingFileHandler(
+        app_handler = handler_class(
             '/var/log/monitoring/watchdog.log',
             maxBytes=10*1024*1024,  # 10MB
-            backupCount=5
+            backupCount=WATCHDOG_LOG_BACKUPS
         )
         app_handler.setFormatter(detailed_formatter)
         app_handler.setLevel(log_level)
@@ -46,29 +59,111 @@ def setup_logging():
     except:
         pass  # Fall back to console only if file logging fails
     
-    # Metrics logger (structured for analysis)
-    metrics_logger = logging.getLogger('metrics')
+    # Metrics pipeline (structured for analysis): line-delimited JSON, no text prefix
     try:
-        metrics_handler = RotatingFileHandler(
+        metrics_handler = handler_class(
             '/var/log/monitoring/metrics.log',
             maxBytes=5*1024*1024,   # 5MB
-            backupCount=10
+            backupCount=METRICS_LOG_BACKUPS
         )
-        metrics_handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
-        metrics_logger.addHandler(metrics_handler)
-        metrics_logger.setLevel(logging.INFO)
-        metrics_logger.propagate = False
+        metrics_handler.setFormatter(logging.Formatter('%(message)s'))
+        metrics_pipeline.start(metrics_handler)
     except:
-        pass  # Fall back to console if file logging fails
+        pass  # Metrics are discarded if file logging fails
     
-    return logging.getLogger('watchdog'), metrics_logger
+    return logging.getLogger('watchdog'), metrics_pipeline
 
 # Configuration
 TZ = os.getenv("TARGET_TIMEZONE", "Asia/Colombo")
-TARGETS = [t.strip() for t in os.getenv("WEB_TARGETS", "web1:80,web2:80").split(",")]
+
+# Targets: WEB_TARGETS (comma separated) plus TARGETS_FILE (one per line, #
+# comments). Each is "host:port", or "probe://host:port" to choose how that
+# target is probed, e.g. WEB_TARGETS=web1:80,head://web2:80,tls://api:443
+#   get          GET / and validate the content every time (the default)
+#   conditional  GET with If-None-Match/If-Modified-Since; 304 = unchanged
+#   head         HEAD /, liveness only
+#   tcp          TCP connect only
+#   tls          TCP connect + TLS handshake (full probes then use HTTPS)
+# Every probe type but "get" runs a full validating GET on the first probe,
+# after a failed one and every FULL_CHECK_EVERY probes; the probes in between
+# report the last validation result. PROBE_TYPE is the default type.
+TARGETS_FILE = os.getenv("TARGETS_FILE", "")
+PROBE_TYPES = ("get", "conditional", "head", "tcp", "tls")
+PROBE_TYPE = os.getenv("PROBE_TYPE", "get").lower()
+FULL_CHECK_EVERY = int(os.getenv("FULL_CHECK_EVERY", "10"))
+if PROBE_TYPE not in PROBE_TYPES:
+    raise ValueError(f"Unknown PROBE_TYPE '{PROBE_TYPE}' (expected one of {', '.join(PROBE_TYPES)})")
+
+def read_targets():
+    """{target: probe type or None} in configuration order"""
+    entries = os.getenv("WEB_TARGETS", "" if TARGETS_FILE else "web1:80,web2:80").split(",")
+    if TARGETS_FILE:
+        with open(TARGETS_FILE, encoding="utf-8") as f:
+            entries += [line.split("#", 1)[0] for line in f]
+    targets = {}
+    for entry in filter(None, (e.strip() for e in entries)):
+        probe, _, target = entry.rpartition("://")
+        probe = probe.lower() or None
+        if probe not in PROBE_TYPES + (None,):
+            raise ValueError(f"Unknown probe type '{probe}' for target {target} (expected one of {', '.join(PROBE_TYPES)})")
+        targets[target] = probe
+    return targets
+
+TARGET_PROBES = read_targets()
+TARGETS = list(TARGET_PROBES)
 EXPECT_TEXT = os.getenv("EXPECT_TEXT", "Multi-Container Monitoring OK")
 CHECK_INTERVAL = int(os.getenv("CHECK_INTERVAL_SEC", "60"))
-MAX_DRIFT = int(os.getenv("MAX_ALLOWED_DRIFT_SEC", "5"))
+
+# Scheduling: every target has its own interval (TARGET_INTERVALS JSON, e.g.
+# {"web1:80": 5}, defaulting to CHECK_INTERVAL) on the monotonic clock.
+# Due times are spread by +/- CHECK_JITTER of the interval; a failing target
+# is re-checked after FAILURE_RETRY_SEC, doubling per consecutive failure
+# until it is back at its normal interval.
+TARGET_INTERVALS = json.loads(os.getenv("TARGET_INTERVALS", "") or "{}")
+CHECK_JITTER = float(os.getenv("CHECK_JITTER", "0.1"))
+FAILURE_RETRY_SEC = float(os.getenv("FAILURE_RETRY_SEC", "5"))
+# How often buffered results are written to the DB and the summary line is logged
+FLUSH_INTERVAL = float(os.getenv("FLUSH_INTERVAL_SEC", "10"))
+MAX_DRIFT = float(os.getenv("MAX_ALLOWED_DRIFT_SEC", "5"))
+
+# Per-target clock skew: each target's clock is read from TIME_ENDPOINT_PATH
+# (a body of unix seconds with ms resolution, e.g. nginx's $msec) or, if the
+# target has no such endpoint, from the HTTP Date header of the main probe.
+# Reading the endpoint costs a second request, so it is read at most every
+# TIME_ENDPOINT_REFRESH_SEC per target and the last reading is carried
+# forward in between. A 404 disables it for the target; other failures
+# fall back to the Date header for TIME_ENDPOINT_RETRY_SEC.
+TIME_ENDPOINT_PATH = os.getenv("TIME_ENDPOINT_PATH", "/time")
+TIME_ENDPOINT_REFRESH_SEC = float(os.getenv("TIME_ENDPOINT_REFRESH_SEC", "300"))
+TIME_ENDPOINT_RETRY_SEC = 60
+
+# Time reference: calibrated against WORLD_TIME_URL (worldtimeapi-style JSON
+# over HTTP, or ntp://host[:port] for SNTP) in the background and projected
+# forward with the monotonic clock between calibrations
+WORLD_TIME_URL = os.getenv("WORLD_TIME_URL", f"https://worldtimeapi.org/api/timezone/{TZ}")
+TIME_REFRESH_SEC = int(os.getenv("TIME_REFRESH_SEC", "900"))
+TIME_REFRESH_MIN_BACKOFF_SEC = 5
+# Assumed worst-case rate error of the local monotonic clock (50 ppm)
+CLOCK_DRIFT_RATE = 50e-6
+
+# Concurrent probing: how many targets are checked in parallel, and how long a
+# single target's probe may take in total (connect, request and the whole
+# body; DNS resolution excepted) before it is treated as failed
+CHECK_CONCURRENCY = int(os.getenv("CHECK_CONCURRENCY", "32"))
+TARGET_DEADLINE = float(os.getenv("TARGET_DEADLINE_SEC", "10"))
+
+# HTTP probes: "warm" reuses a keep-alive connection per target, "cold" opens
+# a fresh connection every time (so connect cost is part of each probe)
+PROBE_MODE = os.getenv("PROBE_MODE", "warm").lower()
+
+# Content validation: bodies are scanned as they stream in and reading stops
+# at the first full match or after MAX_BODY_BYTES. TARGET_EXPECT overrides
+# EXPECT_TEXT per target with a JSON object, e.g.
+#   {"web1:80": ["Monitoring OK", "Container Instance"], "web2:80": {"regex": "Monitoring\\s+OK"}}
+# A list means every marker must appear; "regex" is searched with re.search.
+MAX_BODY_BYTES = int(os.getenv("MAX_BODY_BYTES", str(1024*1024)))  # 1MB
+BODY_CHUNK_SIZE = 16*1024
+TARGET_EXPECT = json.loads(os.getenv("TARGET_EXPECT", "") or "{}")
 
 DB_HOST = os.getenv("DB_HOST", "db")
 DB_PORT = int(os.getenv("DB_PORT", "5432"))
@@ -76,6 +171,15 @@ DB_NAME = os.getenv("DB_NAME", "monitoring")
 DB_USER = os.getenv("DB_USER", "monitoruser")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "monitorpass")
 
+# Persistence: pooled connections and periodic batched writes. Rows that
+# cannot be written while the DB is down are held in memory, then spilled
+# to disk, then dropped (and counted) once both limits are reached.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+DB_WRITE_RETRIES = int(os.getenv("DB_WRITE_RETRIES", "3"))
+DB_BUFFER_MAX_ROWS = int(os.getenv("DB_BUFFER_MAX_ROWS", "10000"))
+DB_SPILL_PATH = os.getenv("DB_SPILL_PATH", "/var/log/monitoring/db-spill.jsonl")
+DB_SPILL_MAX_BYTES = int(os.getenv("DB_SPILL_MAX_BYTES", str(50*1024*1024)))  # 50MB
+
 SMTP_HOST = os.getenv("SMTP_HOST", "mailhog")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "1025"))
 SMTP_FROM = os.getenv("SMTP_FROM", "alerts@monitoring.local")
@@ -83,31 +187,637 @@ SMTP_TO = os.getenv("SMTP_TO", "support@monitoring.local")
 SMTP_USER = os.getenv("SMTP_USER", "")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
 
+# Alerting: alerts are queued and sent by a background thread over one reused
+# SMTP connection. Repeats of the same target+failure are suppressed for
+# ALERT_COOLDOWN_SEC, then summarised as "still failing"; alerts arriving
+# within ALERT_DIGEST_WINDOW_SEC of each other go out as one digest email.
+ALERT_COOLDOWN_SEC = int(os.getenv("ALERT_COOLDOWN_SEC", "900"))
+ALERT_DIGEST_WINDOW_SEC = float(os.getenv("ALERT_DIGEST_WINDOW_SEC", "10"))
+ALERT_QUEUE_MAX = int(os.getenv("ALERT_QUEUE_MAX", "1000"))
+
+# Metrics pipeline: samples queued beyond METRICS_BUFFER_SIZE are dropped
+# (and counted); the writer flushes every METRICS_FLUSH_SEC
+METRICS_BUFFER_SIZE = int(os.getenv("METRICS_BUFFER_SIZE", "100000"))
+METRICS_FLUSH_SEC = float(os.getenv("METRICS_FLUSH_SEC", "1"))
+
+# Prometheus/OpenMetrics exporter serving GET /metrics (port 0 disables)
+METRICS_EXPORTER_BIND = os.getenv("METRICS_EXPORTER_BIND", "0.0.0.0")
+METRICS_EXPORTER_PORT = int(os.getenv("METRICS_EXPORTER_PORT", "9108"))
+
+# Database maintenance: daily partitions of checks/metrics are created ahead
+# and expired ones dropped (or archived), and old rollup rows pruned, every
+# MAINTENANCE_INTERVAL_SEC (0 disables; see monitoring_maintenance() in init.sql)
+MAINTENANCE_INTERVAL_SEC = int(os.getenv("MAINTENANCE_INTERVAL_SEC", "3600"))
+RETENTION_CHECKS_DAYS = int(os.getenv("RETENTION_CHECKS_DAYS", "30"))
+RETENTION_METRICS_DAYS = int(os.getenv("RETENTION_METRICS_DAYS", "14"))
+RETENTION_ROLLUP_MINUTE_DAYS = int(os.getenv("RETENTION_ROLLUP_MINUTE_DAYS", "3"))
+RETENTION_ROLLUP_HOUR_DAYS = int(os.getenv("RETENTION_ROLLUP_HOUR_DAYS", "90"))
+RETENTION_ROLLUP_DAY_DAYS = int(os.getenv("RETENTION_ROLLUP_DAY_DAYS", "0"))  # 0 = keep forever
+RETENTION_ARCHIVE = os.getenv("RETENTION_ARCHIVE", "false").lower() == "true"
+PARTITION_PREMAKE_DAYS = int(os.getenv("PARTITION_PREMAKE_DAYS", "3"))
+
+# Sharding: replicas with the same SHARD_GROUP split WEB_TARGETS between them
+# by consistent hashing over the live rows in watchdog_replicas. Each replica
+# heartbeats every SHARD_HEARTBEAT_SEC; one silent for SHARD_TTL_SEC drops out
+# and its targets move to the others. Off, this replica checks every target.
+SHARDING = os.getenv("SHARDING", "false").lower() == "true"
+SHARD_GROUP = os.getenv("SHARD_GROUP", "default")
+REPLICA_ID = os.getenv("REPLICA_ID", "") or f"{socket.gethostname()}-{os.getpid()}"
+SHARD_HEARTBEAT_SEC = float(os.getenv("SHARD_HEARTBEAT_SEC", "5"))
+SHARD_TTL_SEC = float(os.getenv("SHARD_TTL_SEC", "15"))
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "64"))
+
+# Profiling: SIGUSR1 (or PROFILE_ON_START=true) samples every thread's stack
+# each PROFILE_SAMPLE_MS for the next PROFILE_CYCLES summary cycles
+# (FLUSH_INTERVAL_SEC each) and writes them to PROFILE_DIR as collapsed
+# stacks (flamegraph.pl / speedscope input). Nothing runs in between.
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/var/log/monitoring")
+PROFILE_CYCLES = int(os.getenv("PROFILE_CYCLES", "3"))
+PROFILE_SAMPLE_MS = float(os.getenv("PROFILE_SAMPLE_MS", "10"))
+PROFILE_ON_START = os.getenv("PROFILE_ON_START", "false").lower() == "true"
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "10"))
+
+# Log rotation: watchdog.log rotates at 10MB and metrics.log at 5MB. With
+# LOG_COMPRESS each backup is rewritten as <log>.N.gz in gzip frames of
+# LOG_FRAME_KB of whole lines plus a frame index (<log>.N.gz.idx), which
+# the log API reads without decompressing whole files. Text logs compress
+# about 10x, so the default backup counts fit in roughly the space the old
+# 5 and 10 plain backups took.
+LOG_COMPRESS = os.getenv("LOG_COMPRESS", "true").lower() == "true"
+LOG_COMPRESS_LEVEL = int(os.getenv("LOG_COMPRESS_LEVEL", "6"))
+LOG_FRAME_KB = int(os.getenv("LOG_FRAME_KB", "256"))
+WATCHDOG_LOG_BACKUPS = int(os.getenv("WATCHDOG_LOG_BACKUPS", "") or (50 if LOG_COMPRESS else 5))
+METRICS_LOG_BACKUPS = int(os.getenv("METRICS_LOG_BACKUPS", "") or (100 if LOG_COMPRESS else 10))
+
 # Performance tracking for enhanced metrics
 # Global variables
 logger = None
-metrics_logger = None
+
+class LatencyHistogram:
+    """Fixed-memory, mergeable latency sketch.
+    
+    Slot i counts response times (whole milliseconds, as stored in
+    checks.response_time_ms) in [BOUNDS[i-1], BOUNDS[i]): exact up to 11 ms,
+    then ~7% wide up to ~62 s. This is the layout of the rollup tables'
+    rt_hist (rollup_hist_bounds in db/init.sql), so sketches merge with each
+    other and with rollup rows by adding counts. Not locked; callers hold
+    performance_lock.
+    """
+    
+    BOUNDS = sorted({math.ceil(1.15 ** k) for k in range(80)})
+    SCALE = 1000  # units per second
+    
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.total = 0
+        self.max_ms = 0
+    
+    def record(self, seconds):
+        ms = int(seconds * self.SCALE)
+        self.counts[bisect.bisect_right(self.BOUNDS, ms)] += 1
+        self.total += 1
+        self.max_ms = max(self.max_ms, ms)
+    
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+        self.max_ms = max(self.max_ms, other.max_ms)
+        return self
+    
+    def quantile(self, q):
+        """Approximate q-quantile in ms, interpolated within its slot like rollup_hist_quantile"""
+        if not self.total:
+            return None
+        rank = q * self.total
+        running = 0
+        for i, c in enumerate(self.counts):
+            running += c
+            if c and running >= rank:
+                lower = self.BOUNDS[i - 1] if i else 0
+                upper = self.BOUNDS[i] if i < len(self.BOUNDS) else self.max_ms
+                return min(int(lower + (upper - lower) * (rank - (running - c)) / c + 0.5), self.max_ms)
+        return self.max_ms
+
+class PhaseHistogram(LatencyHistogram):
+    """LatencyHistogram in microseconds (max_ms and quantiles too), up to
+    ~80 s, that also sums the time spent, for Span phases."""
+    
+    BOUNDS = sorted({math.ceil(1.15 ** k) for k in range(130)})
+    SCALE = 1000000
+    
+    def __init__(self):
+        super().__init__()
+        self.seconds = 0.0
+    
+    def record(self, seconds):
+        super().record(seconds)
+        self.seconds += seconds
 
 # Enhanced monitoring configuration
 performance_metrics = {
-    'response_times': [],
+    'latency': {},  # target -> LatencyHistogram for the current summary interval
+    'phases': {},  # phase -> PhaseHistogram for the current summary interval
     'check_count': 0,
     'error_count': 0,
     'start_time': datetime.now()
 }
+# Targets are checked from worker threads, so counter updates need a lock
+performance_lock = threading.Lock()
 
-def log_metric(metric_name, value, tags=None):
-    """Log structured metrics for analysis"""
+def count_error():
+    with performance_lock:
+        performance_metrics['error_count'] += 1
+
+class Span:
+    """Times one phase of the watchdog's work: ``with Span('homepage'): ...``
+    
+    Durations are aggregated per phase for the summary log and exported as
+    watchdog_phase_seconds; spans may nest (a check contains its probe).
+    """
+    
+    __slots__ = ('phase', 'start')
+    
+    def __init__(self, phase):
+        self.phase = phase
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        with performance_lock:
+            hist = performance_metrics['phases'].get(self.phase)
+            if hist is None:
+                hist = performance_metrics['phases'][self.phase] = PhaseHistogram()
+            hist.record(elapsed)
+        exp_phase.observe(elapsed, self.phase)
+
+# Frame index entry of a compressed log backup: uncompressed offset,
+# compressed offset, first and last record time (unix seconds) and the
+# number of records of each of FRAME_LEVELS in the frame. A closing entry
+# holds the total sizes. Read by CompressedSegment in log_api.py.
+FRAME_ENTRY = struct.Struct('<QQdd5I')
+FRAME_LEVELS = (b'DEBUG', b'INFO', b'WARNING', b'ERROR', b'CRITICAL')
+BACKUP_SUFFIXES = ('', '.gz', '.gz.idx')
+LOG_ASCTIME_RE = re.compile(rb'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),(\d{3}) ')
+LOG_JSON_TIME_RE = re.compile(rb'"timestamp": "([^"]+)"')
+
+def log_line_time(line):
+    """Unix time of a watchdog.log record line or metrics.log sample, or None."""
     try:
-        metric_data = {
-            'timestamp': datetime.now().isoformat(),
-            'metric': metric_name,
-            'value': value,
-            'tags': tags or {}
-        }
-        metrics_logger.info(json.dumps(metric_data))
-    except:
-        pass  # Don't break main flow if metrics logging fails
+        match = LOG_ASCTIME_RE.match(line)
+        if match:
+            stamp = datetime.strptime(match.group(1).decode(), "%Y-%m-%d %H:%M:%S")
+            return stamp.timestamp() + int(match.group(2)) / 1000
+        match = LOG_JSON_TIME_RE.search(line)
+        if match:
+            return datetime.fromisoformat(match.group(1).decode()).timestamp()
+    except ValueError:
+        pass
+    return None
+
+def frame_times(frame, previous):
+    """(first, last) record time in a frame of whole lines; a frame with no
+    timestamped line (one long traceback) inherits the previous frame's last."""
+    lines = frame.split(b'\n')
+    first = next((t for t in map(log_line_time, lines) if t is not None), None)
+    if first is None:
+        return previous, previous
+    return first, next(t for t in map(log_line_time, reversed(lines)) if t is not None)
+
+def frame_level_counts(frame):
+    """Number of watchdog.log records of each of FRAME_LEVELS in a frame."""
+    return [frame.count(b' - ' + name + b' - [') for name in FRAME_LEVELS]
+
+def compress_log_segment(path, frame_bytes=LOG_FRAME_KB * 1024, level=LOG_COMPRESS_LEVEL):
+    """Rewrite a rotated log as <path>.gz (one gzip member per frame, so
+    zcat still reads it whole) plus <path>.gz.idx, then remove <path>.
+    
+    Both are written to temporary names and moved into place index first,
+    so a reader that sees the .gz also sees its index; until the plain file
+    is removed readers prefer it.
+    """
+    gz_path = path + '.gz'
+    entries = []
+    raw_offset = comp_offset = 0
+    last_ts = 0.0
+    with open(path, 'rb') as src, open(gz_path + '.tmp', 'wb') as out:
+        while True:
+            frame = src.read(frame_bytes)
+            if not frame:
+                break
+            if not frame.endswith(b'\n'):
+                frame += src.readline()  # frames end on a line boundary
+            first_ts, last_ts = frame_times(frame, last_ts)
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip member
+            packed = compressor.compress(frame) + compressor.flush()
+            out.write(packed)
+            entries.append(FRAME_ENTRY.pack(raw_offset, comp_offset, first_ts, last_ts, *frame_level_counts(frame)))
+            raw_offset += len(frame)
+            comp_offset += len(packed)
+        entries.append(FRAME_ENTRY.pack(raw_offset, comp_offset, last_ts, last_ts, *[0] * len(FRAME_LEVELS)))
+    with open(gz_path + '.idx.tmp', 'wb') as out:
+        out.write(b''.join(entries))
+    os.replace(gz_path + '.idx.tmp', gz_path + '.idx')
+    os.replace(gz_path + '.tmp', gz_path)
+    os.remove(path)
+    return gz_path
+
+class CompressedRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler whose backups are <name>.1.gz .. <name>.N.gz.
+    
+    Rollover only renames, as RotatingFileHandler does: older backups (and
+    their .idx) shift up one and the live file becomes the plain <name>.1.
+    A background thread then compresses that with compress_log_segment(),
+    so the thread that logged the record pays for the renames, not for the
+    compression. A rollover that arrives while the previous backup is still
+    being compressed waits for it. Plain backups left by a crash, or by
+    RotatingFileHandler before compression was enabled, are compressed at
+    startup.
+    """
+    
+    def __init__(self, filename, *args, **kwargs):
+        super().__init__(filename, *args, **kwargs)
+        self.compressor = None
+        leftovers = [f"{self.baseFilename}.{i}" for i in range(1, self.backupCount + 1)]
+        self._compress_async([p for p in leftovers if os.path.exists(p)])
+    
+    def _compress(self, paths):
+        for path in paths:
+            try:
+                if os.path.exists(path + '.gz') and os.path.exists(path + '.gz.idx'):
+                    os.remove(path)  # compressed before a crash, not yet removed
+                else:
+                    compress_log_segment(path)
+            except Exception as e:
+                # Straight to stderr, like logging's own handler errors: logging it
+                # could re-enter this handler, whose doRollover() may hold the lock
+                # while it waits for this thread
+                sys.stderr.write(f"Compressing rotated log {path} failed: {e}\n")
+    
+    def _compress_async(self, paths):
+        if paths:
+            self.compressor = threading.Thread(target=self._compress, args=(paths,), name="log-compress", daemon=True)
+            self.compressor.start()
+    
+    def _backup_exists(self, number):
+        return any(os.path.exists(f"{self.baseFilename}.{number}{suffix}") for suffix in BACKUP_SUFFIXES)
+    
+    def _remove_backup(self, number):
+        for suffix in BACKUP_SUFFIXES:
+            try:
+                os.remove(f"{self.baseFilename}.{number}{suffix}")
+            except FileNotFoundError:
+                pass
+    
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        if self.compressor is not None and self.compressor is not threading.current_thread():
+            self.compressor.join()  # don't rename a backup under the compressor
+        if self.backupCount > 0:
+            for i in range(self.backupCount - 1, 0, -1):
+                if self._backup_exists(i):
+                    # A slot holds one backup: drop every file of the one it replaces
+                    self._remove_backup(i + 1)
+                    for suffix in BACKUP_SUFFIXES:
+                        source = f"{self.baseFilename}.{i}{suffix}"
+                        if os.path.exists(source):
+                            os.replace(source, f"{self.baseFilename}.{i + 1}{suffix}")
+            self._remove_backup(1)
+            self.rotate(self.baseFilename, self.baseFilename + '.1')
+            if os.path.exists(self.baseFilename + '.1'):
+                self._compress_async([self.baseFilename + '.1'])
+        if not self.delay:
+            self.stream = self._open()
+
+class MetricsPipeline:
+    """Bounded in-memory buffer of metric samples drained by a background writer.
+    
+    record() is all the hot path pays: one deque append of a raw tuple. The
+    writer thread wakes every METRICS_FLUSH_SEC, serialises everything queued
+    to one JSON object per line and hands the batch to the file handler as a
+    single write. When the buffer is full new samples are dropped and counted;
+    the count is reported as metrics_dropped.
+    """
+    
+    def __init__(self, capacity=METRICS_BUFFER_SIZE, flush_interval=METRICS_FLUSH_SEC):
+        self.buffer = deque()
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.reported_dropped = 0
+        self.drop_lock = threading.Lock()
+        self.handler = None
+        self.thread = None
+    
+    def record(self, metric_name, value, tags=None):
+        if len(self.buffer) >= self.capacity:
+            with self.drop_lock:
+                self.dropped += 1
+            return
+        self.buffer.append((time.time(), metric_name, value, tags))
+    
+    def start(self, handler):
+        self.handler = handler
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="metrics", daemon=True)
+            self.thread.start()
+            atexit.register(self.drain)
+    
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.drain()
+            except Exception:
+                pass  # Don't let a bad sample kill the writer
+    
+    def drain(self):
+        """Write out everything buffered so far; returns the number of samples."""
+        if self.dropped != self.reported_dropped:
+            with self.drop_lock:
+                newly_dropped = self.dropped - self.reported_dropped
+                self.reported_dropped = self.dropped
+            self.buffer.append((time.time(), 'metrics_dropped', newly_dropped, None))
+        
+        popleft = self.buffer.popleft
+        batch = [popleft() for _ in range(len(self.buffer))]
+        if not batch or self.handler is None:
+            return 0
+        
+        lines = "\n".join(
+            json.dumps({
+                'timestamp': datetime.fromtimestamp(ts).isoformat(),
+                'metric': metric_name,
+                'value': value,
+                'tags': tags or {}
+            }, default=str)
+            for ts, metric_name, value, tags in batch
+        )
+        self.handler.handle(logging.LogRecord('metrics', logging.INFO, __file__, 0, lines, None, None))
+        return len(batch)
+
+metrics_pipeline = MetricsPipeline()
+
+def log_metric(metric_name, value, tags=None):
+    """Queue a structured metric for the background metrics writer"""
+    metrics_pipeline.record(metric_name, value, tags)
+
+exported_metrics = []
+
+class ExportedMetric:
+    """One metric family served by the /metrics exporter.
+    
+    Updates take no lock: each thread adds into its own cell, keyed by
+    (thread ident, label values) and created on first use, and a scrape sums
+    the cells. Only the owning thread writes a cell, so under the GIL no
+    update is lost; a scrape at worst misses one in flight. Gauges keep one
+    cell per label set (last write wins), or are computed at scrape time by
+    read(), which returns a value or {label values: value}. Histogram cells
+    hold per-bucket counts (the last bucket is +Inf) followed by the sum.
+    """
+    
+    def __init__(self, name, kind, help_text, labels=(), buckets=None, read=None):
+        self.name = name
+        self.kind = kind  # 'counter' | 'gauge' | 'histogram'
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.read = read
+        self.cells = {}
+        exported_metrics.append(self)
+    
+    def _cell(self, labels):
+        key = (threading.get_ident(), labels)
+        cell = self.cells.get(key)
+        if cell is None:
+            cell = self.cells[key] = [0] * (len(self.buckets) + 2 if self.buckets else 1)
+        return cell
+    
+    def inc(self, *labels, amount=1):
+        self._cell(labels)[0] += amount
+    
+    def set(self, value, *labels):
+        self.cells[(None, labels)] = [value]
+    
+    def observe(self, value, *labels):
+        cell = self._cell(labels)
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+    
+    def samples(self):
+        """{label values: value}, or bucket counts + [sum] for histograms"""
+        if self.read is not None:
+            value = self.read()
+            return value if isinstance(value, dict) else {(): value}
+        totals = {}
+        for (_, labels), cell in self.cells.copy().items():
+            total = totals.get(labels)
+            totals[labels] = list(cell) if total is None else [a + b for a, b in zip(total, cell)]
+        if self.kind != 'histogram':
+            return {labels: cell[0] for labels, cell in totals.items()}
+        return totals
+
+LABEL_ESCAPES = str.maketrans({'\\': '\\\\', '"': '\\"', '\n': '\\n'})
+
+def render_label_set(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{str(v).translate(LABEL_ESCAPES)}"' for n, v in zip(names, values)) + '}'
+
+def render_metrics(openmetrics=False):
+    """Exposition text for every ExportedMetric (OpenMetrics 1.0 or Prometheus 0.0.4)"""
+    out = []
+    for metric in exported_metrics:
+        try:
+            samples = metric.samples()
+        except Exception:
+            continue  # A broken read() must not fail the whole scrape
+        name = metric.name
+        family = name if openmetrics or metric.kind != 'counter' else f'{name}_total'
+        out.append(f'# HELP {family} {metric.help}')
+        out.append(f'# TYPE {family} {metric.kind}')
+        for labels, value in sorted(samples.items()):
+            if metric.kind == 'counter':
+                out.append(f'{name}_total{render_label_set(metric.labels, labels)} {value}')
+            elif metric.kind == 'gauge':
+                out.append(f'{name}{render_label_set(metric.labels, labels)} {value}')
+            else:
+                cumulative = 0
+                bucket_labels = metric.labels + ('le',)
+                for bound, count in zip([repr(float(b)) for b in metric.buckets] + ['+Inf'], value):
+                    cumulative += count
+                    out.append(f'{name}_bucket{render_label_set(bucket_labels, labels + (bound,))} {cumulative}')
+                out.append(f'{name}_count{render_label_set(metric.labels, labels)} {cumulative}')
+                out.append(f'{name}_sum{render_label_set(metric.labels, labels)} {value[-1]}')
+    if openmetrics:
+        out.append('# EOF')
+    return '\n'.join(out) + '\n'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+exp_checks = ExportedMetric('watchdog_checks', 'counter', 'Completed target checks.', ('target', 'result'))
+exp_errors = ExportedMetric('watchdog_errors', 'counter', 'Errors counted by the watchdog.',
+                            read=lambda: performance_metrics['error_count'])
+exp_target_up = ExportedMetric('watchdog_target_up', 'gauge', '1 if the last check of the target passed.', ('target',))
+exp_latency = ExportedMetric('watchdog_http_response_seconds', 'histogram', 'HTTP probe response time.',
+                             ('target',), LATENCY_BUCKETS)
+exp_check_duration = ExportedMetric('watchdog_check_duration_seconds', 'histogram',
+                                    'Wall time of a full target check.', ('target',), LATENCY_BUCKETS)
+exp_probes = ExportedMetric('watchdog_probes', 'counter', 'Probes run, by probe type.', ('probe',))
+exp_probe_bytes = ExportedMetric('watchdog_probe_bytes', 'counter', 'Bytes sent and received by probes.', ('probe',))
+exp_probe_ops = ExportedMetric('watchdog_probe_socket_ops', 'counter',
+                               'Socket operations (connect, handshake, send, recv) made by probes.', ('probe',))
+exp_phase = ExportedMetric('watchdog_phase_seconds', 'histogram', 'Time spent per phase of the watchdog\'s work.',
+                           ('phase',), (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30))
+exp_drift = ExportedMetric('watchdog_clock_drift_seconds', 'gauge', 'Last measured clock drift of the target.', ('target',))
+exp_schedule_lag = ExportedMetric('watchdog_schedule_lag_seconds', 'histogram',
+                                  'Delay between a check falling due and being dispatched.', (),
+                                  (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30))
+exp_overruns = ExportedMetric('watchdog_schedule_overruns', 'counter',
+                              'Checks that finished after the next one was due.', ('target',))
+exp_db_write = ExportedMetric('watchdog_db_write_seconds', 'histogram', 'Batched result write time.', (),
+                              (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+exp_db_rows = ExportedMetric('watchdog_db_rows_written', 'counter', 'Result rows persisted.')
+exp_db_failures = ExportedMetric('watchdog_db_write_failures', 'counter', 'Batched result writes that failed after retries.')
+ExportedMetric('watchdog_db_buffer_rows', 'gauge', 'Result rows waiting to be written.',
+               read=lambda: len(result_writer.pending))
+ExportedMetric('watchdog_alert_queue_depth', 'gauge', 'Alerts waiting for the dispatcher.',
+               read=lambda: alert_dispatcher.queue.qsize())
+ExportedMetric('watchdog_alerts_dropped', 'counter', 'Alerts dropped because the queue was full.',
+               read=lambda: alert_dispatcher.dropped)
+ExportedMetric('watchdog_metric_samples_dropped', 'counter', 'metrics.log samples dropped because the buffer was full.',
+               read=lambda: metrics_pipeline.dropped)
+ExportedMetric('watchdog_shard_members', 'gauge', 'Live replicas sharing this replica\'s targets.',
+               read=lambda: len(shard_coordinator.ring.members))
+ExportedMetric('watchdog_shard_targets_owned', 'gauge', 'Targets this replica checks.',
+               read=lambda: sum(map(shard_coordinator.owns, TARGETS)))
+ExportedMetric('watchdog_start_time_seconds', 'gauge', 'Unix time the watchdog started.',
+               read=lambda: performance_metrics['start_time'].timestamp())
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        openmetrics = 'application/openmetrics-text' in self.headers.get('Accept', '')
+        body = render_metrics(openmetrics).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+                         if openmetrics else 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would drown watchdog.log
+
+metrics_server = None
+
+def start_metrics_exporter(bind=METRICS_EXPORTER_BIND, port=METRICS_EXPORTER_PORT):
+    """Serve /metrics from a background thread; port 0 disables the exporter."""
+    global metrics_server
+    if port <= 0 or metrics_server is not None:
+        return
+    metrics_server = ThreadingHTTPServer((bind, port), MetricsRequestHandler)
+    metrics_server.daemon_threads = True
+    threading.Thread(target=metrics_server.serve_forever, name="metrics-exporter", daemon=True).start()
+    logger.info(f"Metrics exporter listening on {bind}:{port}/metrics")
+
+class StackSampler:
+    """On-demand sampling profiler over every thread.
+    
+    start() launches a thread that records all threads' stacks every
+    interval; after `cycles` calls to cycle_done() (one per summary) it
+    writes them as collapsed stacks ("thread;outer;...;inner count" lines)
+    to the profile directory, keeping the newest PROFILE_KEEP files. While
+    not sampling there is no thread, hook or tracer, so it costs nothing.
+    """
+    
+    def __init__(self, directory=PROFILE_DIR, cycles=PROFILE_CYCLES, interval=PROFILE_SAMPLE_MS / 1000,
+                 keep=PROFILE_KEEP):
+        self.directory = directory
+        self.cycles = cycles
+        self.interval = interval
+        self.keep = keep
+        # Reentrant: the SIGUSR1 handler may interrupt cycle_done() on the main thread
+        self.lock = threading.RLock()
+        self.thread = None
+        self.remaining = 0
+        self.finished = threading.Event()
+        self.last_path = None
+    
+    def start(self, cycles=None):
+        """Begin sampling unless a profile is already being taken; returns True if started."""
+        with self.lock:
+            if self.thread is not None:
+                return False
+            self.remaining = cycles or self.cycles
+            self.finished.clear()
+            self.stop = threading.Event()
+            self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self.thread.start()
+        return True
+    
+    def cycle_done(self):
+        with self.lock:
+            if self.thread is None:
+                return
+            self.remaining -= 1
+            if self.remaining <= 0:
+                self.stop.set()
+    
+    def _run(self):
+        me = threading.get_ident()
+        labels = {}  # code object -> "func (file:line)"
+        stacks = Counter()
+        samples = 0
+        started = time.time()
+        logger.info(f"Profiling the next {self.remaining} cycle(s), sampling every {self.interval * 1000:.0f}ms")
+        while not self.stop.wait(self.interval):
+            names = {t.ident: re.sub(r'_\d+$', '', t.name) for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                stacks[";".join(reversed(stack))] += 1
+            samples += 1
+        
+        try:
+            self._dump(stacks, samples, started)
+        except Exception as e:
+            logger.error(f"Failed to write profile: {e}")
+            count_error()
+        finally:
+            with self.lock:
+                self.thread = None
+            self.finished.set()
+    
+    def _dump(self, stacks, samples, started):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.fromtimestamp(started).strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(self.directory, f"watchdog-profile-{stamp}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self.last_path = path
+        for old in sorted(glob.glob(os.path.join(self.directory, "watchdog-profile-*.folded")))[:-self.keep or None]:
+            os.remove(old)
+        logger.info(f"Wrote profile of {samples} samples ({time.time() - started:.1f}s) to {path}")
+        log_metric('profile_samples', samples, {'path': path})
+
+stack_sampler = StackSampler()
 
 # Mount points that mirror each web's html volume
 # map "web1:80" -> "/sites/web1/index.html"
@@ -120,8 +830,514 @@ def db_conn():
         host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
     )
 
-def send_alert(subject, body):
+db_pool = None
+db_pool_lock = threading.Lock()
+
+@contextmanager
+def pooled_conn():
+    """Borrow a connection from the shared pool for one transaction.
+    
+    Commits on success, rolls back on error. Connections that raised are
+    discarded instead of being handed back, so a DB restart heals itself.
+    """
+    global db_pool
+    with db_pool_lock:
+        if db_pool is None:
+            db_pool = psycopg2.pool.ThreadedConnectionPool(
+                1, DB_POOL_SIZE,
+                host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
+            )
+    conn = db_pool.getconn()
+    broken = False
     try:
+        yield conn
+        with Span('db_commit'):
+            conn.commit()
+    except Exception:
+        broken = True
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
+        db_pool.putconn(conn, close=broken or conn.closed != 0)
+
+CHECK_INSERT_SQL = """
+    INSERT INTO checks (target, status, http_status, time_drift_seconds,
+                        response_time_ms, fetched_time, local_time, created_at)
+    VALUES %s
+"""
+METRIC_INSERT_SQL = """
+    INSERT INTO metrics (metric_name, metric_value, tags, timestamp)
+    VALUES %s
+"""
+
+class ResultWriter:
+    """Buffers check/metric rows from worker threads and writes them in batches.
+    
+    Each flush sends every buffered row in one transaction with one multi-row
+    INSERT per table. Failed flushes are retried with backoff; rows beyond
+    DB_BUFFER_MAX_ROWS move to an on-disk spill file that is replayed once the
+    DB is reachable again. At exit, whatever is still buffered is written
+    once more or spilled.
+    """
+    
+    def __init__(self, max_rows=DB_BUFFER_MAX_ROWS, spill_path=DB_SPILL_PATH,
+                 spill_max_bytes=DB_SPILL_MAX_BYTES, retries=DB_WRITE_RETRIES):
+        self.max_rows = max_rows
+        self.spill_path = spill_path
+        self.spill_max_bytes = spill_max_bytes
+        self.retries = retries
+        self.pending = deque()  # ('checks' | 'metrics', row tuple)
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()  # one flush or final write at a time
+        self.dropped = 0
+        self.thread = None
+    
+    def start(self, interval):
+        """Flush every interval seconds on a background thread."""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f"Result flush failed: {e}")
+        
+        if self.thread is None:
+            self.thread = threading.Thread(target=run, name="result-writer", daemon=True)
+            self.thread.start()
+            atexit.register(self.close)
+    
+    def close(self, wait=5.0):
+        """Final write at exit: one attempt, and spill the rows if it fails.
+        
+        Waits up to `wait` seconds for a flush already in progress, so a
+        retrying flush can't hold up shutdown past the stop grace period.
+        """
+        acquired = self.flush_lock.acquire(timeout=wait)
+        try:
+            with self.lock:
+                rows = list(self.pending)
+                self.pending.clear()
+            if not rows:
+                return
+            try:
+                self._write(rows)
+                logger.info(f"Persisted {len(rows)} result rows at exit")
+            except Exception as e:
+                logger.warning(f"Final DB write failed, spilling {len(rows)} result rows: {e}")
+                with self.lock:
+                    self._spill(rows)
+        finally:
+            if acquired:
+                self.flush_lock.release()
+    
+    def add_check(self, target, ok, http_status, drift, response_time, fetched, local):
+        status_label = "ok" if ok else "fail"
+        now = datetime.now()
+        with self.lock:
+            self.pending.append(('checks', (
+                target,
+                'PASS' if ok else 'FAIL',
+                http_status,
+                drift,
+                int(response_time * 1000),  # Convert to milliseconds
+                fetched,
+                local,
+                now
+            )))
+            self.pending.append(('metrics', (
+                'response_time_ms',
+                int(response_time * 1000),
+                json.dumps({"target": target, "status": status_label}),
+                now
+            )))
+            self._enforce_limit()
+    
+    def _enforce_limit(self):
+        # Caller holds self.lock
+        overflow = len(self.pending) - self.max_rows
+        if overflow <= 0:
+            return
+        spilled = [self.pending.popleft() for _ in range(overflow)]
+        self._spill(spilled)
+    
+    def _spill(self, rows):
+        try:
+            if os.path.exists(self.spill_path) and os.path.getsize(self.spill_path) >= self.spill_max_bytes:
+                raise OSError("spill file full")
+            os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for table, row in rows:
+                    f.write(json.dumps([table, row], default=str) + "\n")
+            log_metric('db_rows_spilled', len(rows))
+        except Exception as e:
+            self.dropped += len(rows)
+            logger.error(f"Dropping {len(rows)} result rows, spill failed: {e}")
+            log_metric('db_rows_dropped', len(rows), {'reason': str(e)})
+    
+    def _write(self, rows):
+        checks = [row for table, row in rows if table == 'checks']
+        metrics = [row for table, row in rows if table == 'metrics']
+        with pooled_conn() as conn:
+            with conn.cursor() as cur:
+                if checks:
+                    with Span('db_insert_checks'):
+                        psycopg2.extras.execute_values(cur, CHECK_INSERT_SQL, checks, page_size=1000)
+                if metrics:
+                    with Span('db_insert_metrics'):
+                        psycopg2.extras.execute_values(cur, METRIC_INSERT_SQL, metrics, page_size=1000)
+    
+    def _write_with_retry(self, rows):
+        delay = 0.5
+        for attempt in range(1, self.retries + 1):
+            try:
+                self._write(rows)
+                return True
+            except Exception as e:
+                logger.warning(f"DB batch write failed (attempt {attempt}/{self.retries}): {e}")
+                if attempt < self.retries:
+                    time.sleep(delay)
+                    delay *= 2
+        return False
+    
+    def _replay_spill(self):
+        replay_path = self.spill_path + ".replay"
+        # A .replay left by a crash mid-replay goes first; the spill file waits
+        # for the next flush rather than overwriting it
+        if not os.path.exists(replay_path):
+            if not os.path.exists(self.spill_path):
+                return
+            os.replace(self.spill_path, replay_path)
+        with open(replay_path, encoding="utf-8") as f:
+            rows = [(table, tuple(row)) for table, row in (json.loads(line) for line in f if line.strip())]
+        written = 0
+        for i in range(0, len(rows), self.max_rows):
+            batch = rows[i:i + self.max_rows]
+            if not self._write_with_retry(batch):
+                with self.lock:
+                    self._spill(rows[i:])
+                logger.warning(f"Replay failed, re-spilled {len(rows) - i} result rows")
+                break
+            written += len(batch)
+        os.remove(replay_path)
+        if written:
+            logger.info(f"Replayed {written} spilled result rows")
+    
+    def flush(self):
+        """Write everything buffered so far; returns the number of rows written."""
+        with self.flush_lock:
+            return self._flush()
+    
+    def _flush(self):
+        with self.lock:
+            rows = list(self.pending)
+            self.pending.clear()
+        if not rows:
+            return 0
+        
+        write_start = time.time()
+        if not self._write_with_retry(rows):
+            # Put the batch back in front of anything queued meanwhile
+            with self.lock:
+                self.pending.extendleft(reversed(rows))
+                self._enforce_limit()
+            log_metric('db_write_failure', len(rows))
+            exp_db_failures.inc()
+            count_error()
+            return 0
+        
+        log_metric('db_write_time', time.time() - write_start, {'rows': len(rows)})
+        exp_db_write.observe(time.time() - write_start)
+        exp_db_rows.inc(amount=len(rows))
+        logger.info(f"Persisted {len(rows)} result rows in one batch")
+        try:
+            self._replay_spill()
+        except Exception as e:
+            logger.error(f"Failed to replay spilled result rows: {e}")
+        return len(rows)
+
+result_writer = ResultWriter()
+
+def run_maintenance():
+    """One partition/retention pass; returns the actions the database took."""
+    start = time.perf_counter()
+    with pooled_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT monitoring_maintenance(%s, %s, %s, %s, %s, %s, %s)",
+                (RETENTION_CHECKS_DAYS, RETENTION_METRICS_DAYS, RETENTION_ROLLUP_MINUTE_DAYS,
+                 RETENTION_ROLLUP_HOUR_DAYS, RETENTION_ROLLUP_DAY_DAYS, PARTITION_PREMAKE_DAYS,
+                 RETENTION_ARCHIVE)
+            )
+            actions = cur.fetchone()[0] or []
+    for action in actions:
+        logger.info(f"DB maintenance: {action}")
+    log_metric('db_maintenance_seconds', round(time.perf_counter() - start, 3), {'actions': len(actions)})
+    return actions
+
+maintenance_thread = None
+
+def start_maintenance(interval=MAINTENANCE_INTERVAL_SEC):
+    """Run maintenance now and then every interval seconds in the background."""
+    global maintenance_thread
+    if interval <= 0 or maintenance_thread is not None:
+        return
+    
+    def run():
+        while True:
+            try:
+                run_maintenance()
+            except Exception as e:
+                logger.error(f"DB maintenance failed: {e}")
+                count_error()
+            time.sleep(interval)
+    
+    maintenance_thread = threading.Thread(target=run, name="db-maintenance", daemon=True)
+    maintenance_thread.start()
+
+def ring_hash(key):
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+class HashRing:
+    """Consistent-hash ring: each member gets `vnodes` points on a 64-bit
+    circle and a key belongs to the first point at or after its hash, so a
+    member joining or leaving only moves ~1/N of the keys."""
+    
+    def __init__(self, members, vnodes=SHARD_VNODES):
+        self.members = frozenset(members)
+        points = sorted((ring_hash(f"{m}#{i}"), m) for m in self.members for i in range(vnodes))
+        self.hashes = [h for h, _ in points]
+        self.owners = [m for _, m in points]
+    
+    def owner(self, key):
+        if not self.owners:
+            return None
+        return self.owners[bisect.bisect_left(self.hashes, ring_hash(key)) % len(self.owners)]
+
+class ShardCoordinator:
+    """Decides which targets this replica checks when several share a database.
+    
+    A background thread upserts this replica's row in watchdog_replicas every
+    heartbeat seconds and rebuilds the ring from the rows younger than ttl, so
+    every replica derives the same owner for each target. owns() only reads
+    the current ring and is safe from any thread. Until the first heartbeat
+    succeeds the replica owns everything, and if the database becomes
+    unreachable later it keeps the last ring: checking twice beats not
+    checking. On exit the row is deleted so the others take over at their
+    next heartbeat instead of after the TTL.
+    """
+    
+    def __init__(self, enabled=SHARDING, group=SHARD_GROUP, replica_id=REPLICA_ID,
+                 heartbeat=SHARD_HEARTBEAT_SEC, ttl=SHARD_TTL_SEC, vnodes=SHARD_VNODES):
+        self.enabled = enabled
+        self.group = group
+        self.replica_id = replica_id
+        self.heartbeat_interval = heartbeat
+        self.ttl = ttl
+        self.vnodes = vnodes
+        self.ring = HashRing([replica_id], vnodes)
+        self.thread = None
+    
+    def owns(self, target):
+        return not self.enabled or self.ring.owner(target) == self.replica_id
+    
+    def heartbeat(self):
+        """Refresh this replica's row and the ring; returns the live members."""
+        with pooled_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """INSERT INTO watchdog_replicas (shard_group, replica_id, hostname)
+                       VALUES (%s, %s, %s)
+                       ON CONFLICT (shard_group, replica_id) DO UPDATE SET heartbeat_at = NOW()""",
+                    (self.group, self.replica_id, socket.gethostname())
+                )
+                cur.execute(
+                    """SELECT replica_id FROM watchdog_replicas
+                       WHERE shard_group = %s AND heartbeat_at > NOW() - make_interval(secs => %s)""",
+                    (self.group, self.ttl)
+                )
+                members = {row[0] for row in cur.fetchall()}
+                # Long-dead replicas only clutter the table
+                cur.execute(
+                    """DELETE FROM watchdog_replicas
+                       WHERE shard_group = %s AND heartbeat_at < NOW() - make_interval(secs => %s)""",
+                    (self.group, self.ttl * 10)
+                )
+        if members != self.ring.members:
+            self.ring = HashRing(members, self.vnodes)
+            owned = sum(map(self.owns, TARGETS))
+            logger.info(f"Shard membership changed: {len(members)} replicas {sorted(members)}; "
+                        f"{self.replica_id} now checks {owned}/{len(TARGETS)} targets")
+            log_metric('shard_rebalance', len(members), {'replica': self.replica_id, 'targets_owned': owned})
+        return members
+    
+    def leave(self):
+        try:
+            with pooled_conn() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("DELETE FROM watchdog_replicas WHERE shard_group = %s AND replica_id = %s",
+                                (self.group, self.replica_id))
+        except Exception as e:
+            logger.warning(f"Could not deregister replica {self.replica_id}: {e}")
+    
+    def start(self):
+        """Join the group (first heartbeat runs inline) and keep heartbeating."""
+        if not self.enabled or self.thread is not None:
+            return
+        
+        def beat():
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.error(f"Shard heartbeat failed: {e}")
+                count_error()
+        
+        def run():
+            while True:
+                time.sleep(self.heartbeat_interval)
+                beat()
+        
+        logger.info(f"Sharding enabled: replica {self.replica_id} in group '{self.group}' "
+                    f"(heartbeat {self.heartbeat_interval}s, TTL {self.ttl}s)")
+        beat()
+        self.thread = threading.Thread(target=run, name="shard-heartbeat", daemon=True)
+        self.thread.start()
+        atexit.register(self.leave)
+
+shard_coordinator = ShardCoordinator()
+
+class AlertDispatcher:
+    """Background alert pipeline: queue -> dedup/cooldown -> digest -> SMTP.
+    
+    send_alert() only enqueues, so a check never waits on SMTP. The worker
+    thread collects everything that arrives within the digest window, drops
+    repeats of an active (target, failure type) until its cooldown has passed,
+    then mails the rest as one message over a persistent SMTP connection.
+    """
+    
+    def __init__(self, cooldown=ALERT_COOLDOWN_SEC, digest_window=ALERT_DIGEST_WINDOW_SEC,
+                 queue_max=ALERT_QUEUE_MAX):
+        self.cooldown = cooldown
+        self.digest_window = digest_window
+        self.queue = queue.Queue(maxsize=queue_max)
+        # (target, failure_type) -> {'since', 'last_sent', 'suppressed'}
+        self.active = {}
+        # Targets with an alert submitted and not yet resolved. Kept at submit()
+        # time, not by the worker, so a recovery within the digest window is
+        # still queued behind its alert.
+        self.alerting_targets = set()
+        self.smtp = None
+        self.thread = None
+        self.dropped = 0
+    
+    def submit(self, subject, body, key):
+        try:
+            self.queue.put_nowait(('alert', key, subject, body, datetime.now()))
+            self.alerting_targets.add(key[0])
+        except queue.Full:
+            self.dropped += 1
+            logger.error(f"Alert queue full, dropping alert: {subject}")
+            log_metric('alert_dropped', 1, {'reason': 'queue_full'})
+    
+    def resolve(self, target):
+        """Mark every active failure of target as recovered."""
+        if target not in self.alerting_targets:
+            return
+        try:
+            self.queue.put_nowait(('resolve', (target, None), None, None, datetime.now()))
+            self.alerting_targets.discard(target)
+        except queue.Full:
+            pass  # still marked alerting: the next passing check retries
+    
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="alerts", daemon=True)
+            self.thread.start()
+    
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.digest_window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._dispatch(batch)
+            except Exception as e:
+                logger.error(f"Alert dispatch failed: {e}")
+    
+    def _collect(self, batch):
+        """Apply dedup/cooldown to a batch; returns [(subject, body)] to send."""
+        now = time.monotonic()
+        messages = []
+        for kind, key, subject, body, at in batch:
+            if kind == 'resolve':
+                target = key[0]
+                for active_key in [k for k in self.active if k[0] == target]:
+                    state = self.active.pop(active_key)
+                    messages.append((
+                        f"[Monitoring] Recovered: {target}",
+                        f"{target} recovered from '{active_key[1]}' failure "
+                        f"(failing since {state['since'].isoformat(timespec='seconds')}).\n"
+                    ))
+                continue
+            
+            state = self.active.get(key)
+            if state is None:
+                self.active[key] = {'since': at, 'last_sent': now, 'suppressed': 0}
+                messages.append((subject, body))
+            elif now - state['last_sent'] >= self.cooldown:
+                messages.append((
+                    f"[Monitoring] Still failing: {key[0]}",
+                    f"{key[0]} still failing ({key[1]}) since {state['since'].isoformat(timespec='seconds')}, "
+                    f"{state['suppressed'] + 1} occurrences since the last notice.\n\n{body}"
+                ))
+                state['last_sent'] = now
+                state['suppressed'] = 0
+            else:
+                state['suppressed'] += 1
+                log_metric('alert_suppressed', 1, {'target': key[0], 'failure': key[1]})
+        return messages
+    
+    def _dispatch(self, batch):
+        messages = self._collect(batch)
+        if not messages:
+            return
+        if len(messages) == 1:
+            subject, body = messages[0]
+        else:
+            subject = f"[Monitoring] {len(messages)} alerts"
+            body = "\n\n".join(f"== {part_subject} ==\n{part_body}" for part_subject, part_body in messages)
+        self._deliver(subject, body, len(messages))
+    
+    def _connect(self):
+        if SMTP_HOST != "mailhog" and SMTP_USER and SMTP_PASSWORD:
+            logger.info("Using authenticated SMTP with TLS")
+            smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=10)
+            smtp.starttls()
+            smtp.login(SMTP_USER, SMTP_PASSWORD)
+        else:
+            logger.info("Using simple SMTP (MailHog)")
+            smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=10)
+        return smtp
+    
+    def _close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.close()
+            except Exception:
+                pass
+            self.smtp = None
+    
+    def _deliver(self, subject, body, alert_count):
         alert_start = time.time()
         logger.info(f"Sending alert: {subject}")
         
@@ -130,67 +1346,193 @@ def send_alert(subject, body):
         msg["From"] = SMTP_FROM
         msg["To"] = SMTP_TO
         
-        if SMTP_HOST != "mailhog" and SMTP_USER and SMTP_PASSWORD:
-            logger.info("Using authenticated SMTP with TLS")
-            with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=10) as s:
-                s.starttls()
-                s.login(SMTP_USER, SMTP_PASSWORD)
-                s.sendmail(SMTP_FROM, [SMTP_TO], msg.as_string())
-        else:
-            logger.info("Using simple SMTP (MailHog)")
-            with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=10) as s:
-                s.sendmail(SMTP_FROM, [SMTP_TO], msg.as_string())
+        for attempt in (1, 2):
+            try:
+                reused = self.smtp is not None
+                with Span('smtp_send'):
+                    if self.smtp is None:
+                        self.smtp = self._connect()
+                    self.smtp.sendmail(SMTP_FROM, [SMTP_TO], msg.as_string())
+                break
+            except Exception as e:
+                self._close()
+                # A reused connection may have been closed by the server; retry once fresh
+                if attempt == 1 and reused:
+                    continue
+                logger.error(f"Failed to send alert: {e}")
+                log_metric('alert_delivery_failure', 1, {'type': 'email', 'error': str(e)})
+                count_error()
+                return
         
         alert_time = time.time() - alert_start
-        logger.info(f"Alert sent successfully in {alert_time:.2f}s")
+        logger.info(f"Alert sent successfully in {alert_time:.2f}s ({alert_count} alert(s))")
         
         # Log metric for alert performance
-        log_metric('alert_delivery_time', alert_time, {'type': 'email', 'status': 'success'})
+        log_metric('alert_delivery_time', alert_time, {'type': 'email', 'status': 'success', 'alerts': alert_count})
+
+alert_dispatcher = AlertDispatcher()
+
+def send_alert(subject, body, target=None, failure_type="general"):
+    """Queue an alert; repeats of the same target+failure_type are deduplicated."""
+    alert_dispatcher.submit(subject, body, (target or subject, failure_type))
+
+NTP_EPOCH_OFFSET = 2208988800  # seconds between 1900-01-01 and 1970-01-01
+
+def query_sntp(host, port=123, timeout=5):
+    """One SNTP exchange; returns (unix_time, round_trip) at receipt of the reply."""
+    packet = b"\x23" + 47 * b"\0"  # LI=0, VN=4, Mode=3 (client)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        t1 = time.time()
+        sock.sendto(packet, (host, port))
+        data, _ = sock.recvfrom(48)
+        t4 = time.time()
+    if len(data) < 48:
+        raise ValueError("short SNTP reply")
+    
+    def ntp_ts(offset):
+        seconds = int.from_bytes(data[offset:offset + 4], "big")
+        fraction = int.from_bytes(data[offset + 4:offset + 8], "big")
+        return seconds - NTP_EPOCH_OFFSET + fraction / 2**32
+    
+    t2, t3 = ntp_ts(32), ntp_ts(40)  # server receive / transmit
+    offset = ((t2 - t1) + (t3 - t4)) / 2
+    return t4 + offset, (t4 - t1) - (t3 - t2)
+
+class TimeReference:
+    """External wall-clock reference that never blocks the check loop.
+    
+    A background thread calibrates against WORLD_TIME_URL every
+    TIME_REFRESH_SEC, backing off exponentially after failures. Between
+    calibrations now() projects the last reading forward with
+    time.monotonic(). uncertainty() is half the calibration round trip plus
+    CLOCK_DRIFT_RATE times the reference's age.
+    """
+    
+    def __init__(self, url=WORLD_TIME_URL, refresh=TIME_REFRESH_SEC):
+        self.url = url
+        self.refresh = refresh
+        self.lock = threading.Lock()
+        self.reference = None  # (datetime, monotonic seconds, base uncertainty)
+        self.stop_event = threading.Event()
+        self.first_attempt = threading.Event()  # set once the first calibration finished or failed
+        self.thread = None
+        try:
+            self.tz = ZoneInfo(TZ)
+        except Exception:
+            self.tz = None
+    
+    def _read_source(self):
+        """Returns (reference datetime, round trip seconds) for the moment the reply arrived."""
+        parsed = urlparse(self.url)
+        if parsed.scheme == "ntp":
+            unix_time, round_trip = query_sntp(parsed.hostname, parsed.port or 123)
+            return datetime.fromtimestamp(unix_time, self.tz or timezone.utc), round_trip
         
-    except Exception as e:
-        logger.error(f"Failed to send alert: {e}")
-        log_metric('alert_delivery_failure', 1, {'type': 'email', 'error': str(e)})
-        performance_metrics['error_count'] += 1
+        request_start = time.monotonic()
+        r = requests.get(self.url, timeout=5)
+        round_trip = time.monotonic() - request_start
+        r.raise_for_status()
+        # The server stamped its reply somewhere in the round trip; assume the middle
+        fetched = datetime.fromisoformat(r.json()["datetime"]) + timedelta(seconds=round_trip / 2)
+        return fetched, round_trip
+    
+    def calibrate(self):
+        api_start = time.time()
+        logger.info(f"Calibrating time reference against {self.url}")
+        try:
+            with Span('time_calibrate'):
+                fetched, round_trip = self._read_source()
+        except Exception as e:
+            logger.warning(f"Time reference calibration failed: {e}")
+            log_metric('api_failure', 1, {'api': 'worldtimeapi', 'error': str(e)})
+            return False
+        
+        with self.lock:
+            self.reference = (fetched, time.monotonic(), round_trip / 2)
+        api_time = time.time() - api_start
+        logger.info(f"Time reference calibrated in {api_time:.2f}s: {fetched.isoformat()} (±{round_trip / 2 * 1000:.1f}ms)")
+        
+        # Log API performance metric
+        log_metric('api_response_time', api_time, {'api': 'worldtimeapi', 'status': 'success'})
+        return True
+    
+    def _refresh_loop(self):
+        backoff = TIME_REFRESH_MIN_BACKOFF_SEC
+        while True:
+            calibrated = self.calibrate()
+            self.first_attempt.set()
+            if calibrated:
+                backoff = TIME_REFRESH_MIN_BACKOFF_SEC
+                wait_for = self.refresh
+            else:
+                wait_for = backoff
+                backoff = min(backoff * 2, self.refresh)
+            if self.stop_event.wait(wait_for):
+                return
+    
+    def start(self):
+        """Calibrate once in the background thread and keep refreshing."""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._refresh_loop, name="time-reference", daemon=True)
+            self.thread.start()
+    
+    def stop(self):
+        self.stop_event.set()
+    
+    @property
+    def calibrated(self):
+        return self.reference is not None
+    
+    def age(self):
+        """Seconds since the last successful calibration (None if never)."""
+        reference = self.reference
+        return None if reference is None else time.monotonic() - reference[1]
+    
+    def uncertainty(self):
+        reference = self.reference
+        if reference is None:
+            return None
+        return reference[2] + CLOCK_DRIFT_RATE * (time.monotonic() - reference[1])
+    
+    def now(self):
+        """Current reference time, or None before the first calibration."""
+        return self.at(time.monotonic())
+    
+    def at(self, mono):
+        """Reference time at a given time.monotonic() instant, or None before calibration."""
+        reference = self.reference
+        if reference is None:
+            return None
+        fetched, ref_mono, _ = reference
+        return fetched + timedelta(seconds=mono - ref_mono)
+
+time_reference = TimeReference()
 
 def fetch_world_time():
-    # Enhanced logging for API performance
-    api_start = time.time()
-    logger.info("Fetching world time...")
-    logger.info("Attempting to fetch world time from external APIs...")
-    
-    try:
-        url = "https://worldtimeapi.org/api/timezone/Asia/Colombo"
-        logger.info(f"Trying HTTP: {url}")
-        r = requests.get(url, timeout=5)
-        if r.status_code == 200:
-            data = r.json()
-            api_time = time.time() - api_start
-            logger.info(f"Successfully fetched world time via HTTP in {api_time:.2f}s: {data['datetime']}")
-            
-            # Log API performance metric
-            log_metric('api_response_time', api_time, {'api': 'worldtimeapi', 'status': 'success'})
-            
-            return datetime.fromisoformat(data["datetime"])
-    except Exception as e:
-        logger.warning(f"HTTP API failed: {e}")
-        log_metric('api_failure', 1, {'api': 'worldtimeapi', 'error': str(e)})
+    """Reference time for drift checks; falls back to system time until calibrated."""
+    reference_now = time_reference.now()
+    if reference_now is not None:
+        return reference_now
     
     # Fallback: Use system time
-    logger.warning("External APIs unavailable, using system time as reference")
-    system_time = datetime.now().astimezone()
-    logger.info(f"Using system time as fallback: {system_time}")
-    
-    # Log fallback usage
     log_metric('time_source_fallback', 1, {'source': 'system_time'})
-    
-    return system_time
+    return datetime.now().astimezone()
+
+def reference_time_at(mono):
+    """fetch_world_time() for a past time.monotonic() instant."""
+    reference = time_reference.at(mono)
+    if reference is not None:
+        return reference
+    return datetime.now().astimezone() - timedelta(seconds=time.monotonic() - mono)
 
 def get_local_time():
     # Get local time using the container's timezone setting
     return datetime.now().astimezone()
 
-def update_homepage(target, fetched_dt, local_dt, container_id):
-    content = f"""<!doctype html>
+# Homepage template: static markup with {container_id}, {tz}, {fetched} and
+# {local} placeholders ("{{"/"}}" are literal braces for the CSS)
+HOMEPAGE_TEMPLATE = """<!doctype html>
 <html lang="en">
 <head>
     <meta charset="utf-8">
@@ -311,13 +1653,13 @@ def update_homepage(target, fetched_dt, local_dt, container_id):
             </div>
             
             <div class="info-card">
-                <div class="info-label">External Time ({TZ})</div>
-                <div class="info-value">{fetched_dt.strftime('%Y-%m-%d %H:%M:%S %Z')}</div>
+                <div class="info-label">External Time ({tz})</div>
+                <div class="info-value">{fetched}</div>
             </div>
             
             <div class="info-card">
                 <div class="info-label">Local Container Time</div>
-                <div class="info-value">{local_dt.strftime('%Y-%m-%d %H:%M:%S %Z')}</div>
+                <div class="info-value">{local}</div>
             </div>
         </div>
         
@@ -329,169 +1671,857 @@ def update_homepage(target, fetched_dt, local_dt, container_id):
 </body>
 </html>
 """
+
+# Split once into (static text, field name) pairs so rendering is a join
+HOMEPAGE_PARTS = [(literal, field) for literal, field, _, _ in string.Formatter().parse(HOMEPAGE_TEMPLATE)]
+
+# Whether to fsync each homepage before publishing it (durable, but slower on network volumes)
+HOMEPAGE_FSYNC = os.getenv("HOMEPAGE_FSYNC", "false").lower() == "true"
+
+def render_homepage(fields):
+    out = []
+    for literal, field in HOMEPAGE_PARTS:
+        out.append(literal)
+        if field is not None:
+            out.append(fields[field])
+    return "".join(out)
+
+# Digest of the content last published per path, to skip identical rewrites
+published_homepages = {}
+
+def publish_file(path, data, fsync=HOMEPAGE_FSYNC):
+    """Atomically replace path with data: write a temp file beside it, then os.replace.
+    
+    Readers (nginx) see either the old or the new file, never a partial one.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        # nginx runs as another user; mkstemp-style 0600 would lock it out
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def update_homepage(target, fetched_dt, local_dt, container_id):
+    """Render the target's homepage and publish it if it changed.
+    
+    Returns True when the file was written.
+    """
+    content = render_homepage({
+        'container_id': container_id,
+        'tz': TZ,
+        'fetched': fetched_dt.strftime('%Y-%m-%d %H:%M:%S %Z'),
+        'local': local_dt.strftime('%Y-%m-%d %H:%M:%S %Z'),
+    }).encode("utf-8")
+    
     path = site_path_for(target)
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(content)
+    digest = hashlib.blake2b(content, digest_size=16).digest()
+    if published_homepages.get(path) == digest and os.path.exists(path):
+        return False
+    
+    publish_file(path, content)
+    published_homepages[path] = digest
+    return True
+
+class CountingSocket:
+    """Socket proxy that counts the operations and bytes passing through it.
+    
+    http.client only calls sendall() and reads through makefile(), so every
+    send/recv of a probe is seen here. ops approximates the probe's socket
+    syscalls (a large sendall can take more than one). The reader is built
+    on the real socket's makefile(), whose reference keeps the fd open when
+    http.client closes the connection before the body is read (responses
+    with Connection: close). With a deadline (monotonic) each operation may
+    only wait for the time left until it, so a slow body cannot hold the
+    probe past it.
+    """
+    
+    def __init__(self, sock, ops=0, deadline=None):
+        self.sock = sock
+        self.ops = ops
+        self.bytes = 0
+        self.deadline = deadline
+    
+    def arm(self):
+        if self.deadline is not None:
+            self.sock.settimeout(remaining_time(self.deadline))
+    
+    def sendall(self, data):
+        self.arm()
+        self.ops += 1
+        self.bytes += len(data)
+        return self.sock.sendall(data)
+    
+    def makefile(self, mode="rb", buffering=-1):
+        raw = CountingReader(self.sock.makefile("rb", buffering=0), self)
+        return io.BufferedReader(raw, buffering if buffering > 0 else io.DEFAULT_BUFFER_SIZE)
+    
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+class CountingReader(io.RawIOBase):
+    """Raw reader over a socket's own SocketIO that adds each recv to a CountingSocket."""
+    
+    def __init__(self, raw, counter):
+        self.raw = raw
+        self.counter = counter
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, buffer):
+        self.counter.arm()
+        n = self.raw.readinto(buffer)
+        if n is not None:
+            self.counter.ops += 1
+            self.counter.bytes += n
+        return n
+    
+    def close(self):
+        if not self.closed:
+            self.raw.close()
+        super().close()
+
+tls_context = ssl.create_default_context()
+
+def remaining_time(deadline):
+    """Seconds left until a monotonic deadline; raises TimeoutError once it has passed."""
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise TimeoutError("target deadline exceeded")
+    return left
+
+# getaddrinfo() takes no timeout; lookups run here so a probe can stop
+# waiting at its deadline (a hung lookup keeps only its resolver thread)
+dns_executor = ThreadPoolExecutor(max_workers=CHECK_CONCURRENCY, thread_name_prefix="dns")
+
+def resolve_address(host, port, deadline):
+    """First getaddrinfo() result for a TCP connection, within the deadline."""
+    lookup = dns_executor.submit(socket.getaddrinfo, host, port, type=socket.SOCK_STREAM)
+    try:
+        return lookup.result(timeout=remaining_time(deadline))[0]
+    except TimeoutError:
+        lookup.cancel()
+        raise TimeoutError(f"DNS lookup of {host} exceeded the target deadline") from None
+
+def open_probe_socket(host, port, deadline, timings, tls=False):
+    """Connected (and for tls, handshaken) CountingSocket bound to a monotonic
+    deadline; fills in dns/connect/tls timings."""
+    dns_start = time.perf_counter()
+    family, socktype, proto, _, address = resolve_address(host, port, deadline)
+    connect_start = time.perf_counter()
+    timings['dns'] = connect_start - dns_start
+    
+    sock = socket.socket(family, socktype, proto)
+    try:
+        sock.settimeout(remaining_time(deadline))
+        sock.connect(address)
+        timings['connect'] = time.perf_counter() - connect_start
+        if tls:
+            handshake_start = time.perf_counter()
+            sock.settimeout(remaining_time(deadline))
+            sock = tls_context.wrap_socket(sock, server_hostname=host)
+            timings['tls'] = time.perf_counter() - handshake_start
+    except Exception:
+        sock.close()
+        raise
+    return CountingSocket(sock, ops=2 if tls else 1, deadline=deadline)
+
+class HTTPProbePool:
+    """Keep-alive HTTP connections to the targets, one idle connection each.
+    
+    Every request reports where its time went: DNS lookup, TCP connect, TLS
+    handshake (tls:// targets), time to first byte (request sent -> status
+    line and headers parsed) and body transfer, plus the bytes and socket
+    operations it cost. DNS, connect and TLS are zero when a warm connection
+    is reused. 'sent' and 'received' are the monotonic instants the request
+    went out and the response headers came back, for round-trip corrected
+    clock reads.
+    """
+    
+    def __init__(self):
+        self.idle = {}
+        self.lock = threading.Lock()
+    
+    def _open(self, host, port, deadline, timings, tls=False):
+        conn = http.client.HTTPConnection(host, port)
+        conn.sock = open_probe_socket(host, port, deadline, timings, tls)
+        return conn
+    
+    def _checkout(self, target):
+        with self.lock:
+            return self.idle.pop(target, None)
+    
+    def _checkin(self, target, conn):
+        with self.lock:
+            stale = self.idle.pop(target, None)
+            self.idle[target] = conn
+        if stale is not None:
+            stale.close()
+    
+    # An unread remainder this small is drained so the connection stays reusable
+    DRAIN_LIMIT = 64*1024
+    
+    def request(self, target, method="GET", path="/", headers=None, mode=PROBE_MODE,
+                timeout=TARGET_DEADLINE, read_body=None):
+        """Send one request; returns (response, body, timings).
+        
+        ``read_body(response)`` consumes the body and its return value is
+        passed back as ``body``; by default the whole body is read. The
+        whole exchange, retry included, must finish within ``timeout``
+        seconds or TimeoutError is raised.
+        """
+        host, port = target.split(":")
+        port = int(port)
+        request_headers = {"Host": target, "Connection": "keep-alive" if mode == "warm" else "close"}
+        request_headers.update(headers or {})
+        
+        deadline = time.monotonic() + timeout
+        conn = self._checkout(target) if mode == "warm" else None
+        while True:
+            timings = {'dns': 0.0, 'connect': 0.0, 'tls': 0.0, 'ttfb': 0.0, 'transfer': 0.0,
+                       'reused': conn is not None}
+            if conn is None:
+                conn = self._open(host, port, deadline, timings, tls=TARGET_PROBES.get(target) == "tls")
+                ops_before = bytes_before = 0
+            else:
+                conn.sock.deadline = deadline
+                ops_before, bytes_before = conn.sock.ops, conn.sock.bytes
+            # http.client drops conn.sock when the response says Connection: close
+            counter = conn.sock
+            
+            try:
+                timings['sent'] = time.monotonic()
+                request_start = time.perf_counter()
+                conn.request(method, path, headers=request_headers)
+                response = conn.getresponse()
+                body_start = time.perf_counter()
+                timings['received'] = time.monotonic()
+                timings['ttfb'] = body_start - request_start
+                body = read_body(response) if read_body else response.read()
+                if not response.isclosed() and response.length is not None and response.length <= self.DRAIN_LIMIT:
+                    response.read()
+                timings['transfer'] = time.perf_counter() - body_start
+                timings['socket_ops'] = counter.ops - ops_before
+                timings['bytes'] = counter.bytes - bytes_before
+            except (ConnectionError, http.client.BadStatusLine):
+                conn.close()
+                if timings['reused']:
+                    # The server closed the idle connection; retry once on a fresh one
+                    conn = None
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+            
+            if mode == "warm" and response.isclosed() and not response.will_close:
+                self._checkin(target, conn)
+            else:
+                conn.close()
+            return response, body, timings
+
+probe_pool = HTTPProbePool()
+
+expect_rules = {}
+
+def expect_rule_for(target):
+    """Compiled (markers, regex) for a target, built once from TARGET_EXPECT."""
+    rule = expect_rules.get(target)
+    if rule is None:
+        spec = TARGET_EXPECT.get(target, [EXPECT_TEXT])
+        if isinstance(spec, str):
+            spec = [spec]
+        if isinstance(spec, dict):
+            markers = spec.get("markers", [])
+            regex = re.compile(spec["regex"].encode("utf-8")) if spec.get("regex") else None
+        else:
+            markers, regex = spec, None
+        rule = (tuple(m.encode("utf-8") for m in markers), regex)
+        expect_rules[target] = rule
+    return rule
+
+class ContentValidator:
+    """Searches a streamed body for the expected markers/regex chunk by chunk.
+    
+    The last few bytes of each chunk are carried into the next search so
+    matches that straddle a chunk boundary are still found. Regex matches
+    longer than REGEX_OVERLAP bytes that cross a boundary can be missed.
+    """
+    
+    REGEX_OVERLAP = 4096
+    
+    def __init__(self, rule):
+        markers, self.regex = rule
+        self.remaining = list(markers)
+        self.regex_found = self.regex is None
+        self.overlap = max([len(m) - 1 for m in markers] + [self.REGEX_OVERLAP if self.regex else 0])
+        self.tail = b""
+        self.bytes_read = 0
+    
+    @property
+    def matched(self):
+        return not self.remaining and self.regex_found
+    
+    def feed(self, chunk):
+        """Scan one chunk; returns True once everything expected was seen."""
+        self.bytes_read += len(chunk)
+        window = self.tail + chunk
+        if self.remaining:
+            self.remaining = [m for m in self.remaining if m not in window]
+        if not self.regex_found:
+            self.regex_found = self.regex.search(window) is not None
+        self.tail = window[-self.overlap:] if self.overlap else b""
+        return self.matched
+    
+    def consume(self, response, max_bytes=MAX_BODY_BYTES):
+        """Read the response body until matched, EOF or the byte budget runs out."""
+        while self.bytes_read < max_bytes and not self.matched:
+            chunk = response.read(min(BODY_CHUNK_SIZE, max_bytes - self.bytes_read))
+            if not chunk:
+                break
+            self.feed(chunk)
+        return self
+
+targets_without_time_endpoint = set()  # answered 404; never asked again
+time_endpoint_readings = {}  # target -> (skew, uncertainty, source, monotonic time read)
+time_endpoint_retry_at = {}  # target -> monotonic time a failed endpoint may be read again
+
+def read_time_endpoint(target, deadline):
+    """(skew, uncertainty, 'endpoint') read from the target's time endpoint
+    within the probe's monotonic deadline, or None."""
+    try:
+        time_response, body, time_timings = probe_pool.request(
+            target, path=TIME_ENDPOINT_PATH, timeout=remaining_time(deadline))
+        if time_response.status == 200:
+            target_time = datetime.fromtimestamp(float(body.strip()), timezone.utc)
+            return clock_offset(target_time, time_timings, 0.001, 'endpoint')
+        if time_response.status == 404:
+            # Not served by this target; don't ask again
+            targets_without_time_endpoint.add(target)
+            logger.info(f"{target} has no {TIME_ENDPOINT_PATH} endpoint, using the Date header for clock skew")
+            return None
+        reason = f"HTTP {time_response.status}"
+    except ValueError:
+        reason = "unparsable body"
+    except Exception as e:
+        reason = str(e)
+    # Transient (a 502 during a deploy, a timeout): Date header until the retry
+    time_endpoint_retry_at[target] = time.monotonic() + TIME_ENDPOINT_RETRY_SEC
+    logger.debug(f"Time endpoint read failed for {target} ({reason}), retrying in {TIME_ENDPOINT_RETRY_SEC}s")
+    return None
+
+def measure_clock_skew(target, response, timings, deadline):
+    """Signed offset of the target's clock from the reference, NTP style.
+    
+    The target's reading is assumed to be taken halfway through the round
+    trip, so skew = target_time - reference(midpoint) and the error bound is
+    half the round trip plus the reading's resolution (1ms from the time
+    endpoint, 0.5s from a whole-second Date header). An endpoint reading
+    carried forward grows its bound by both clocks' possible drift since.
+    A fresh endpoint read only spends what is left of the probe's monotonic
+    deadline. Returns (skew_seconds, uncertainty_seconds, source) or None.
+    """
+    if TIME_ENDPOINT_PATH and target not in targets_without_time_endpoint:
+        now = time.monotonic()
+        reading = time_endpoint_readings.get(target)
+        if reading is not None and now - reading[3] < TIME_ENDPOINT_REFRESH_SEC:
+            skew, uncertainty, source, read_at = reading
+            return skew, uncertainty + (now - read_at) * 2 * CLOCK_DRIFT_RATE, source
+        if now >= time_endpoint_retry_at.get(target, 0.0) and now < deadline:
+            clock = read_time_endpoint(target, deadline)
+            if clock is not None:
+                time_endpoint_readings[target] = clock + (now,)
+                return clock
+    
+    date_header = response.getheader("Date")
+    if not date_header:
+        return None
+    try:
+        # Date is truncated to the second; its midpoint is the best estimate
+        target_time = parsedate_to_datetime(date_header) + timedelta(seconds=0.5)
+    except (TypeError, ValueError):
+        return None
+    return clock_offset(target_time, timings, 0.5, 'date')
+
+def clock_offset(target_time, timings, resolution, source):
+    round_trip = timings['received'] - timings['sent']
+    midpoint = reference_time_at(timings['sent'] + round_trip / 2)
+    skew = (target_time - midpoint).total_seconds()
+    return skew, round_trip / 2 + resolution, source
 
-def http_check(target):
+class ProbeState:
+    """Per-target probe bookkeeping: the last full validation and the
+    validators a conditional GET sends back. A target is probed by one
+    thread at a time, so no locking."""
+    
+    __slots__ = ('content_ok', 'since_full', 'last_ok', 'etag', 'last_modified')
+    
+    def __init__(self):
+        self.content_ok = False
+        self.since_full = 0
+        self.last_ok = False
+        self.etag = None
+        self.last_modified = None
+    
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+    
+    def validated(self, contains, response):
+        self.content_ok = contains
+        self.since_full = 0
+        # Only content that passed may be confirmed by a later 304
+        self.etag = response.getheader("ETag") if contains else None
+        self.last_modified = response.getheader("Last-Modified") if contains else None
+
+probe_states = {}
+
+def probe_state_for(target):
+    state = probe_states.get(target)
+    if state is None:
+        state = probe_states.setdefault(target, ProbeState())
+    return state
+
+def record_probe(target, kind, seconds, timings):
+    """Latency and cost (wall time, bytes, socket operations) of one probe"""
+    with performance_lock:
+        performance_metrics['latency'].setdefault(target, LatencyHistogram()).record(seconds)
+    exp_latency.observe(seconds, target)
+    exp_probes.inc(kind)
+    exp_probe_bytes.inc(kind, amount=timings.get('bytes', 0))
+    exp_probe_ops.inc(kind, amount=timings.get('socket_ops', 0))
+    log_metric('probe_cost', seconds, {
+        'target': target,
+        'probe': kind,
+        'bytes': timings.get('bytes', 0),
+        'socket_ops': timings.get('socket_ops', 0)
+    })
+
+def run_probe(target, timeout=TARGET_DEADLINE):
+    """Probe the target with its probe type, or with a full GET when a validation is due.
+    
+    Returns (status, contains, seconds, clock) as http_check does.
+    """
+    kind = TARGET_PROBES.get(target) or PROBE_TYPE
+    state = probe_state_for(target)
+    if kind != "get" and (not state.last_ok or state.since_full >= FULL_CHECK_EVERY - 1):
+        kind = "get"
+    elif kind != "get":
+        state.since_full += 1
+    
+    if kind in ("tcp", "tls"):
+        result = socket_check(target, tls=kind == "tls", timeout=timeout)
+    else:
+        result = http_check(target, timeout=timeout, kind=kind)
+    status, contains = result[0], result[1]
+    state.last_ok = status in (200, 304, None) and contains
+    return result
+
+def socket_check(target, tls=False, timeout=TARGET_DEADLINE):
+    """TCP connect (plus TLS handshake) liveness probe.
+    
+    No HTTP is spoken, so status is None when the target answered (0 when it
+    did not) and contains is the target's last full validation.
+    """
+    kind = "tls" if tls else "tcp"
+    probe_start = time.time()
+    try:
+        host, port = target.split(":")
+        timings = {}
+        sock = open_probe_socket(host, int(port), time.monotonic() + timeout, timings, tls)
+        try:
+            if tls:
+                expires = ssl.cert_time_to_seconds(sock.getpeercert()["notAfter"])
+                log_metric('tls_cert_expiry_days', round((expires - time.time()) / 86400, 1), {'target': target})
+        finally:
+            sock.close()
+        probe_time = time.time() - probe_start
+        timings['socket_ops'] = sock.ops
+        for phase in ('dns', 'connect', 'tls') if tls else ('dns', 'connect'):
+            log_metric(f'http_{phase}_time', timings[phase], {'target': target, 'mode': kind})
+        record_probe(target, kind, probe_time, timings)
+        return None, probe_state_for(target).content_ok, probe_time, None
+    
+    except Exception as e:
+        probe_time = time.time() - probe_start
+        logger.error(f"{kind.upper()} probe failed for {target}: {e}")
+        log_metric('http_check_failure', 1, {'target': target, 'error': str(e), 'probe': kind})
+        count_error()
+        return 0, False, probe_time, None
+
+def http_check(target, timeout=TARGET_DEADLINE, mode=PROBE_MODE, kind="get"):
+    """One HTTP probe. "get" validates the content; "conditional" only when
+    the server says it changed (304 keeps the last validation) and "head"
+    never (it reports the last validation)."""
     http_start = time.time()
-    host, port = target.split(":")
-    url = f"http://{host}:{port}/"
+    deadline = time.monotonic() + timeout  # shared by the probe and its clock read
+    state = probe_state_for(target)
     
     try:
-        r = requests.get(url, timeout=10)
+        validator = ContentValidator(expect_rule_for(target))
+        if kind == "head":
+            response, _, timings = probe_pool.request(target, method="HEAD", mode=mode, timeout=timeout)
+        else:
+            response, validator, timings = probe_pool.request(
+                target, mode=mode, timeout=timeout, read_body=validator.consume,
+                headers=state.conditional_headers() if kind == "conditional" else None
+            )
         http_time = time.time() - http_start
-        status = r.status_code
-        contains = (EXPECT_TEXT in r.text)
+        status = response.status
+        if kind == "head" or status == 304:
+            contains = state.content_ok
+        else:
+            contains = validator.matched
+            if status == 200:
+                state.validated(contains, response)
         
         # Log HTTP performance metric
         log_metric('http_response_time', http_time, {
             'target': target, 
             'status_code': status,
-            'content_valid': contains
+            'content_valid': contains,
+            'mode': mode,
+            'probe': kind,
+            'reused': timings['reused']
         })
+        # Per-phase timings so latency regressions can be pinned to a layer
+        for phase in ('dns', 'connect', 'tls', 'ttfb', 'transfer'):
+            if phase != 'tls' or timings['tls']:
+                log_metric(f'http_{phase}_time', timings[phase], {'target': target, 'mode': mode})
+        log_metric('http_bytes_read', validator.bytes_read, {'target': target, 'content_valid': contains})
         
-        # Track response times for availability calculation
-        performance_metrics['response_times'].append(http_time)
-        if len(performance_metrics['response_times']) > 100:
-            performance_metrics['response_times'].pop(0)  # Keep last 100
-            
-        return status, contains, http_time
+        clock = measure_clock_skew(target, response, timings, deadline)
+        if clock is not None:
+            log_metric('clock_skew_seconds', clock[0], {'target': target, 'source': clock[2]})
+            log_metric('clock_skew_uncertainty_seconds', clock[1], {'target': target, 'source': clock[2]})
+        
+        record_probe(target, kind, http_time, timings)
+        return status, contains, http_time, clock
         
     except Exception as e:
         http_time = time.time() - http_start
         logger.error(f"HTTP check failed for {target}: {e}")
-        log_metric('http_check_failure', 1, {'target': target, 'error': str(e)})
-        performance_metrics['error_count'] += 1
-        return 0, False, http_time
+        log_metric('http_check_failure', 1, {'target': target, 'error': str(e), 'probe': kind})
+        count_error()
+        return 0, False, http_time, None
+
+def check_target(t):
+    """Run the full check for one target: homepage, HTTP probe, buffered result, alerting.
+    
+    Runs on a worker thread; returns True when the target passed.
+    """
+    with Span('check'):
+        return _check_target(t)
+
+def _check_target(t):
+    container_id = t.split(":")[0]
+    logger.info(f"Checking target: {t}")
+    target_start = time.time()
+    
+    try:
+        # Read both clocks together for the homepage
+        with Span('world_time'):
+            fetched = fetch_world_time()
+            local = get_local_time()
+        
+        with Span('homepage'):
+            update_homepage(t, fetched, local, container_id)
+        with Span('probe'):
+            status, contains, response_time, clock = run_probe(t)
+        logger.info(f"Probe of {container_id}: status={status}, contains_expected={contains}, response_time={response_time:.3f}s")
+        
+        if clock is not None:
+            skew, uncertainty, source = clock
+            drift = round(abs(skew), 3)
+            logger.info(f"Clock skew for {container_id}: {skew * 1000:+.1f}ms (±{uncertainty * 1000:.1f}ms, {source})")
+        else:
+            # Target's clock unreadable; fall back to the watchdog's own clock
+            drift = round(abs((local - fetched).total_seconds()), 3)
+            logger.info(f"Time drift for {container_id} (watchdog clock): {drift:.3f} seconds")
+        
+        # Log time drift metric
+        log_metric('time_drift_seconds', drift, {'target': t})
+        exp_drift.set(drift, t)
+        
+        # tcp/tls probes speak no HTTP: status None means the target answered
+        reachable = status in (200, 304) or status is None
+        ok = reachable and contains and (drift <= MAX_DRIFT)
+        logger.info(f"Overall check result for {container_id}: {'PASS' if ok else 'FAIL'}")
+        
+        target_time = time.time() - target_start
+        
+        with Span('result_buffer'):
+            result_writer.add_check(t, ok, status, drift, response_time, fetched, local)
+        
+        # Log comprehensive performance metrics
+        log_metric('target_check_duration', target_time, {'target': t})
+        log_metric('target_status', 1 if ok else 0, {'target': t, 'result': 'PASS' if ok else 'FAIL'})
+        exp_checks.inc(t, 'pass' if ok else 'fail')
+        exp_target_up.set(1 if ok else 0, t)
+        exp_check_duration.observe(target_time, t)
+        
+        with performance_lock:
+            performance_metrics['check_count'] += 1
+                
+        if not ok:
+            msg = (
+                f"Target={t}\n"
+                f"HTTP={status}, contains='{EXPECT_TEXT}'? {contains}\n"
+                f"Drift={drift:.3f}s (max {MAX_DRIFT})\n"
+                f"Response time={response_time:.3f}s\n"
+                f"Fetched={fetched.isoformat()}, Local={local.isoformat()}\n"
+            )
+            failures = [name for name, failed in (
+                ('http', not reachable), ('content', not contains), ('drift', drift > MAX_DRIFT)
+            ) if failed]
+            logger.warning(f"Validation failed for {t}: {msg}")
+            with Span('alert_submit'):
+                send_alert(f"[Monitoring] Validation failed for {t}", msg, t, "+".join(failures))
+        else:
+            alert_dispatcher.resolve(t)
+        
+        return ok
+            
+    except Exception as e:
+        error_msg = f"Error while checking {t}: {e}"
+        logger.error(error_msg)
+        send_alert(f"[Monitoring] Error while checking {t}", error_msg, t, "error")
+        count_error()
+        return False
+
+class CheckScheduler:
+    """Priority queue of per-target next-due times on the monotonic clock.
+    
+    Each target keeps an un-jittered anchor; after a pass the next anchor is
+    the previous one plus the interval, so check duration and jitter never
+    accumulate into drift. Jitter is applied on top of the anchor only.
+    A target is rescheduled when its check completes, so the same target is
+    never checked twice at once.
+    
+    With aligned=True (sharded replicas) there is no random jitter: each
+    target is due whenever wall-clock time hits its slot, a fixed offset
+    within the interval derived from its name. Every replica computes the
+    same slots, so a target handed from one replica to another keeps its
+    cadence instead of being checked twice or skipped.
+    """
+    
+    def __init__(self, targets, intervals=TARGET_INTERVALS, default_interval=CHECK_INTERVAL,
+                 jitter=CHECK_JITTER, retry=FAILURE_RETRY_SEC, aligned=False):
+        self.intervals = {t: float(intervals.get(t, default_interval)) for t in targets}
+        self.jitter = 0.0 if aligned else jitter
+        self.retry = retry
+        self.aligned = aligned
+        self.failures = dict.fromkeys(targets, 0)
+        self.anchors = {}
+        self.heap = []
+        self.cond = threading.Condition()
+        now = time.monotonic()
+        for t in targets:
+            if aligned:
+                self.anchors[t] = self._next_slot(t, now)
+                heapq.heappush(self.heap, (self.anchors[t], t))
+                continue
+            # Spread the first round over the jitter window instead of a burst at startup
+            self.anchors[t] = now
+            heapq.heappush(self.heap, (now + random.uniform(0, jitter * self.intervals[t]), t))
+    
+    def _jittered(self, anchor, delay):
+        return anchor + random.uniform(-self.jitter, self.jitter) * delay
+    
+    def _next_slot(self, target, after):
+        """Monotonic time of the target's first wall-clock slot after `after` (monotonic)."""
+        interval = self.intervals[target]
+        offset = ring_hash(target) % 1000000 / 1000000 * interval
+        wall_after = time.time() + (after - time.monotonic())
+        return after + ((offset - wall_after) % interval or interval)
+    
+    def pop_due(self, now):
+        """Remove and return [(target, due_at)] for every target due by now."""
+        due = []
+        with self.cond:
+            while self.heap and self.heap[0][0] <= now:
+                due_at, target = heapq.heappop(self.heap)
+                due.append((target, due_at))
+        return due
+    
+    def complete(self, target, ok):
+        """Schedule the target's next check from the outcome of the last one."""
+        now = time.monotonic()
+        interval = self.intervals[target]
+        with self.cond:
+            if ok and self.aligned:
+                self.failures[target] = 0
+                # Never the slot just checked, even if it completed "early" on the wall clock
+                anchor = self._next_slot(target, max(now, self.anchors[target] + interval / 2))
+                if anchor - self.anchors[target] > interval * 1.5:
+                    exp_overruns.inc(target)
+                delay = interval
+            elif ok:
+                self.failures[target] = 0
+                anchor = self.anchors[target] + interval
+                if anchor < now:
+                    # Fell behind (slow check or overloaded pool): realign instead of bursting
+                    anchor += ((now - anchor) // interval + 1) * interval
+                    exp_overruns.inc(target)
+                delay = interval
+            else:
+                self.failures[target] += 1
+                delay = min(interval, self.retry * 2 ** (self.failures[target] - 1))
+                anchor = now + delay
+            self.anchors[target] = anchor
+            heapq.heappush(self.heap, (max(now, self._jittered(anchor, delay)), target))
+            self.cond.notify()
+    
+    def wait(self, until):
+        """Sleep until the next target is due, a reschedule happens, or until (monotonic)."""
+        with self.cond:
+            wake = min(self.heap[0][0], until) if self.heap else until
+            timeout = wake - time.monotonic()
+            if timeout > 0:
+                self.cond.wait(timeout)
+
+def dispatch_check(executor, scheduler, target, due_at, stats):
+    """Submit one target's check and reschedule it when it completes."""
+    lag = time.monotonic() - due_at
+    stats['max_lag'] = max(stats['max_lag'], lag)
+    exp_schedule_lag.observe(max(lag, 0.0))
+    
+    def done(future):
+        try:
+            ok = bool(future.result())
+        except Exception as e:
+            logger.error(f"Check for {target} crashed: {e}")
+            ok = False
+        with performance_lock:
+            stats['results'].append(ok)
+        scheduler.complete(target, ok)
+    
+    executor.submit(check_target, target).add_done_callback(done)
+
+def log_latency_percentiles(latency):
+    """Log p50/p90/p99/max (ms) for each target's sketch and for all of them merged"""
+    overall = LatencyHistogram()
+    for hist in latency.values():
+        overall.merge(hist)
+    if overall.total:
+        latency = dict(latency, all=overall)
+    for target, hist in latency.items():
+        for q in (50, 90, 99):
+            log_metric(f'http_response_time_p{q}_ms', hist.quantile(q / 100), {'target': target})
+        log_metric('http_response_time_max_ms', hist.max_ms, {'target': target})
+
+def log_phase_stats(phases, period):
+    """Log each phase's count, total time and p50/p99/max (us); returns a one-line breakdown"""
+    parts = []
+    for phase, hist in sorted(phases.items(), key=lambda item: -item[1].seconds):
+        log_metric('phase_count', hist.total, {'phase': phase})
+        log_metric('phase_time_total_seconds', round(hist.seconds, 6), {'phase': phase})
+        for q in (50, 99):
+            log_metric(f'phase_time_p{q}_us', hist.quantile(q / 100), {'phase': phase})
+        log_metric('phase_time_max_us', hist.max_ms, {'phase': phase})
+        parts.append(f"{phase} {hist.seconds:.3f}s/{hist.total} (p99 {hist.quantile(0.99) / 1000:.2f}ms)")
+    return f"Time per phase in the last {period:.0f}s: " + ", ".join(parts)
+
+def dispatch_due(executor, scheduler, stats, now):
+    """Dispatch every due target this replica owns; the others just keep their slot."""
+    for target, due_at in scheduler.pop_due(now):
+        if shard_coordinator.owns(target):
+            dispatch_check(executor, scheduler, target, due_at, stats)
+        else:
+            scheduler.complete(target, True)
 
 def main_loop():
     logger.info("Starting enhanced watchdog with logging and metrics...")
     logger.info(f"Configuration: TZ={TZ}, TARGETS={TARGETS}, CHECK_INTERVAL={CHECK_INTERVAL}s")
+    logger.info(f"Concurrency: up to {CHECK_CONCURRENCY} targets in parallel, {TARGET_DEADLINE}s wall-clock deadline per probe")
+    if TARGET_INTERVALS:
+        logger.info(f"Per-target intervals: {TARGET_INTERVALS}")
     logger.info(f"Enhanced logging: Application logs + Structured metrics enabled")
     
+    executor = ThreadPoolExecutor(max_workers=CHECK_CONCURRENCY, thread_name_prefix="check")
+    alert_dispatcher.start()
+    result_writer.start(FLUSH_INTERVAL)
+    start_maintenance()
+    start_metrics_exporter()
+    shard_coordinator.start()
+    time_reference.start()
+    # Give the first calibration a moment so the first checks have a real reference
+    time_reference.first_attempt.wait(timeout=10)
+    
+    scheduler = CheckScheduler(TARGETS, aligned=shard_coordinator.enabled)
+    stats = {'results': [], 'max_lag': 0.0}
+    next_summary = time.monotonic() + FLUSH_INTERVAL
+    
+    if PROFILE_ON_START:
+        stack_sampler.start()
+    
     while True:
-        cycle_start = time.time()
+        now = time.monotonic()
+        with Span('dispatch'):
+            dispatch_due(executor, scheduler, stats, now)
         
-        try:
-            logger.info("Fetching world time...")
-            fetched = fetch_world_time()
-        except Exception as e:
-            error_msg = f"Error fetching world time: {e}"
-            logger.error(error_msg)
-            send_alert("[Monitoring] World time fetch failed", error_msg)
-            performance_metrics['error_count'] += 1
-            time.sleep(CHECK_INTERVAL)
-            continue
-
-        cycle_results = []
-        
-        for t in TARGETS:
-            container_id = t.split(":")[0]
-            logger.info(f"Checking target: {t}")
-            target_start = time.time()
+        if now >= next_summary:
+            next_summary += FLUSH_INTERVAL
+            stack_sampler.cycle_done()
             
-            try:
-                local = get_local_time()
-                drift = abs(int((local - fetched).total_seconds()))
-                logger.info(f"Time drift for {container_id}: {drift} seconds")
-                
-                # Log time drift metric
-                log_metric('time_drift_seconds', drift, {'target': t})
-                
-                update_homepage(t, fetched, local, container_id)
-                status, contains, response_time = http_check(t)
-                logger.info(f"HTTP check for {container_id}: status={status}, contains_expected={contains}, response_time={response_time:.3f}s")
-                
-                ok = (status == 200) and contains and (drift <= MAX_DRIFT)
-                logger.info(f"Overall check result for {container_id}: {'PASS' if ok else 'FAIL'}")
-                
-                target_time = time.time() - target_start
-                
-                # Enhanced database logging with response time
-                with db_conn() as conn:
-                    with conn.cursor() as cur:
-                        # Use enhanced schema column names
-                        cur.execute("""
-                            INSERT INTO checks (target, status, http_status, time_drift_seconds, 
-                                              response_time_ms, fetched_time, local_time, created_at)
-                            VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-                        """, (
-                            t,  # Use full target instead of container_id
-                            'PASS' if ok else 'FAIL',
-                            status, 
-                            drift, 
-                            int(response_time * 1000),  # Convert to milliseconds
-                            fetched, 
-                            local, 
-                            datetime.now()
-                        ))
-                        logger.info(f"Persisted enhanced check result for {container_id}")
-                
-                # Also log structured metrics to our metrics table (if exists)
-                try:
-                    with db_conn() as conn:
-                        with conn.cursor() as cur:
-                            status_label = "ok" if ok else "fail"
-                            tags_json = f'{{"target": "{t}", "status": "{status_label}"}}'
-                            cur.execute("""
-                                INSERT INTO metrics (metric_name, metric_value, tags, timestamp)
-                                VALUES (%s,%s,%s,%s)
-                            """, (
-                                'response_time_ms',
-                                int(response_time * 1000),
-                                tags_json,
-                                datetime.now()
-                            ))
-                except Exception as metrics_error:
-                    logger.debug(f"Metrics table not available (expected during migration): {metrics_error}")
-                
-                # Log comprehensive performance metrics
-                log_metric('target_check_duration', target_time, {'target': t})
-                log_metric('target_status', 1 if ok else 0, {'target': t, 'result': 'PASS' if ok else 'FAIL'})
-                
-                cycle_results.append(ok)
-                performance_metrics['check_count'] += 1
-                        
-                if not ok:
-                    msg = (
-                        f"Target={t}\n"
-                        f"HTTP={status}, contains='{EXPECT_TEXT}'? {contains}\n"
-                        f"Drift={drift}s (max {MAX_DRIFT})\n"
-                        f"Response time={response_time:.3f}s\n"
-                        f"Fetched={fetched.isoformat()}, Local={local.isoformat()}\n"
-                    )
-                    logger.warning(f"Validation failed for {t}: {msg}")
-                    send_alert(f"[Monitoring] Validation failed for {t}", msg)
-                    
-            except Exception as e:
-                error_msg = f"Error while checking {t}: {e}"
-                logger.error(error_msg)
-                send_alert(f"[Monitoring] Error while checking {t}", error_msg)
-                performance_metrics['error_count'] += 1
-                cycle_results.append(False)
-        
-        # Log cycle-level metrics
-        cycle_time = time.time() - cycle_start
-        cycle_success_rate = (sum(cycle_results) / len(cycle_results)) * 100 if cycle_results else 0
-        
-        log_metric('cycle_duration', cycle_time)
-        log_metric('cycle_success_rate', cycle_success_rate)
+            if time_reference.calibrated:
+                log_metric('time_reference_age_seconds', time_reference.age())
+                log_metric('time_reference_uncertainty_seconds', time_reference.uncertainty())
+            else:
+                logger.warning("Time reference not calibrated yet, using system time as reference")
+            
+            with performance_lock:
+                results, stats['results'] = stats['results'], []
+                max_lag, stats['max_lag'] = stats['max_lag'], 0.0
+                latency, performance_metrics['latency'] = performance_metrics['latency'], {}
+                phases, performance_metrics['phases'] = performance_metrics['phases'], {}
+            success_rate = (sum(results) / len(results)) * 100 if results else 0
+            
+            log_metric('cycle_success_rate', success_rate)
+            log_metric('schedule_lag_seconds', max_lag)
+            log_latency_percentiles(latency)
+            breakdown = log_phase_stats(phases, FLUSH_INTERVAL)
+            if results:
+                logger.info(f"Completed {len(results)} checks in the last {FLUSH_INTERVAL:.0f}s. Success rate: {success_rate:.1f}%. Max schedule lag: {max_lag:.2f}s")
+                logger.info(breakdown)
         
-        logger.info(f"Enhanced check cycle completed in {cycle_time:.2f}s. Success rate: {cycle_success_rate:.1f}%. Sleeping for {CHECK_INTERVAL} seconds...")
-        time.sleep(CHECK_INTERVAL)
+        scheduler.wait(next_summary)
 
 def init_watchdog():
     """Initialize the enhanced watchdog system"""
-    global logger, metrics_logger
-    logger, metrics_logger = setup_logging()
+    global logger
+    logger, _ = setup_logging()
     
     logger.info("Enhanced Multi-Container Monitoring Watchdog Starting...")
     logger.info("Part 2: Logging & Monitoring Implementation")
     
-    return logger, metrics_logger
+    return logger, metrics_pipeline
 
 if __name__ == "__main__":
     init_watchdog()
-    main_loop()
+    if "--maintain" in sys.argv:
+        # One-off maintenance pass, e.g. from cron: python watchdog.py --maintain
+        run_maintenance()
+    else:
+        # docker stop / pod termination: exit through atexit so buffered
+        # metrics and check rows are written and the shard row is released
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        # kill -USR1 <pid>: profile the next PROFILE_CYCLES cycles
+        signal.signal(signal.SIGUSR1, lambda signum, frame: stack_sampler.start())
+        main_loop()